@@ -1,21 +1,29 @@
 #!/usr/bin/env python
-import argparse, sys, logging, warnings, winsound
+import argparse, os, sys, logging, warnings, winsound
 from datetime import datetime
 
 #py.init_notebook_mode(connected=True)
 
 
 
-from pandas import DataFrame
+from pandas import DataFrame, concat
 
 
 from utils.SettingsReader import SettingsReader
+from utils.FingerprintStore import FingerprintStore
+from utils import Utils
 
 from parsers.DataReader import DataReader
+from parsers.DataCache import DataCache
 from parsers.DataExporter import DataExporter
 from parsers.MultiData import MultiData
 
 from algo.IVTFilter import IVTFilter
+from algo.IVVTFilter import IVVTFilter
+from algo.IDTFilter import IDTFilter
+from algo.IVDTFilter import IVDTFilter
+from algo.IVTStream import IVTStream
+from algo.IVTSweep import IVTSweep
 from algo.IBDT import IBDT
 from algo.IBDT import CLASSIFICATION
 from algo.GazeData import MOVEMENT
@@ -45,9 +53,14 @@ class SmoothPursuitClassification():
 
         self.PROJECT_NAME = 'Smooth Pursuit Classification'
         self.PROJECT_NAME_SHORT = 'SP-c'
-        self.SAMPLES_COMPONENTS_LIST = ['fixation', 'saccade', 'pursuit',    'messages']
+        self.SAMPLES_COMPONENTS_LIST = ['fixation', 'saccade', 'pursuit',    'messages', 'sweep']
         self.GAZE_COMPONENTS_LIST = ['fixations','saccades',    'eyesNotFounds','unclassifieds',      "imu", "gyro","accel"]
         self.VIDEO_FRAMERATE = 60
+        #samples columns every detector needs, the rest are not parsed unless asked for
+        #all of them read right eye only (see batchJob), I-BDT raw positions and validity, the others velocity and degrees derived from those
+        self.DETECTOR_COLUMNS = ['R POR X [px]', 'R POR Y [px]', 'R Validity']
+        #samples columns needed for trial tagging and export, whatever the detector
+        self.EXPORT_COLUMNS = ['Time', 'Trial']
 
 
         #self.logger.debug('Instantiating classes.')
@@ -55,6 +68,8 @@ class SmoothPursuitClassification():
         #self.stats = Stats(self)
 
         self.dataReader = DataReader(self)
+        self.dataCache = DataCache(self)
+        self.fingerprintStore = FingerprintStore(self)
         self.dataExporter = DataExporter(self)
         self.multiData = MultiData(self)
 
@@ -118,6 +133,173 @@ class SmoothPursuitClassification():
 
 
 
+def batchJob(spc:SmoothPursuitClassification, args:object) -> None:
+    """Smooths, calculates velocity and classifies all data read, one channel id at a time.
+
+    :param spc: main object with all data read.
+    :param args: parsed command line arguments.
+    :return:
+    """
+    #----
+    spc.multiData.setSmooth(args.smooth, window=args.smooth_window, order=args.smooth_order, lamb=args.smooth_lambda)
+    spc.printToOut('Smoothing: {0}.'.format(spc.multiData.getSmoother(args.smooth).printParams()))
+    for (channel, id) in spc.multiData.genChannelIds(channel='samples'):
+        #SMOOTHING, velocity and other derived columns are computed on demand
+        velocityData = spc.multiData.getChannelAndTag(channel, id, block='trial', ignoreEmpty=False)
+        spc.multiData.setNode(channel, id, velocityData)
+        derived = spc.multiData.getDerived(id)
+
+
+
+
+        #algo DETECTORS
+        #TODO R channel hard-coded
+        spc.printToOut('Classifying.')
+        if args.algo == 'ivt' and args.sweep:
+            sweep = IVTSweep(spc, workers=args.jobs or os.cpu_count())
+            grid = sweep.getGrid(args.sweep_velocity, args.sweep_noise, args.sweep_static, args.sweep_motion)
+            table = sweep.run(DataFrame({'Time':Utils.timeToSeconds(velocityData['Time']).values, 'RVelocitySmoothed':derived.get('RVelocitySmoothed')}, index=velocityData.index),  grid)
+            table.insert(0, 'Id', id)
+            spc.multiData.setNode('sweep', id, table)
+
+        elif args.algo == 'ivt':
+            filter = IVTFilter()
+            filter.runJob(DataFrame({'Time':Utils.timeToSeconds(velocityData['Time']).values, 'RVelocitySmoothed':derived.get('RVelocitySmoothed')}, index=velocityData.index),  150, 15, 0.250, 0.035)
+            spc.printToOut( 'I-VT filter finished, with parameters: {0}'.format(filter.printParams()) )
+            spc.multiData.setNode('fixation', id, filter.getResultFiltered(state='fixation'))
+            spc.multiData.setNode('saccade', id, filter.getResultFiltered(state='saccade'))
+
+        elif args.algo == 'ivvt':
+            filter = IVVTFilter()
+            filter.runJob(DataFrame({'Time':Utils.timeToSeconds(velocityData['Time']).values, 'RVelocitySmoothed':derived.get('RVelocitySmoothed')}, index=velocityData.index),  150, 30, 15, 0.035)
+            spc.printToOut( 'I-VVT filter finished, with parameters: {0}'.format(filter.printParams()) )
+            spc.multiData.setNode('fixation', id, filter.getResultFiltered(state='fixation'))
+            spc.multiData.setNode('saccade', id, filter.getResultFiltered(state='saccade'))
+            spc.multiData.setNode('pursuit', id, filter.getResultFiltered(state='pursuit'))
+
+        elif args.algo == 'idt':
+            filter = IDTFilter()
+            filter.runJob(DataFrame({'Time':Utils.timeToSeconds(velocityData['Time']).values, 'RPORXDegSmoothed':derived.get('RPORXDegSmoothed'), 'RPORYDegSmoothed':derived.get('RPORYDegSmoothed'),
+                                     'RVelocitySmoothed':derived.get('RVelocitySmoothed')}, index=velocityData.index),  1.0, 0.100, 0.035)
+            spc.printToOut( 'I-DT filter finished, with parameters: {0}'.format(filter.printParams()) )
+            spc.multiData.setNode('fixation', id, filter.getResultFiltered(state='fixation'))
+            spc.multiData.setNode('saccade', id, filter.getResultFiltered(state='saccade'))
+
+        elif args.algo == 'ivdt':
+            filter = IVDTFilter()
+            filter.runJob(DataFrame({'Time':Utils.timeToSeconds(velocityData['Time']).values, 'RPORXDegSmoothed':derived.get('RPORXDegSmoothed'), 'RPORYDegSmoothed':derived.get('RPORYDegSmoothed'),
+                                     'RVelocitySmoothed':derived.get('RVelocitySmoothed')}, index=velocityData.index),  150, 1.35, 0.110, 15, 0.035)
+            spc.printToOut( 'I-VDT filter finished, with parameters: {0}'.format(filter.printParams()) )
+            spc.multiData.setNode('fixation', id, filter.getResultFiltered(state='fixation'))
+            spc.multiData.setNode('saccade', id, filter.getResultFiltered(state='saccade'))
+            spc.multiData.setNode('pursuit', id, filter.getResultFiltered(state='pursuit'))
+
+        elif args.algo == 'ibdt':
+            columnsData = DataFrame({'Time':Utils.timeToSeconds(velocityData['Time']) * 1000, 'confidence':1-velocityData['R Validity'], 'x':velocityData['R POR X [px]'], 'y':velocityData['R POR Y [px]']})
+            #samples outside valid runs would be skipped by the classifier one by one anyway
+            columnsData = columnsData[derived.getValid('R')]
+            filter = IBDT()
+            filter.runJob(columnsData,  80, 0.5, CLASSIFICATION['TERNARY'])
+            allEvents = filter.getResultFiltered()
+            spc.printToOut('I-BDT classifier finished.')
+            spc.multiData.setNode('fixation', id, allEvents[MOVEMENT['FIXATION']])
+            spc.multiData.setNode('saccade', id, allEvents[MOVEMENT['SACCADE']])
+            spc.multiData.setNode('pursuit', id, allEvents[MOVEMENT['PURSUIT']])
+
+
+
+
+        #neural network CLASSIFIERS
+        if args.classifier == 'blstm':
+            #nn.LSTM(spc, spc.multiData, settingsReader=spc.settingsReader)
+            pass
+        elif args.classifier == 'fasterrcnn':
+            #nn.FasterRCNN()
+            pass
+
+
+
+
+        #PLOTTING
+        #if args.plots == 'xyt':
+            #spc.CombiPlot(spc, spc.multiData, settingsReader=spc.settingsReader)
+
+
+
+def streamJob(spc:SmoothPursuitClassification, args:object) -> None:
+    """Reads, smooths, calculates velocity and classifies samples chunk by chunk, keeping memory footprint bounded.
+
+    Only messages, event tables and (optionally) labeled samples are kept in multiData.
+    Samples are not tagged by trials in this mode.
+
+    :param spc: main object.
+    :param args: parsed command line arguments.
+    :return:
+    """
+    if spc.settingsReader.check():
+        spc.settingsReader.read()
+    else:
+        return
+
+    spc.multiData.reset()
+    spc.multiData.setSmooth(args.smooth, window=args.smooth_window, order=args.smooth_order, lamb=args.smooth_lambda)
+    spc.printToOut('Smoothing: {0}.'.format(spc.multiData.getSmoother(args.smooth).printParams()))
+    for fileElem in spc.settingsReader.genTypeFile('samples'):
+        id = fileElem.get('id')
+        filePath = spc.settingsReader.getPathAttrById('samples', id, absolute=True)
+        if os.path.splitext(filePath)[1].lower() != '.txt':
+            spc.printToOut('ERROR: Streaming mode supports SMI .txt samples only, skipping {0}.'.format(os.path.basename(filePath)))
+            continue
+        spc.printToOut('Streaming samples ({0}) in chunks of {1} lines.'.format(os.path.basename(filePath), args.chunk_size))
+
+        chunks = spc.dataReader.genSMIChunks(filePath, args.chunk_size)
+        messages = []
+        def genSamples():
+            for availColumns, samplesData, messagesData in chunks:
+                spc.multiData.setNode('availColumns', id, availColumns)
+                messages.append(messagesData)
+                if spc.multiData.compact:
+                    samplesData = spc.multiData.compactDtypes(samplesData)
+                yield samplesData
+
+        #TODO R channel hard-coded
+        stream = IVTStream(150, 15, 0.250, 0.035, maxPending=args.chunk_size)
+        fixations, saccades, samples = [], [], []
+        endTime = 0
+        columns = None if args.all_columns else ['RVelocitySmoothed']
+        if args.causal:
+            velocityChunks = spc.multiData.genCausalVelocityChunks(genSamples(), smooth=args.smooth, convertToDeg=True, columns=columns)
+        else:
+            velocityChunks = spc.multiData.genVelocityChunks(genSamples(), smooth=args.smooth, convertToDeg=True, columns=columns)
+        for velocityData in velocityChunks:
+            time = Utils.timeToSeconds(velocityData['Time'])
+            endTime = time.iloc[-1]
+            events = stream.feed(DataFrame({'Time':time, 'RVelocitySmoothed':velocityData['RVelocitySmoothed']}))
+            fixations.append(events[0])
+            saccades.append(events[1])
+            if args.keep_samples:
+                samples.append(velocityData)
+        events = stream.flush()
+        fixations.append(events[0])
+        saccades.append(events[1])
+
+        fixations = concat(fixations)
+        saccades = concat(saccades)
+        spc.printToOut('I-VT filter finished, with parameters: {0}'.format(stream.filter.printParams()))
+        messagesData = concat(messages)
+        spc.multiData.setNode('messages', id, messagesData)
+        spc.multiData.setIntervalTables(id, messagesData, endTime)
+        spc.multiData.setNode('fixation', id, fixations)
+        spc.multiData.setNode('saccade', id, saccades)
+        if args.keep_samples:
+            spc.multiData.setNode('samples', id, stream.labelSamples(concat(samples), fixations, saccades))
+
+    if spc.multiData.check():
+        spc.printToOut('All valuable data read successfully.', status='ok')
+
+
+
+
 def main():
     parser = argparse.ArgumentParser(description='Launch SmoothPursuitClassification from the command line.')
     settingsFileGroup = parser.add_mutually_exclusive_group()
@@ -125,70 +307,75 @@ def main():
 
     jobGroup = parser.add_argument_group('job', 'Parameters of job running.')
     jobGroup.add_argument('--smooth', type=str, choices=['savgol', 'spline', 'conv'], default='spline', help='Filter name for gaze data smoothing.')
+    jobGroup.add_argument('--smooth-window', type=int, default=None, help='Smoothing kernel length in samples, for savgol (odd) and conv filters.')
+    jobGroup.add_argument('--smooth-order', type=int, default=None, help='Polynomial order of savgol filter.')
+    jobGroup.add_argument('--smooth-lambda', type=float, default=None, help='Smoothing strength of spline filter, greater than 1/24.')
+    jobGroup.add_argument('--no-segment', action='store_true', help='Smooth and classify samples straight across blinks and tracking loss, instead of valid runs only.')
+    jobGroup.add_argument('--max-gap', type=float, default=None, help='Time between samples (s) breaking a valid run, default is 2.5 sampling intervals.')
     jobGroup.add_argument('--algo', type=str, choices=['ibdt', 'ivvt', 'ivdt', 'ivt', 'idt'], default='ivt', help='Algorithm name for detecting IRRELEVANT (usually) eye movement types.')
     jobGroup.add_argument('--classifier', type=str, choices=['blstm', 'fasterrcnn', 'cnn', 'ssd', 'irf'], default='fasterrcnn', help='Deep-learning neural network type.')
     jobGroup.add_argument('--backend', type=str, choices=['keras', 'tf', 'neon', 'sklearn'], default='keras', help='Machine learning library to use as a backend.')
+    jobGroup.add_argument('--compact', action='store_true', help='Keep data in compact form (float32, categorical, integer microsecond timestamps) to save memory.')
+    jobGroup.add_argument('--all-columns', action='store_true', help='Parse and export all samples columns, not only those the detector needs.')
+    jobGroup.add_argument('--derived-only-needed', action='store_true', help='Export only derived samples columns (Mm, Deg, Smoothed, Velocity) the detector has computed, instead of all of them.')
+    jobGroup.add_argument('--intervals-to-settings', action='store_true', help='Write message and trial intervals parsed from records into exported settings file.')
+    jobGroup.add_argument('--jobs', type=int, default=None, help='Number of processes to read data files (and evaluate sweep parameter sets) with, 1 to do it in one process; default is CPU count, never more than there are data files.')
     #FIXME надо списком эти аргументы
     jobGroup.add_argument('--plots', type=str, choices=['xyt', 'xy', 'xtyt'], default='', help='Kind of plots to generate after parsing data.')
 
 
-    args = parser.parse_args()
-    if args.settings_file:
-        spc = SmoothPursuitClassification()
-        spc.printToOut('Using CLI with args: {0}.'.format(args))
-
-        spc.settingsReader.select(args.settings_file)
-        spc.dataReader.read(spc.settingsReader, spc.multiData)
-
-
-
-        #----
-        for (channel, id) in spc.multiData.genChannelIds(channel='samples'):
-            #SMOOTHING
-            samplesData = spc.multiData.getChannelAndTag(channel, id, block='trial', ignoreEmpty=False)
-            velocityData = spc.multiData.getVelocity(samplesData=samplesData, smooth=args.smooth, convertToDeg=True)
-            spc.multiData.setNode(channel, id, velocityData)
-
-
-
-
-            #algo DETECTORS
-            #TODO R channel hard-coded
-            spc.printToOut('Classifying.')
-            if args.algo == 'ivt':
-                filter = IVTFilter()
-                filter.runJob(velocityData[['Time', 'RVelocitySmoothed']],  150, 15, 0.250, 0.035)
-                spc.printToOut( 'I-VT filter finished, with parameters: {0}'.format(filter.printParams()) )
-                spc.multiData.setNode('fixation', id, filter.getResultFiltered(state='fixation'))
-                spc.multiData.setNode('saccade', id, filter.getResultFiltered(state='saccade'))
+    streamGroup = parser.add_argument_group('streaming', 'Bounded memory mode for very long recordings.')
+    streamGroup.add_argument('--stream', action='store_true', help='Read and classify samples chunk by chunk instead of loading whole files (I-VT only).')
+    streamGroup.add_argument('--chunk-size', type=int, default=100000, help='Number of file lines per chunk in streaming mode, sets the memory budget.')
+    streamGroup.add_argument('--causal', action='store_true', help='In streaming mode, smooth causally (past samples only), so that every chunk is classified as soon as it is read.')
+    streamGroup.add_argument('--keep-samples', action='store_true', help='In streaming mode, also keep all samples labeled by event type, for export.')
 
-            elif args.algo == 'ibdt':
-                columnsData = DataFrame({'Time':velocityData['Time'] * 1000, 'confidence':1-velocityData['R Validity'], 'x':velocityData['R POR X [px]'], 'y':velocityData['R POR Y [px]']})
-                filter = IBDT()
-                filter.runJob(columnsData,  80, 0.5, CLASSIFICATION['TERNARY'])
-                allEvents = filter.getResultFiltered()
-                spc.printToOut('I-BDT classifier finished.')
-                spc.multiData.setNode('fixation', id, allEvents[MOVEMENT['FIXATION']])
-                spc.multiData.setNode('saccade', id, allEvents[MOVEMENT['SACCADE']])
-                spc.multiData.setNode('pursuit', id, allEvents[MOVEMENT['PURSUIT']])
 
+    sweepGroup = parser.add_argument_group('sweep', 'Evaluating I-VT with every combination of threshold values, instead of classifying with fixed ones.')
+    sweepGroup.add_argument('--sweep', action='store_true', help='Export a table of event counts and duration stats per threshold set, instead of event tables (I-VT only).')
+    sweepGroup.add_argument('--sweep-velocity', type=float, nargs='+', default=[150], help='Min saccade velocity values (deg/s).')
+    sweepGroup.add_argument('--sweep-noise', type=float, nargs='+', default=[15], help='Max noise velocity values (deg/s), what counts as saccade border.')
+    sweepGroup.add_argument('--sweep-static', type=float, nargs='+', default=[0.250], help='Min interval between saccades values (s).')
+    sweepGroup.add_argument('--sweep-motion', type=float, nargs='+', default=[0.035], help='Min event duration values (s).')
 
 
-
-            #neural network CLASSIFIERS
-            if args.classifier == 'blstm':
-                #nn.LSTM(spc, spc.multiData, settingsReader=spc.settingsReader)
-                pass
-            elif args.classifier == 'fasterrcnn':
-                #nn.FasterRCNN()
-                pass
-
+    cacheGroup = parser.add_argument_group('cache', 'Persistent cache of parsed data files.')
+    cacheGroup.add_argument('--no-cache', action='store_true', help='Always parse data files from scratch, do not read or write cache.')
+    cacheGroup.add_argument('--cache-dir', type=str, default=None, help='Directory to keep cached parsed data in (default: .cache inside settings file directory).')
+    cacheGroup.add_argument('--cache-size', type=float, default=2048, help='Cache size cap in megabytes, least recently used entries are evicted beyond it.')
 
 
+    args = parser.parse_args()
+    if args.settings_file:
+        spc = SmoothPursuitClassification()
+        spc.printToOut('Using CLI with args: {0}.'.format(args))
 
-            #PLOTTING
-            #if args.plots == 'xyt':
-                #spc.CombiPlot(spc, spc.multiData, settingsReader=spc.settingsReader)
+        spc.settingsReader.select(args.settings_file)
+        spc.dataCache.configure(cacheDir=args.cache_dir, maxSizeMb=args.cache_size, enabled=not args.no_cache)
+        spc.dataReader.workers = args.jobs
+        spc.multiData.compact = args.compact
+        spc.multiData.segment = not args.no_segment
+        spc.multiData.maxGap = args.max_gap
+        spc.dataExporter.derivedOnlyNeeded = args.derived_only_needed
+        spc.dataExporter.intervalsToSettings = args.intervals_to_settings
+        if not args.all_columns:
+            spc.dataReader.columns = spc.EXPORT_COLUMNS + spc.DETECTOR_COLUMNS
+        if args.stream and args.algo != 'ivt':
+            spc.printToOut('WARNING: Streaming mode supports I-VT detector only. Reading data as a whole.')
+            args.stream = False
+
+        if args.sweep and args.algo != 'ivt':
+            spc.printToOut('WARNING: Sweep mode supports I-VT detector only. Classifying with fixed parameters.')
+            args.sweep = False
+        if args.sweep and args.stream:
+            spc.printToOut('WARNING: Sweep mode needs data as a whole. Reading data as a whole.')
+            args.stream = False
+
+        if args.stream:
+            streamJob(spc, args)
+        else:
+            spc.dataReader.read(spc.settingsReader, spc.multiData)
+            batchJob(spc, args)
 
 
 
@@ -0,0 +1,236 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+from eyestudio.Engine.Filter import Filter
+
+
+
+
+
+
+
+class EventFilter(Filter):
+
+    """Base of event detection filters, which label every sample with a state and an ordinal, then group them into events.
+
+    Keeps per-sample result and turns it into the same fixation/saccade/pursuit event tables, whatever the detection algorithm.
+    """
+
+    #per-sample result record, packed: 21 bytes per sample
+    RESULT_DTYPE = np.dtype([('Time', np.float64), ('State', np.int8), ('Value', np.float64), ('Ordinal', np.int32)])
+    STATES = {'fixation': Filter.FIXATION, 'saccade': Filter.SACCADE, 'pursuit': Filter.SMOOTH_PURSUIT}
+
+    def __init__(self):
+        super().__init__()
+
+        self.state = None
+        self.last_state = None
+
+
+
+
+
+    #INIT methods
+    def printParams(self) -> str:
+        """Returns a str describing the parameters set.
+
+        :return: all parameters for this filter.
+        """
+        res=[]
+        for k,v in self.params.items():
+            res.append('{0}: {1}'.format(k,v))
+
+        return '; '.join(res)
+
+
+    def reset(self, len:int) -> None:
+        """Clears result, preallocating structured array of given length.
+
+        :param len: data length
+        :return: None
+        """
+        self.result = np.zeros(len, dtype=self.RESULT_DTYPE)
+        self.result['Time'] = np.nan
+        self.result['Value'] = np.nan
+
+
+
+
+
+
+    #RESULT methods
+    def setResult(self, time:np.ndarray, states:np.ndarray, values:np.ndarray, ordinals:np.ndarray, setFixation=None) -> None:
+        """Writes per-sample result arrays.
+
+        :param time: timestamps (s)
+        :param states: oculomotor event codes from eyestudio.Engine.Filter
+        :param values: data point actual values
+        :param ordinals: state order numbers
+        :param setFixation: result handler, called once per sample instead, if given
+        :return: None
+        """
+        self.reset(len(time))
+        if len(time):
+            self.state = self.last_state = int(states[-1])
+
+        if setFixation is None:
+            self.result['Time'] = time
+            self.result['State'] = states
+            self.result['Value'] = values
+            self.result['Ordinal'] = ordinals
+        else:
+            for index in range(len(time)):
+                setFixation(time[index], index, states[index], values[index], ordinals[index])
+
+
+    def setFixation(self, time:float, index:int, state:int, theta:float, ordinal:int) -> None:
+        """Result handler that appends found intervals.
+
+        :param time: timestamp (s)
+        :param index: row index
+        :param state: oculomotor event code from eyestudio.Engine.Filter
+        :param theta: data point actual value
+        :param ordinal: state order number
+        :return: None
+        """
+        self.result[index] = (time, state, theta, ordinal)
+
+
+    def numberRuns(self, states:np.ndarray) -> np.ndarray:
+        """Numbers runs of every state on its own, from 1: each sample gets order number of the run it belongs to.
+
+        :param states: oculomotor event codes, one per sample.
+        :return: int array of ordinals.
+        """
+        runStarts = np.hstack((True, states[1:] != states[:-1]))
+        ordinals = np.zeros(len(states), dtype=np.int64)
+        for code in np.unique(states):
+            mask = states == code
+            ordinals[mask] = np.cumsum(runStarts & mask)[mask]
+        return ordinals
+
+
+
+
+
+    #GROUPING methods
+    def getResultFrame(self) -> DataFrame:
+        """Per-sample result as a dataframe, its columns are views of result array fields, not copies.
+
+        :return: DataFrame with Time, State, Value and Ordinal columns.
+        """
+        return DataFrame({name: self.result[name] for name in self.RESULT_DTYPE.names}, copy=False)
+
+
+    def getResultFiltered(self, state:str = '') -> DataFrame:
+        '''Groups result by State and Ordinal, yielding starting and ending time of events.
+
+        Saccade borders are extended to the nearest samples at noise level, for filters having noise_level parameter.
+
+        :param state: which state to return - 'fixation', 'saccade', 'pursuit', or empty str for all
+        :return: DataFrame with start/end timestamps for each ordinal, empty one if there is no such state
+        '''
+        concatenated = self.groupResult()
+        if 'noise_level' in self.params:
+            concatenated = self.extendSaccades(concatenated, self.getParameter('noise_level'))
+
+        #filtering
+        concatenated = self.filterValues(concatenated)
+        if state=='':
+            return concatenated
+        elif state in self.STATES:
+            if self.STATES[state] in concatenated.index.get_level_values(0):
+                return concatenated.loc[self.STATES[state]]
+            else:
+                return DataFrame()
+        else:
+            raise ValueError('state specified wrong.')
+
+
+    def groupResult(self) -> DataFrame:
+        """Groups result by State and Ordinal, as is.
+
+        :return: DataFrame with sample count, start/end timestamps and mean value for each ordinal.
+        """
+        #FIXME timestamp column name hard-coded
+        grouped      = self.getResultFrame().groupby(by=['State', 'Ordinal'], sort=True)
+        aggregated   = grouped['Time'].agg(['count', 'min', 'max'])
+        aggregated2  = grouped['Value'].agg(['mean'])
+        return pd.concat((aggregated, aggregated2), axis=1)
+
+
+    def extendSaccades(self, grouped:DataFrame, thres:float) -> DataFrame:
+        """Extends saccade borders to the nearest samples at noise level.
+
+        :param grouped: DataFrame as groupResult returns, modified in place.
+        :param thres: noise level value.
+        :return: the same DataFrame.
+        """
+        saccades = grouped.index.get_level_values(0) == self.SACCADE
+        if not saccades.any():
+            return grouped
+
+        #motion offsets
+        time = self.result['Time']
+        offsets = self.traverseOffsets(data=self.result['Value'], sindex=self.getFirstIndices(time, grouped.loc[saccades, 'min'].values),
+                                                                  eindex=self.getFirstIndices(time, grouped.loc[saccades, 'max'].values),
+                                                                  thres=thres)
+        #расширяем границы
+        grouped.loc[saccades, 'min'] = time[offsets[0]]
+        grouped.loc[saccades, 'max'] = time[offsets[1]]
+        return grouped
+
+
+
+    def getFirstIndices(self, time:np.ndarray, values:np.ndarray) -> np.ndarray:
+        """Finds first row of each timestamp value.
+
+        :param time: timestamps of result.
+        :param values: timestamps to look up, all present in time.
+        :return: row indices.
+        """
+        unique, first = np.unique(time, return_index=True)
+        return first[np.searchsorted(unique, values)]
+
+
+    def traverseOffsets(self, data:np.ndarray, sindex:np.ndarray, eindex:np.ndarray, thres:float) -> tuple:
+        """Finds nearest samples at or below threshold value, before event starts and after event ends.
+
+        Positions of such samples are looked up once, then searched for all events at once.
+
+        :param data: values of all samples.
+        :param sindex: start indices of events.
+        :param eindex: end indices of events.
+        :param thres: value to search for
+        :return: tuple of found start and end indices arrays
+        """
+        low = np.flatnonzero(data <= thres)
+        #no such samples - events are extended to data borders
+        if not len(low):
+            return (np.zeros(len(sindex), dtype=np.int64), np.full(len(eindex), len(data) - 1))
+
+        before = np.searchsorted(low, sindex, side='left') - 1
+        svalue = np.where(before >= 0, low[before.clip(0)], 0)
+
+        after = np.searchsorted(low, eindex, side='left')
+        evalue = np.where(after < len(low), low[after.clip(max=len(low) - 1)], len(data) - 1)
+
+        return (svalue, evalue)
+
+
+
+
+
+    #FILTERING methods
+    def filterValues(self, values:DataFrame) -> DataFrame:
+        """Filter out results based on condition.
+
+        :param values: data to filter
+        :return: filtered data
+        """
+        minMotion = self.params.get('min_motion', 0)
+        values['dur'] = values['max'] - values['min']
+        res = values[values['dur'] >= minMotion]
+        return res
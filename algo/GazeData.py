@@ -1,4 +1,5 @@
 #TODO move whole class to IBDT.py
+import numpy as np
 
 
 
@@ -13,23 +14,85 @@ MOVEMENT = {'FIXATION':0,
 
 
 
-class GazeDataEntry():
+def arrayField(name:str, doc:str) -> property:
+    """Property of a sample view, reading and writing one element of the named array of its data.
+
+    :param name: array attribute name of data object.
+    :param doc: property docstring.
+    :return: property object.
+    """
+    def get(self):
+        return getattr(self.data, name)[self.index]
+
+    def set(self, value):
+        getattr(self.data, name)[self.index] = value
+
+    return property(get, set, doc=doc)
+
+
+
+
+class GazeData():
     """Helper class
-    IS a data sample with only 4 values: timestamp, eyetracking quality confidence, X and Y coordinates.
+    IS data samples as contiguous arrays, one per value: timestamp, eyetracking quality confidence, X and Y coordinates,
+    velocity and classification.
 
     """
-    def __init__(self, ts:float, confidence:float, x:float, y:float):
+    def __init__(self, ts:np.ndarray, confidence:np.ndarray, x:np.ndarray, y:np.ndarray):
         #milliseconds!
-        self.ts = ts
+        self.ts = np.asarray(ts, dtype=float)
+
+        self.confidence = np.asarray(confidence, dtype=float)
+
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+
+        self.v = np.zeros(len(self.ts))
+
+        self.classification = np.full(len(self.ts), MOVEMENT['UNDEF'], dtype=np.int8)
+
+
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
 
-        self.confidence = confidence
+    def __getitem__(self, index:int) -> object:
+        """
+
+        :param index: sample index.
+        :return: GazeDataEntry view of the sample.
+        """
+        return GazeDataEntry(self, index)
+
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
 
-        self.x = x
-        self.y = y
 
-        self.v = 0.0
 
-        self.classification = MOVEMENT['UNDEF']
+
+
+
+class GazeDataEntry():
+    """Helper class
+    IS a view of one data sample of GazeData, its values are read from and written to data arrays.
+
+    """
+    __slots__ = ('data', 'index')
+
+    ts = arrayField('ts', 'Timestamp, milliseconds!')
+    confidence = arrayField('confidence', 'Eyetracking quality confidence.')
+    x = arrayField('x', 'X coordinate.')
+    y = arrayField('y', 'Y coordinate.')
+    v = arrayField('v', 'Velocity since previous valid sample.')
+    classification = arrayField('classification', 'MOVEMENT code.')
+
+
+    def __init__(self, data:GazeData, index:int):
+        self.data = data
+        self.index = index
 
 
 
@@ -87,5 +150,3 @@ class GazeDataEntry():
         """
         #return int(0)
         pass	#?
-
-
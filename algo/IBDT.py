@@ -1,8 +1,4 @@
 #TODO try angular speed mode
-from collections import deque
-
-
-
 import numpy as np
 from pandas import DataFrame
 
@@ -11,6 +7,7 @@ import cv2
 
 
 
+from algo.GazeData import GazeData
 from algo.GazeData import GazeDataEntry
 from algo.GazeData import MOVEMENT
 
@@ -32,6 +29,8 @@ class IBDT():
     Contains methods for training and data manipulation.
 
     Confidence column is not meaningful for SMI eyetrackers. Replaced by 1-validity.
+    Samples are kept in IBDT_Samples arrays, and every step is done for all samples at once;
+    window of each sample is found by its timestamp, so timestamps must be ascending.
 
     Based on Santini, Fuhl, Kubler, Kasneci, University of Tubingen, 2016, 2017.
     Ported by ivan866 on 2018.12.19.
@@ -43,12 +42,7 @@ class IBDT():
         self.classification = classification
 
 
-        #TODO maybe change to list
-        self.window = deque()
-        self.cur  = IBDT_Data(base=GazeDataEntry(ts=0.0, confidence=0.0, x=0.0, y=0.0))
-        self.prev = IBDT_Data(base=GazeDataEntry(ts=0.0, confidence=0.0, x=0.0, y=0.0))
-
-        self.firstPoint = False
+        self.result = None
 
 
 
@@ -67,112 +61,69 @@ class IBDT():
 
 
     #DATA calculating methods
-    def addPoint(self, entry:object) -> None:
-        """Calculates velocity and classifies event type of the given sample, if already trained.
+    def classify(self, samples:object) -> None:
+        """Calculates velocity and classifies event type of all samples, if already trained.
 
-        Not a method for aggregating data samples. Method is for using the classifier.
+        Each confident sample is classified over the window of confident samples preceding it, within 2 max saccade durations.
 
-        :param entry: IBDT_Data to classify event on.
+        :param samples: IBDT_Samples to classify events on.
         :return:
         """
-        entry.base.classification = MOVEMENT['UNDEF']
+        samples.classification[:] = MOVEMENT['UNDEF']
 
         #Low confidence, ignore it
-        if entry.base.confidence < self.minSampleConfidence:
+        indices = np.flatnonzero(samples.confidence >= self.minSampleConfidence)
+        if not len(indices):
             return None
 
 
 
-        #Add new point to window and update previous valid point
-        self.window.append( entry )
-        self.prev = self.cur
-        self.cur = self.window[len(self.window)-1]
-
-        #Remove old entries from window
-        while True:
-            #TODO math.abs() needed??
-            if (self.cur.base.ts - self.window[0].base.ts) > (2*self.maxSaccadeDurationMs):
-                self.window.popleft()
-            else:
-                break
-
-
-        #First point being classified is a special case (since we classify interframe periods)
-        if not self.prev:
-            self.cur.base.classification = MOVEMENT['UNDEF']
-            entry.base.classification = self.cur.base.classification
-            return None
+        #We have intersample periods, let's classify them
+        #first point is measured from a blank sample at zero coordinates and time, classifier starts with
+        samples.v[indices[:1]] = self.estimateVelocity(samples, indices[:1], None)
+        samples.v[indices[1:]] = self.estimateVelocity(samples, indices[1:], indices[:-1])
+        starts = self.getWindowStarts(samples.ts[indices])
 
-
-
-        #We have an intersample period, let's classify it
-        self.cur.base.v = self.estimateVelocity(self.cur, self.prev)
+        #Update the likelihoods, pursuit one is needed for priors of following samples
+        self.updatePursuitLikelihood(samples, indices, starts)
+        self.updateFixationAndSaccadeLikelihood(samples, indices)
 
         #Update the priors
-        self.updatePursuitPrior()
-        self.cur.fixation.prior = 1 - self.cur.pursuit.prior
-        self.cur.saccade.prior = self.cur.fixation.prior
-
-
-        #Update the likelihoods
-        self.updatePursuitLikelihood()
-        self.updateFixationAndSaccadeLikelihood()
+        self.updatePursuitPrior(samples, indices, starts)
+        samples.priors[indices, MOVEMENT['FIXATION']] = 1 - samples.priors[indices, MOVEMENT['PURSUIT']]
+        samples.priors[indices, MOVEMENT['SACCADE']] = samples.priors[indices, MOVEMENT['FIXATION']]
 
 
         #Update the posteriors
-        self.cur.pursuit.update()
-        self.cur.fixation.update()
-        self.cur.saccade.update()
+        samples.posteriors[indices] = samples.priors[indices] * samples.likelihoods[indices]
 
 
 
         #Decision
         if self.classification == CLASSIFICATION['TERNARY']:
-            self.ternaryClassification()
+            self.ternaryClassification(samples, indices)
         elif self.classification == CLASSIFICATION['BINARY']:
-            self.binaryClassification()
+            self.binaryClassification(samples, indices)
 
 
-        entry.classification = self.cur.base.classification
 
 
-
-
-    def train(self, gaze:list) -> None:
+    def train(self, samples:object) -> None:
         """Perform training on the data specified, split velocity means on 2 clusters and update model hyperparameters.
 
-        :param gaze: list of IBDT_Data to train on.
+        :param samples: IBDT_Samples to train on.
         :return:
         """
-        samples = deque()
-
-
+        #not fully applicable to SMI data
+        valid = samples.confidence >= self.minSampleConfidence
+        indices = np.flatnonzero(valid)
+        samples.v[~valid] = np.nan
 
-        #Find first valid sample
-        for index in range(0, len(gaze)):
-            previous = gaze[index]
-            if (previous != gaze[len(gaze)-1]) and (previous.base.confidence < self.minSampleConfidence):
-                previous.base.v = np.nan
-                continue
-            else:
-                break
 
-
-        #Estimate velocities for remaining training samples
-        #TODO refactor to apply() on dataframe
-        for index2 in range(index+1, len(gaze)):
-            g = gaze[index2]
-            #not fully applicable to SMI data
-            if g.base.confidence < self.minSampleConfidence:
-                g.base.v = np.nan
-                continue
-
-
-            g.base.v = self.estimateVelocity( g, previous )
-            if not np.isnan(g.base.v):
-                samples.append(g.base.v)
-
-            previous = g
+        #Estimate velocities for training samples, all valid but first
+        samples.v[indices[1:]] = self.estimateVelocity(samples, indices[1:], indices[:-1])
+        velocities = samples.v[indices[1:]]
+        velocities = velocities[~np.isnan(velocities)]
 
 
 
@@ -182,7 +133,7 @@ class IBDT():
         self.model.setCovarianceMatrixType(cv2.ml.EM_COV_MAT_GENERIC)
         #TODO + or binary OR??
         self.model.setTermCriteria((cv2.TERM_CRITERIA_COUNT + cv2.TERM_CRITERIA_EPS, 15000, 1e-6))
-        self.model.trainEM(np.array(samples))
+        self.model.trainEM(velocities)
 
 
 
@@ -202,28 +153,55 @@ class IBDT():
 
 
 
-    def estimateVelocity(self, cur:object, prev:object) -> float:
+    def estimateVelocity(self, samples:object, cur:np.ndarray, prev:np.ndarray) -> np.ndarray:
         """Simple velocity, no smoothing, no angular speed.
 
-        :param cur:
-        :param prev:
-        :return: velocity from trigonometric distance (incorrect)
+        :param samples: IBDT_Samples.
+        :param cur: sample indices.
+        :param prev: indices of samples to measure from, None for blank sample at zero coordinates and time.
+        :return: velocities from trigonometric distance (incorrect)
         """
+        if prev is None:
+            px, py, pts = 0.0, 0.0, 0.0
+        else:
+            px, py, pts = samples.x[prev], samples.y[prev], samples.ts[prev]
+
         #TODO simple trigonometric distance, must be cosine law for spherical eye model
-        dist = cv2.norm( np.array([cur.base.x, cur.base.y]), np.array([prev.base.x, prev.base.y]) )
-        dt = cur.base.ts - prev.base.ts
-        return dist / dt
+        dist = np.sqrt( (samples.x[cur] - px) ** 2 + (samples.y[cur] - py) ** 2 )
+        dt = samples.ts[cur] - pts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return dist / dt
+
+
 
+    def getWindowStarts(self, ts:np.ndarray) -> np.ndarray:
+        """Finds first sample of each sample window, not older than 2 max saccade durations.
 
+        Found by binary search, then corrected to the exact comparison classification window always used.
 
-    def runJob(self, data:DataFrame,  maxSaccadeDurationMs:float, minSampleConfidence:float, classification:int) -> list:
+        :param ts: timestamps of confident samples, ascending.
+        :return: indices into ts.
+        """
+        limit = 2*self.maxSaccadeDurationMs
+        positions = np.arange(len(ts))
+        starts = np.minimum(np.searchsorted(ts, ts - limit, side='left'), positions)
+        while True:
+            late = (starts < positions) & ((ts - ts[starts]) > limit)
+            early = (starts > 0) & ((ts - ts[starts - 1]) <= limit)
+            if not (late.any() or early.any()):
+                return starts
+            starts = starts + late - early
+
+
+
+    def runJob(self, data:DataFrame,  maxSaccadeDurationMs:float, minSampleConfidence:float, classification:int) -> object:
         """Sets classifier parameters, runs classification and returns list of specified event type.
 
         :param data: pandas dataframe with 4 columns - time(ms), validity(higher is more valid), x(px or mm), y(px or mm).
         :param maxSaccadeDurationMs: saccades longer than this will not be classified as saccades.
         :param minSampleConfidence: validity lower than this will be considered undefined sample.
         :param classification: int code whether to classify pursuits or fixations and saccades only.
-        :return: list of IBDT_Data with events classified.
+        :return: IBDT_Samples with events classified, indexing it gives IBDT_Data views.
         """
         self.maxSaccadeDurationMs = maxSaccadeDurationMs
         self.minSampleConfidence = minSampleConfidence
@@ -231,15 +209,12 @@ class IBDT():
 
 
         #----
-        ibdtData = []
-        for index, row in data.iterrows():
-            ibdtData.append(IBDT_Data( base=GazeDataEntry(ts=row[0], confidence=row[1], x=row[2], y=row[3]) ))
+        samples = IBDT_Samples(ts=data.iloc[:, 0].values, confidence=data.iloc[:, 1].values, x=data.iloc[:, 2].values, y=data.iloc[:, 3].values)
 
         #----
-        self.train(ibdtData)
-        for pt in ibdtData:
-            self.addPoint(pt)
-        self.result = ibdtData
+        self.train(samples)
+        self.classify(samples)
+        self.result = samples
 
 
         return self.result
@@ -251,10 +226,7 @@ class IBDT():
 
         :return: tuple of 3 dataframes - fixations, saccades, smooth pursuits.
         """
-        outAr = []
-        for pt in self.result:
-            outAr.append([pt.base.ts / 1000, pt.base.classification])
-        output = DataFrame(outAr, columns=['Time', 'EventId'])
+        output = DataFrame({'Time': self.result.ts / 1000, 'EventId': self.result.classification.astype(np.int64)})
 
         #----
         #выделяем границы всех найденных событий
@@ -279,71 +251,82 @@ class IBDT():
 
 
     #UPDATE methods
-    def updatePursuitPrior(self) -> None:
-        """Calculates mean of all ?but last window values.
+    def updatePursuitPrior(self, samples:object, indices:np.ndarray, starts:np.ndarray) -> None:
+        """Calculates mean of pursuit likelihoods over the window but its last sample, from cumulative sums.
 
+        :param samples: IBDT_Samples.
+        :param indices: confident sample indices.
+        :param starts: window starts, as indices into indices.
         :return:
         """
-        #TODO refactor whole method to list comprehension
-        previousLikelihoods = []
-        for index in range(0, len(self.window)-1):
-            d = self.window[index]
-            previousLikelihoods.append(d.pursuit.likelihood)
-
-        self.cur.pursuit.prior = np.mean(previousLikelihoods)
+        positions = np.arange(len(indices))
+        sums = np.hstack((0, np.cumsum(samples.likelihoods[indices, MOVEMENT['PURSUIT']])))
+        #NaN for a window of one sample
+        with np.errstate(divide='ignore', invalid='ignore'):
+            samples.priors[indices, MOVEMENT['PURSUIT']] = (sums[positions] - sums[starts]) / (positions - starts)
 
 
 
 
-    def updatePursuitLikelihood(self) -> None:
-        """Calculates proportion of all but first velocities which values fall between model hyperparameters.
+    def updatePursuitLikelihood(self, samples:object, indices:np.ndarray, starts:np.ndarray) -> None:
+        """Calculates proportion of all but first window velocities which values fall between model hyperparameters.
 
+        :param samples: IBDT_Samples.
+        :param indices: confident sample indices.
+        :param starts: window starts, as indices into indices.
         :return:
         """
-        if len(self.window) < 2:
-            return None
-
-        movement = 0.0
-        for index in range(1, len(self.window)):
-            #if (d-v > 0) #original
-            d = self.window[index]
-            # adaptive: don't activate with too small or too large movements
-            if (d.base.v > self.fMean) and (d.base.v < self.sMean):
-                movement = movement+1
+        v = samples.v[indices]
+        #if (d-v > 0) #original
+        # adaptive: don't activate with too small or too large movements
+        movement = np.hstack((0, np.cumsum((v > self.fMean) & (v < self.sMean))))
 
-        n = len(self.window)-1
-        movementRatio = float(movement / n)
-        self.cur.pursuit.likelihood = movementRatio
+        positions = np.arange(len(indices))
+        n = positions - starts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            movementRatio = (movement[positions + 1] - movement[starts + 1]) / n
+        samples.likelihoods[indices, MOVEMENT['PURSUIT']] = np.where(n > 0, movementRatio, 0.0)
 
 
 
 
 
-    def updateFixationAndSaccadeLikelihood(self) -> None:
-        """Queries the model for predicted likelihoods, writes them to cur sample.
+    def updateFixationAndSaccadeLikelihood(self, samples:object, indices:np.ndarray) -> None:
+        """Queries the model for predicted likelihoods of velocities between model means, writes them to samples.
 
+        :param samples: IBDT_Samples.
+        :param indices: confident sample indices.
         :return:
         """
-        if self.cur.base.v < self.fMean:
-            self.cur.fixation.likelihood = 1
-            self.cur.saccade.likelihood = 0
-            return None
+        v = samples.v[indices]
+        slow = v < self.fMean
+        fast = ~slow & (v > self.sMean)
+        between = ~slow & ~fast
 
-        if self.cur.base.v > self.sMean:
-            self.cur.fixation.likelihood = 0
-            self.cur.saccade.likelihood = 1
-            return None
+        likelihoods = np.zeros((len(indices), 2))
+        likelihoods[slow, self.fIdx] = 1
+        likelihoods[fast, self.sIdx] = 1
+        if between.any():
+            try:
+                likelihoods[between] = self.model.predict( v[between].reshape(-1, 1) )[1]
+            except cv2.error:
+                likelihoods[between] = [self.predictSample(value) for value in v[between]]
+
+        samples.likelihoods[indices, MOVEMENT['FIXATION']] = likelihoods[:, self.fIdx]
+        samples.likelihoods[indices, MOVEMENT['SACCADE']] = likelihoods[:, self.sIdx]
 
 
-        sample = np.array(self.cur.base.v)
+    def predictSample(self, value:float) -> np.ndarray:
+        """Queries the model for predicted likelihoods of one velocity.
+
+        :param value: velocity.
+        :return: likelihoods of model clusters.
+        """
         try:
-            likelihoods = self.model.predict( sample )[1][0]
-            self.cur.fixation.likelihood = likelihoods[self.fIdx]
-            self.cur.saccade.likelihood = likelihoods[self.sIdx]
+            return self.model.predict( np.array(value) )[1][0]
         #all zeros in sample
         except cv2.error:
-            self.cur.fixation.likelihood = 0.0
-            self.cur.saccade.likelihood = 0.0
+            return np.zeros(2)
 
 
 
@@ -351,41 +334,43 @@ class IBDT():
 
 
     #STATUS methods
-    def binaryClassification(self) -> None:
+    def binaryClassification(self, samples:object, indices:np.ndarray) -> None:
         """Simple 2-class likelihood comparison.
 
+        :param samples: IBDT_Samples.
+        :param indices: confident sample indices.
         :return:
         """
-        if self.cur.fixation.likelihood > self.cur.saccade.likelihood:
-            self.cur.classification = MOVEMENT['FIXATION']
-        else:
-            self.cur.classification = MOVEMENT['SACCADE']
+        likelihoods = samples.likelihoods[indices]
+        samples.classification[indices] = np.where(likelihoods[:, MOVEMENT['FIXATION']] > likelihoods[:, MOVEMENT['SACCADE']], MOVEMENT['FIXATION'], MOVEMENT['SACCADE'])
 
 
 
 
-    def ternaryClassification(self) -> None:
+    def ternaryClassification(self, samples:object, indices:np.ndarray) -> None:
         """3-class Bayesian posterior comparison.
 
+        :param samples: IBDT_Samples.
+        :param indices: confident sample indices.
         :return:
         """
         #Class that maximizes posterior probability
-        maxPosterior = self.cur.fixation.posterior
-        self.cur.base.classification = MOVEMENT['FIXATION']
+        posteriors = samples.posteriors[indices]
+        maxPosterior = posteriors[:, MOVEMENT['FIXATION']]
+        classification = np.full(len(indices), MOVEMENT['FIXATION'])
 
 
-        if self.cur.saccade.posterior > maxPosterior:
-            self.cur.base.classification = MOVEMENT['SACCADE']
-            maxPosterior = self.cur.saccade.posterior
+        saccade = posteriors[:, MOVEMENT['SACCADE']] > maxPosterior
+        classification[saccade] = MOVEMENT['SACCADE']
+        maxPosterior = np.where(saccade, posteriors[:, MOVEMENT['SACCADE']], maxPosterior)
 
-        if self.cur.pursuit.posterior > maxPosterior:
-            self.cur.base.classification = MOVEMENT['PURSUIT']
+        classification[posteriors[:, MOVEMENT['PURSUIT']] > maxPosterior] = MOVEMENT['PURSUIT']
 
 
 
         #Catch up saccades as saccades
-        if self.cur.base.v > self.sMean:
-            self.cur.base.classification = MOVEMENT['SACCADE']
+        classification[samples.v[indices] > self.sMean] = MOVEMENT['SACCADE']
+        samples.classification[indices] = classification
 
 
 
@@ -395,15 +380,67 @@ class IBDT():
 
 
 #----
+class IBDT_Samples(GazeData):
+    """Helper class
+    Makes data samples, with prior, likelihood and posterior of every movement type
+    as arrays of shape (n, 3), columns indexed by MOVEMENT code.
+
+    """
+    def __init__(self, ts:np.ndarray, confidence:np.ndarray, x:np.ndarray, y:np.ndarray):
+        super().__init__(ts, confidence, x, y)
+
+        self.priors = np.zeros((len(self.ts), 3))
+        self.likelihoods = np.zeros((len(self.ts), 3))
+        self.posteriors = np.zeros((len(self.ts), 3))
+
+
+    def __getitem__(self, index:int) -> object:
+        """
+
+        :param index: sample index.
+        :return: IBDT_Data view of the sample.
+        """
+        return IBDT_Data(self, index)
+
+
+
+
+
+
+def probField(name:str, doc:str) -> property:
+    """Property of a probability view, reading and writing one element of the named (n, 3) array of its samples.
+
+    :param name: array attribute name of IBDT_Samples.
+    :param doc: property docstring.
+    :return: property object.
+    """
+    def get(self):
+        return getattr(self.data, name)[self.index, self.column]
+
+    def set(self, value):
+        getattr(self.data, name)[self.index, self.column] = value
+
+    return property(get, set, doc=doc)
+
+
+
+
 class IBDT_Prob():
     """Helper class
-    Contains attributes of a data sample.
+    Contains attributes of a data sample, as a view of one movement type column of IBDT_Samples arrays.
 
     """
-    def __init__(self, prior:float = 0.0, likelihood:float = 0.0, posterior:float = 0.0):
-        self.prior = prior
-        self.likelihood = likelihood
-        self.posterior = posterior
+    __slots__ = ('data', 'index', 'column')
+
+    prior = probField('priors', 'Prior probability.')
+    likelihood = probField('likelihoods', 'Likelihood.')
+    posterior = probField('posteriors', 'Posterior probability.')
+
+
+    def __init__(self, data:IBDT_Samples, index:int, column:int):
+        self.data = data
+        self.index = index
+        self.column = column
 
 
     def update(self) -> None:
@@ -421,15 +458,14 @@ class IBDT_Prob():
 
 class IBDT_Data():
     """Helper class
-    Makes a data sample.
+    Makes a view of one data sample of IBDT_Samples.
 
     """
-    #TODO adapt for direct dataframe input
-    def __init__(self, base:GazeDataEntry):
-        self.base = base
-
-        self.pursuit = IBDT_Prob()
-        self.fixation = IBDT_Prob()
-        self.saccade = IBDT_Prob()
+    __slots__ = ('base', 'pursuit', 'fixation', 'saccade')
 
+    def __init__(self, data:IBDT_Samples, index:int):
+        self.base = GazeDataEntry(data, index)
 
+        self.pursuit = IBDT_Prob(data, index, MOVEMENT['PURSUIT'])
+        self.fixation = IBDT_Prob(data, index, MOVEMENT['FIXATION'])
+        self.saccade = IBDT_Prob(data, index, MOVEMENT['SACCADE'])
@@ -0,0 +1,136 @@
+from collections import deque
+
+
+import numpy as np
+from pandas import DataFrame
+
+
+from algo.EventFilter import EventFilter
+
+
+
+
+
+
+
+class IDTFilter(EventFilter):
+
+    """Dispersion threshold identification: samples staying within max_dispersion for at least min_duration are fixation, others are saccade.
+
+    Dispersion of a window is (max X - min X) + (max Y - min Y). Window slides over data with its extremes kept in monotonic deques,
+    so every sample enters and leaves them once, and the whole pass is linear in data length.
+    """
+    def __init__(self):
+        super().__init__()
+
+
+
+
+
+
+    #CALCULATING methods
+    def process(self, data:DataFrame, setFixation=None) -> None:
+        """Main filtering routine.
+
+        :param data: timestamp (s), gaze X and Y (deg), optionally angular velocity (deg/s); NaN positions for samples without valid gaze
+        :param setFixation: result handler, called once per sample with its final state, if given
+        :return: None
+        """
+        #FIXME implicitly assuming timestamps on column 0
+        time = data.iloc[:, 0].values.astype(float)
+        x = data.iloc[:, 1].values.astype(float)
+        y = data.iloc[:, 2].values.astype(float)
+        value = np.abs(data.iloc[:, 3].values.astype(float)) if data.shape[1] > 3 else np.full(len(time), np.nan)
+
+        valid = ~(np.isnan(x) | np.isnan(y))
+        states = np.where(valid, self.SACCADE, self.NOT_FOUND)
+        states[self.findFixations(time, x, y, valid)] = self.FIXATION
+
+        self.setResult(time, states, value, self.numberRuns(states), setFixation)
+
+
+
+    def findFixations(self, time:np.ndarray, x:np.ndarray, y:np.ndarray, valid:np.ndarray) -> np.ndarray:
+        """Marks fixation samples, windows never spanning samples which are not valid.
+
+        :param time: timestamps (s)
+        :param x: gaze X (deg)
+        :param y: gaze Y (deg)
+        :param valid: samples allowed to be fixation
+        :return: bool array
+        """
+        fixation = np.zeros(len(time), dtype=bool)
+        starts = np.flatnonzero(valid & ~np.hstack((False, valid[:-1])))
+        ends = np.flatnonzero(valid & ~np.hstack((valid[1:], False))) + 1
+        for start, end in zip(starts, ends):
+            self.markFixations(time, x, y, start, end, fixation)
+        return fixation
+
+
+    def markFixations(self, time:np.ndarray, x:np.ndarray, y:np.ndarray, start:int, end:int, fixation:np.ndarray) -> None:
+        """Slides dispersion window over one segment of data, marking fixations found.
+
+        Window [i, j) is first grown to cover min_duration. If its dispersion is within the threshold, it is grown further
+        while it stays so, marked as fixation, and the next window starts after it; otherwise window start moves by one sample.
+
+        :param time: timestamps (s)
+        :param x: gaze X (deg)
+        :param y: gaze Y (deg)
+        :param start: segment start index
+        :param end: segment end index, exclusive
+        :param fixation: bool array to mark fixations in
+        :return: None
+        """
+        maxDispersion = self.getParameter('max_dispersion')
+        minDuration = self.getParameter('min_duration')
+
+        #window extremes: indices with increasing values for minimum, decreasing for maximum
+        xmin, xmax, ymin, ymax = deque(), deque(), deque(), deque()
+        def push(k:int) -> None:
+            while xmin and x[xmin[-1]] >= x[k]: xmin.pop()
+            while xmax and x[xmax[-1]] <= x[k]: xmax.pop()
+            while ymin and y[ymin[-1]] >= y[k]: ymin.pop()
+            while ymax and y[ymax[-1]] <= y[k]: ymax.pop()
+            xmin.append(k); xmax.append(k); ymin.append(k); ymax.append(k)
+
+        i = j = start
+        while i < end:
+            for extremes in (xmin, xmax, ymin, ymax):
+                while extremes and extremes[0] < i:
+                    extremes.popleft()
+            if j <= i:
+                j = i
+            while j < end and (j == i or time[j-1] - time[i] < minDuration):
+                push(j)
+                j = j + 1
+            #rest of segment is shorter than min_duration
+            if time[j-1] - time[i] < minDuration:
+                break
+
+            if (x[xmax[0]] - x[xmin[0]]) + (y[ymax[0]] - y[ymin[0]]) > maxDispersion:
+                i = i + 1
+                continue
+
+            #dispersion with the next sample is checked before it enters the window
+            while j < end and (max(x[xmax[0]], x[j]) - min(x[xmin[0]], x[j])) + (max(y[ymax[0]], y[j]) - min(y[ymin[0]], y[j])) <= maxDispersion:
+                push(j)
+                j = j + 1
+            fixation[i:j] = True
+            i = j
+
+
+
+    def runJob(self, data:DataFrame, max_dispersion:float, min_duration:float, min_motion:float) -> None:
+        """Sets filter parameters, processes the data and returns the filtered result.
+
+        :param data: pandas dataframe with timestamp, gaze X and Y, and optionally angular velocity columns
+        :param max_dispersion: max window dispersion (deg), otherwise consider as saccade
+        :param min_duration: min fixation duration (s)
+        :param min_motion: min event duration, otherwise omit this event
+        :return: None
+        """
+        self.setParameter('max_dispersion', max_dispersion)
+        self.setParameter('min_duration', min_duration)
+        self.setParameter('min_motion', min_motion)
+
+        self.process(data)
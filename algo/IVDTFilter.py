@@ -0,0 +1,66 @@
+import numpy as np
+from pandas import DataFrame
+
+
+from algo.IDTFilter import IDTFilter
+
+
+
+
+
+
+
+class IVDTFilter(IDTFilter):
+
+    """Velocity-dispersion threshold identification: angular velocity above min_velocity is saccade,
+    then dispersion window of I-DT separates fixations from smooth pursuit among the remaining samples."""
+    def __init__(self):
+        super().__init__()
+
+
+
+
+
+
+    #CALCULATING methods
+    def process(self, data:DataFrame, setFixation=None) -> None:
+        """Main filtering routine.
+
+        :param data: timestamp (s), gaze X and Y (deg), angular velocity (deg/s); NaN for samples without valid gaze
+        :param setFixation: result handler, called once per sample with its final state, if given
+        :return: None
+        """
+        #FIXME implicitly assuming timestamps on column 0
+        time = data.iloc[:, 0].values.astype(float)
+        x = data.iloc[:, 1].values.astype(float)
+        y = data.iloc[:, 2].values.astype(float)
+        theta = np.abs(data.iloc[:, 3].values.astype(float))
+
+        valid = ~(np.isnan(x) | np.isnan(y) | np.isnan(theta))
+        saccade = valid & (theta >= self.getParameter('min_velocity'))
+        states = np.select([~valid, saccade], [self.NOT_FOUND, self.SACCADE], self.SMOOTH_PURSUIT)
+        #dispersion windows do not span saccades
+        states[self.findFixations(time, x, y, valid & ~saccade)] = self.FIXATION
+
+        self.setResult(time, states, theta, self.numberRuns(states), setFixation)
+
+
+
+    def runJob(self, data:DataFrame,  min_velocity:float, max_dispersion:float, min_duration:float, noise_level:float, min_motion:float) -> None:
+        """Sets filter parameters, processes the data and returns the filtered result.
+
+        :param data: pandas dataframe with timestamp, gaze X and Y, and angular velocity columns
+        :param min_velocity: min saccade velocity, otherwise consider as fixation or pursuit
+        :param max_dispersion: max window dispersion (deg), otherwise consider as pursuit
+        :param min_duration: min fixation duration (s)
+        :param noise_level: max noise velocity, what counts as saccade border
+        :param min_motion: min event duration, otherwise omit this event
+        :return: None
+        """
+        self.setParameter('min_velocity', min_velocity)
+        self.setParameter('max_dispersion', max_dispersion)
+        self.setParameter('min_duration', min_duration)
+        self.setParameter('noise_level', noise_level)
+        self.setParameter('min_motion', min_motion)
+
+        self.process(data)
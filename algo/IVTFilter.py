@@ -1,8 +1,9 @@
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
 
-from eyestudio.Engine.Filter import Filter
+from algo.EventFilter import EventFilter
 
 
 
@@ -10,40 +11,12 @@ from eyestudio.Engine.Filter import Filter
 
 
 
-class IVTFilter(Filter):
+class IVTFilter(EventFilter):
 
     """Receives angular velocity on input and outputs intervals above threshold."""
     def __init__(self):
         super().__init__()
 
-        self.state = None
-        self.last_state = None
-
-
-
-
-
-    #INIT methods
-    def printParams(self) -> str:
-        """Returns a str describing the parameters set.
-
-        :return: all parameters for this filter.
-        """
-        res=[]
-        for k,v in self.params.items():
-            res.append('{0}: {1}'.format(k,v))
-
-        return '; '.join(res)
-
-
-    def reset(self, len:int) -> None:
-        """Clears result.
-
-        :param len: data length
-        :return: None
-        """
-        self.result = [float('nan') for i in range(len)]
-
 
 
 
@@ -53,64 +26,60 @@ class IVTFilter(Filter):
     def process(self, data:DataFrame, setFixation=None) -> None:
         """Main filtering routine.
 
-        :param data: timestamp (s), angular velocity (deg/s) component
-        :param setFixation: result appending handler
+        Velocity is thresholded as a whole array, then fixation runs shorter than min_static are demoted to saccades,
+        ordinals are numbered by cumulative sum over fixation run starts.
+
+        :param data: timestamp (s), angular velocity (deg/s) component, NaN velocity for samples without valid gaze
+        :param setFixation: result handler, called once per sample with its final state, if given
         :return: None
         """
         #FIXME implicitly assuming timestamps on column 0
-        self.reset(data.shape[0])
-
-
         thresh = self.getParameter('min_velocity')
         minTime = self.getParameter('min_static')
 
-
-        if setFixation is None:
-            setFixation = self.setFixation
+        time = data.iloc[:, 0].values.astype(float)
+        theta = np.abs(data.iloc[:, 1].values.astype(float))
+        length = len(time)
+        if not length:
+            self.reset(0)
+            return None
 
 
         #----
-        fixationStart = 0
-        ordinal = 0
-        for index in range(data.shape[0]):
-            time  = data.iloc[index, 0]
-            theta = abs(data.iloc[index, 1])
-
-
-            if theta < thresh:
-                self.state = Filter.FIXATION
-
-                if self.last_state != self.state:
-                    ordinal = ordinal+1
-                    fixationStart = index
-            else:
-                if self.last_state == Filter.FIXATION:
-                    # Check if it's long enough
-                    dur = time - data.iloc[fixationStart, 0]
-                    if dur < minTime:
-                        ordinal = ordinal - 1
-                        # Make all into saccades again
-                        for i in range(fixationStart, index):
-                            setFixation(time, i, self.SACCADE, theta, ordinal)
-
-                self.state = Filter.SACCADE
-
-            self.last_state = self.state
-            setFixation(time, index, self.state, theta, ordinal)
-
-
-
-    def setFixation(self, time:float, index:int, state:int, theta:float, ordinal:int) -> None:
-        """Result handler that appends found intervals.
-
-        :param time: timestamp (s)
-        :param index: row index
-        :param state: oculomotor event code from eyestudio.Engine.Filter
-        :param theta: data point actual value
-        :param ordinal: state order number
-        :return: None
-        """
-        self.result[index] = (time, state, theta, ordinal)
+        states = np.where(np.isnan(theta), self.NOT_FOUND, np.where(theta < thresh, self.FIXATION, self.SACCADE))
+        fixation = states == self.FIXATION
+        starts = np.flatnonzero(fixation & ~np.hstack((False, fixation[:-1])))
+        ends = np.flatnonzero(fixation & ~np.hstack((fixation[1:], False))) + 1
+
+        #fixation continued from previous call does not start a new ordinal
+        counted = starts.copy()
+        if self.last_state == self.FIXATION and fixation[0]:
+            counted = counted[1:]
+
+        #too short fixation, interrupted by a saccade, is blended into it; its duration is counted up to that saccade
+        interrupted = ends < length
+        interrupted[interrupted] = states[ends[interrupted]] == self.SACCADE
+        demoted = np.flatnonzero(interrupted)
+        demoted = demoted[(time[ends[demoted]] - time[starts[demoted]]) < minTime]
+
+        marks = np.zeros(length + 1, dtype=np.int64)
+        np.add.at(marks, counted, 1)
+        np.add.at(marks, ends[demoted], -1)
+        ordinals = np.cumsum(marks[:-1])
+
+        demotedMarks = np.zeros(length + 1, dtype=np.int64)
+        np.add.at(demotedMarks, starts[demoted], 1)
+        np.add.at(demotedMarks, ends[demoted], -1)
+        demotedMask = np.cumsum(demotedMarks[:-1]) > 0
+        states[demotedMask] = self.SACCADE
+        ordinals[demotedMask] = ordinals[demotedMask] - 1
+        #demoted samples are stamped with time and value of the saccade sample they are blended into
+        source = np.arange(length)
+        source[demotedMask] = np.repeat(ends[demoted], ends[demoted] - starts[demoted])
+        time = time[source]
+        theta = theta[source]
+
+        self.setResult(time, states, theta, ordinals, setFixation)
 
 
 
@@ -130,97 +99,3 @@ class IVTFilter(Filter):
         self.setParameter('min_motion', min_motion)
 
         self.process(data)
-
-
-
-
-
-    #GROUPING methods
-    def getResultFiltered(self, state:str = '') -> DataFrame:
-        '''Groups result by State and Ordinal, yielding starting and ending time of events.
-
-        :param state: which state to return
-        :return: DataFrame with start/end timestamps for each ordinal or None
-        '''
-        #FIXME timestamp column name hard-coded
-        result       = DataFrame(self.result, columns=['Time', 'State', 'Value', 'Ordinal'])
-        grouped      = result.groupby(by=['State', 'Ordinal'], sort=True)
-        aggregated   = grouped['Time'].agg(['count', 'min', 'max'])
-        aggregated2  = grouped['Value'].agg(['mean'])
-        concatenated = pd.concat((aggregated, aggregated2), axis=1)
-
-        #motion offsets
-        data  = result['Value']
-        level = self.getParameter('noise_level')
-        tmin  = []
-        tmax  = []
-        if len(concatenated.index.levels[0]) > 1:
-            for index,row in concatenated.loc[1].iterrows():
-                sindex = result[result['Time']==row['min']].index[0]
-                eindex = result[result['Time']==row['max']].index[0]
-                traversed = self.traverseOffsets(data=data, sindex=sindex, eindex=eindex, thres=level)
-                tmin.append(result.iloc[traversed[0]]['Time'])
-                tmax.append(result.iloc[traversed[1]]['Time'])
-            #расширяем границы
-            concatenated.loc[1]['min'] = tmin
-            concatenated.loc[1]['max'] = tmax
-
-
-        #filtering
-        concatenated = self.filterValues(concatenated)
-        if state=='fixation':
-            return concatenated.loc[0]
-        elif state=='saccade':
-            if len(concatenated.index.levels[0]) > 1:
-                return concatenated.loc[1]
-            else:
-                return DataFrame()
-        elif state=='':
-            return concatenated
-        else:
-            raise ValueError('state specified wrong.')
-
-
-
-    def traverseOffsets(self, data, sindex:int, eindex:int, thres:float) -> tuple:
-        """Runs step by step through data in given direction and finds nearest threshold value.
-
-        :param data:
-        :param sindex: start index
-        :param eindex: end index
-        :param thres: value to search for
-        :return: found indices
-        """
-        myRange = data[:sindex]
-        myRange = myRange[myRange <= thres]
-        if len(myRange):
-            svalue = myRange.index[-1]
-        else:
-            svalue = data.index[0]
-
-        myRange = data[eindex:]
-        myRange = myRange[myRange <= thres]
-        if len(myRange):
-            evalue = myRange.index[0]
-        else:
-            evalue = data.index[-1]
-
-        return (svalue, evalue)
-
-
-
-
-
-    #FILTERING methods
-    def filterValues(self, values:DataFrame) -> DataFrame:
-        """Filter out results based on condition.
-
-        :param values: data to filter
-        :return: filtered data
-        """
-        dur = []
-        minMotion = self.getParameter('min_motion')
-        values.apply(lambda x: dur.append(x['max'] - x['min']), axis=1)
-        values['dur'] = dur
-        res = values[values['dur'] >= minMotion]
-        return res
@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+from utils import Utils
+
+from algo.IVTFilter import IVTFilter
+
+
+
+
+
+
+
+class IVTStream():
+
+    """Runs I-VT filter over velocity data arriving in chunks, emitting only events that are already complete.
+
+    The last two state runs are held back between chunks, because a trailing fixation may yet turn out too short
+    and be blended into the preceding saccade. One more run before them is kept as a context,
+    so that the filter is restarted on a run border, and saccade offsets search has data to look at.
+    When held back data grows over maxPending samples (a long fixation or tracking loss spanning many chunks),
+    interior samples of long runs are dropped, their count and sum of values kept aside to correct event stats.
+    """
+    def __init__(self, min_velocity:float, noise_level:float, min_static:float, min_motion:float, maxPending:int=100000):
+        """
+
+        :param min_velocity: same as IVTFilter.runJob
+        :param noise_level: same
+        :param min_static: same
+        :param min_motion: same
+        :param maxPending: number of held back samples, beyond which long runs are compressed
+        """
+        self.filter = IVTFilter()
+        self.params = (min_velocity, noise_level, min_static, min_motion)
+        self.maxPending = maxPending
+
+        self.pending = None
+        self.emittedUpTo = -np.inf
+        self.ordinals = {'fixation': 0, 'saccade': 0}
+        #samples dropped from compressed runs, by time of run first sample: [count, sum of values]
+        self.dropped = {}
+
+
+
+
+    #CALCULATING methods
+    def feed(self, data:DataFrame) -> tuple:
+        """Appends data chunk, runs the filter and returns events completed so far.
+
+        :param data: pandas dataframe with only 2 columns - time and speed, as for IVTFilter.runJob
+        :return: tuple of 2 dataframes - fixations and saccades.
+        """
+        if self.pending is None:
+            self.pending = data
+        else:
+            self.pending = pd.concat((self.pending, data))
+        if len(self.pending) > self.maxPending:
+            self.compress()
+
+        result = self.runFilter()
+        runStarts = np.flatnonzero(np.hstack((True, np.diff(result['State']) != 0)))
+        if len(runStarts) < 3:
+            return (DataFrame(), DataFrame())
+
+        boundary = result['Time'].iloc[runStarts[-2]]
+        events = self.collectEvents(result, boundary)
+
+        self.emittedUpTo = boundary
+        self.pending = self.pending.iloc[runStarts[-3]:]
+        start = self.pending.iloc[0, 0]
+        self.dropped = {time: dropped for time, dropped in self.dropped.items() if time >= start}
+        return events
+
+
+    def flush(self) -> tuple:
+        """Returns all events not emitted yet, at the end of data.
+
+        :return: tuple of 2 dataframes - fixations and saccades.
+        """
+        if self.pending is None or not len(self.pending):
+            return (DataFrame(), DataFrame())
+
+        events = self.collectEvents(self.runFilter(), np.inf)
+        self.pending = None
+        self.dropped = {}
+        return events
+
+
+    def compress(self) -> None:
+        """Drops interior samples of long runs of pending data, keeping what the filter result depends on.
+
+        Runs are split by velocity thresholding alone. Kept are first and last samples of a run (event borders,
+        value blended short fixations take), and its first and last samples at noise level (saccade offsets search).
+        Fixation runs shorter than min_static are kept whole, because they may be blended into a saccade.
+
+        :return: None
+        """
+        min_velocity, noise_level, min_static, min_motion = self.params
+        time = self.pending.iloc[:, 0].values.astype(float)
+        theta = np.abs(self.pending.iloc[:, 1].values.astype(float))
+        states = np.where(np.isnan(theta), self.filter.NOT_FOUND, np.where(theta < min_velocity, self.filter.FIXATION, self.filter.SACCADE))
+        starts = np.flatnonzero(np.hstack((True, states[1:] != states[:-1])))
+        ends = np.hstack((starts[1:], len(states)))
+
+        keep = np.ones(len(states), dtype=bool)
+        for start, end in zip(starts, ends):
+            if end - start <= 4 or (states[start] == self.filter.FIXATION and time[end - 1] - time[start] < min_static):
+                continue
+            keep[start + 1:end - 1] = False
+            low = np.flatnonzero(theta[start:end] <= noise_level)
+            if len(low):
+                keep[start + low[[0, -1]]] = True
+
+            dropped = self.dropped.setdefault(time[start], [0, 0.0])
+            dropped[0] = dropped[0] + np.count_nonzero(~keep[start:end])
+            dropped[1] = dropped[1] + theta[start:end][~keep[start:end]].sum()
+
+        self.pending = self.pending.iloc[keep]
+
+
+    def runFilter(self) -> DataFrame:
+        """Runs the filter over pending data, from the clean state.
+
+        :return: per-sample result, same columns as in IVTFilter.getResultFiltered.
+        """
+        self.filter.last_state = None
+        self.filter.runJob(self.pending, *self.params)
+        return self.filter.getResultFrame()
+
+
+    def collectEvents(self, result:DataFrame, boundary:float) -> tuple:
+        """Selects events which started between last emitted boundary and the given one, renumbers their ordinals.
+
+        Event start is taken before saccade offsets extension, so that every event is selected exactly once.
+
+        :param result: per-sample result of the last filter run.
+        :param boundary: time before which all events are considered complete.
+        :return: tuple of 2 dataframes - fixations and saccades.
+        """
+        rawStarts = result.groupby(by=['State', 'Ordinal'], sort=True)['Time'].min()
+        grouped = self.filter.groupResult()
+        self.addDropped(result, grouped)
+        filtered = self.filter.filterValues(self.filter.extendSaccades(grouped, self.filter.getParameter('noise_level')))
+
+        events = []
+        for code, state in [(0, 'fixation'), (1, 'saccade')]:
+            if code in filtered.index.get_level_values(0):
+                starts = rawStarts.loc[code].reindex(filtered.loc[code].index)
+                selected = filtered.loc[code].loc[((starts >= self.emittedUpTo) & (starts < boundary)).values]
+                selected.index = pd.Index(np.arange(len(selected)) + self.ordinals[state] + 1, name='Ordinal')
+                self.ordinals[state] = self.ordinals[state] + len(selected)
+            else:
+                selected = DataFrame()
+            events.append(selected)
+
+        return tuple(events)
+
+
+    def addDropped(self, result:DataFrame, grouped:DataFrame) -> None:
+        """Corrects sample count and mean value of events, which compressed runs belong to.
+
+        :param result: per-sample result of the last filter run.
+        :param grouped: result grouped by State and Ordinal, as IVTFilter.groupResult returns, modified in place.
+        :return: None
+        """
+        if not self.dropped:
+            return None
+        anchors = np.array(list(self.dropped.keys()))
+        rows = self.filter.getFirstIndices(result['Time'].values, anchors)
+        for (count, total), state, ordinal in zip(self.dropped.values(), result['State'].values[rows], result['Ordinal'].values[rows]):
+            key = (state, ordinal)
+            samples = grouped.loc[key, 'count']
+            grouped.loc[key, 'mean'] = (grouped.loc[key, 'mean'] * samples + total) / (samples + count)
+            grouped.loc[key, 'count'] = samples + count
+
+
+
+
+
+
+    #LABELING methods
+    def labelSamples(self, data:DataFrame, fixations:DataFrame, saccades:DataFrame) -> DataFrame:
+        """Tags samples with event type they fall into, by event time borders.
+
+        :param data: samples dataframe, timestamp in column 0.
+        :param fixations: fixations event table.
+        :param saccades: saccades event table.
+        :return: same data with added 'Event' column, empty for unclassified samples.
+        """
+        time = Utils.timeToSeconds(data.iloc[:, 0]).values
+        labels = np.full(len(time), '', dtype=object)
+        for name, events in [('fixation', fixations), ('saccade', saccades)]:
+            if not len(events):
+                continue
+            starts = np.searchsorted(time, events['min'].values, side='left')
+            ends = np.searchsorted(time, events['max'].values, side='right')
+            for start, end in zip(starts, ends):
+                labels[start:end] = name
+
+        data.insert(1, 'Event', labels)
+        return data
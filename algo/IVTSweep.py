@@ -0,0 +1,181 @@
+import os, itertools
+from concurrent.futures import ProcessPoolExecutor
+
+
+import numpy as np
+from pandas import DataFrame
+
+
+from algo.IVTFilter import IVTFilter
+
+
+
+
+
+
+
+#velocity data of the sweep, set once per pool worker process
+SWEEP_DATA = {}
+
+
+
+
+class IVTSweep():
+
+    """Evaluates I-VT filter with many parameter sets on the same velocity data, summarizing events found with each set.
+
+    I-VT stages depend on parameters one after another: thresholding and short fixation demotion on min_velocity and min_static,
+    saccade borders on noise_level, omitting short events on min_motion. So samples are classified once per
+    (min_velocity, min_static) pair, saccade borders are found once per noise_level, and all min_motion values
+    are applied at once to sorted event durations. Pairs are evaluated concurrently in a process pool.
+    """
+
+    PARAMS = ['min_velocity', 'noise_level', 'min_static', 'min_motion']
+    STATES = ['fixation', 'saccade']
+
+
+    def __init__(self, main, workers:int=os.cpu_count()):
+        """
+
+        :param main: main object, for console output.
+        :param workers: number of processes to evaluate parameter sets with, 1 to evaluate them in this process.
+        """
+        self.main = main
+        self.workers = workers
+
+
+
+    def getGrid(self, min_velocity:list, noise_level:list, min_static:list, min_motion:list) -> list:
+        """Every combination of given parameter values.
+
+        :param min_velocity: min saccade velocity values
+        :param noise_level: max noise velocity values
+        :param min_static: min interval between saccades values
+        :param min_motion: min saccade duration values
+        :return: list of parameter tuples, in PARAMS order.
+        """
+        return list(itertools.product(min_velocity, noise_level, min_static, min_motion))
+
+
+
+
+    #CALCULATING methods
+    def run(self, data:DataFrame, grid:list) -> DataFrame:
+        """Evaluates all parameter sets of the grid.
+
+        :param data: pandas dataframe with only 2 columns - time and speed, as for IVTFilter.runJob
+        :param grid: list of parameter tuples, in PARAMS order, as IVTFilter.runJob takes them
+        :return: DataFrame with one row per parameter set, in grid order: parameters, then count and duration stats of every event type
+        """
+        #FIXME implicitly assuming timestamps on column 0
+        time = data.iloc[:, 0].values.astype(float)
+        theta = data.iloc[:, 1].values.astype(float)
+
+        #parameter sets sharing classification of samples
+        pairs = {}
+        for min_velocity, noise_level, min_static, min_motion in grid:
+            pairs.setdefault((min_velocity, min_static), {}).setdefault(noise_level, []).append(min_motion)
+
+        rows = {}
+        if self.workers > 1 and len(pairs) > 1:
+            #velocity is sent to every worker once, not with every pair
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pairs)), initializer=setSweepData, initargs=(time, theta)) as pool:
+                for result in pool.map(sweepJob, pairs.keys(), pairs.values()):
+                    rows.update(result)
+        else:
+            setSweepData(time, theta)
+            try:
+                for pair, levels in pairs.items():
+                    rows.update(sweepJob(pair, levels))
+            finally:
+                SWEEP_DATA.clear()
+
+        table = DataFrame([dict(zip(self.PARAMS, params), **rows[params]) for params in grid], columns=self.getColumns())
+        self.main.printToOut('I-VT sweep finished, {0} parameter sets evaluated.'.format(len(table)))
+        return table
+
+
+    def getColumns(self) -> list:
+        """Names of sweep table columns.
+
+        :return: list of column names.
+        """
+        columns = list(self.PARAMS)
+        for state in self.STATES:
+            columns.extend(['{0} {1}'.format(state, stat) for stat in ['count', 'dur mean', 'dur median', 'dur std']])
+        return columns
+
+
+
+
+
+
+def setSweepData(time:np.ndarray, theta:np.ndarray) -> None:
+    """Keeps velocity data for sweepJob, runs in pool worker process at its start.
+
+    :param time: timestamps (s)
+    :param theta: angular velocity (deg/s)
+    :return: None
+    """
+    SWEEP_DATA['time'] = time
+    SWEEP_DATA['theta'] = theta
+
+
+def sweepJob(pair:tuple, levels:dict) -> dict:
+    """Evaluates all parameter sets sharing min_velocity and min_static, runs in pool worker process.
+
+    :param pair: tuple of min_velocity and min_static.
+    :param levels: dict of noise_level to list of min_motion values.
+    :return: dict of parameter tuple to dict of stats, keyed by IVTSweep columns.
+    """
+    min_velocity, min_static = pair
+    filter = IVTFilter()
+    filter.setParameter('min_velocity', min_velocity)
+    filter.setParameter('min_static', min_static)
+    filter.process(DataFrame({'Time': SWEEP_DATA['time'], 'Velocity': SWEEP_DATA['theta']}))
+    grouped = filter.groupResult()
+
+    result = {}
+    for noise_level, motions in levels.items():
+        extended = filter.extendSaccades(grouped.copy(), noise_level)
+        states = extended.index.get_level_values(0)
+        stats = {}
+        for state in IVTSweep.STATES:
+            durations = (extended['max'] - extended['min']).values[states == IVTFilter.STATES[state]]
+            for stat, values in describeDurations(durations, np.asarray(motions, dtype=float)).items():
+                stats['{0} {1}'.format(state, stat)] = values
+        for index, min_motion in enumerate(motions):
+            result[(min_velocity, noise_level, min_static, min_motion)] = {column: values[index] for column, values in stats.items()}
+    return result
+
+
+def describeDurations(durations:np.ndarray, thresholds:np.ndarray) -> dict:
+    """Count and stats of event durations not shorter than each threshold, same as IVTFilter.filterValues keeps.
+
+    Durations are sorted once, then stats of every kept tail are taken from cumulative sums.
+
+    :param durations: event durations (s)
+    :param thresholds: min event durations (s)
+    :return: dict of stat name to array of values, one per threshold; NaN where no events are kept
+    """
+    durations = np.sort(durations)
+    n = len(durations)
+    first = np.searchsorted(durations, thresholds, side='left')
+    count = n - first
+
+    #sums of tails, from every index to the end
+    sums = np.hstack((np.cumsum(durations[::-1])[::-1], 0))
+    squares = np.hstack((np.cumsum(durations[::-1] ** 2)[::-1], 0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums[first] / count
+        std = np.sqrt(np.maximum(squares[first] - sums[first] * mean, 0) / (count - 1))
+    std[count < 2] = np.nan
+
+    kept = count > 0
+    median = np.full(len(thresholds), np.nan)
+    if n:
+        lower = (first + (count - 1) // 2).clip(max=n - 1)
+        upper = (first + count // 2).clip(max=n - 1)
+        median[kept] = ((durations[lower] + durations[upper]) / 2)[kept]
+
+    return {'count': count, 'dur mean': np.where(kept, mean, np.nan), 'dur median': median, 'dur std': std}
@@ -0,0 +1,59 @@
+import numpy as np
+from pandas import DataFrame
+
+
+from algo.EventFilter import EventFilter
+
+
+
+
+
+
+
+class IVVTFilter(EventFilter):
+
+    """Velocity-velocity threshold identification: angular velocity above min_velocity is saccade,
+    between min_pursuit_velocity and min_velocity is smooth pursuit, below it is fixation."""
+    def __init__(self):
+        super().__init__()
+
+
+
+
+
+
+    #CALCULATING methods
+    def process(self, data:DataFrame, setFixation=None) -> None:
+        """Main filtering routine, velocity is thresholded as a whole array.
+
+        :param data: timestamp (s), angular velocity (deg/s) component, NaN velocity for samples without valid gaze
+        :param setFixation: result handler, called once per sample with its final state, if given
+        :return: None
+        """
+        #FIXME implicitly assuming timestamps on column 0
+        time = data.iloc[:, 0].values.astype(float)
+        theta = np.abs(data.iloc[:, 1].values.astype(float))
+
+        states = np.select([np.isnan(theta), theta >= self.getParameter('min_velocity'), theta >= self.getParameter('min_pursuit_velocity')],
+                           [self.NOT_FOUND, self.SACCADE, self.SMOOTH_PURSUIT], self.FIXATION)
+
+        self.setResult(time, states, theta, self.numberRuns(states), setFixation)
+
+
+
+    def runJob(self, data:DataFrame,  min_velocity:float, min_pursuit_velocity:float, noise_level:float, min_motion:float) -> None:
+        """Sets filter parameters, processes the data and returns the filtered result.
+
+        :param data: pandas dataframe with only 2 columns - time and speed
+        :param min_velocity: min saccade velocity, otherwise consider as pursuit or fixation
+        :param min_pursuit_velocity: min smooth pursuit velocity, otherwise consider as fixation
+        :param noise_level: max noise velocity, what counts as saccade border
+        :param min_motion: min event duration, otherwise omit this event
+        :return: None
+        """
+        self.setParameter('min_velocity', min_velocity)
+        self.setParameter('min_pursuit_velocity', min_pursuit_velocity)
+        self.setParameter('noise_level', noise_level)
+        self.setParameter('min_motion', min_motion)
+
+        self.process(data)
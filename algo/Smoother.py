@@ -0,0 +1,200 @@
+import math
+
+
+import numpy as np
+from scipy.signal import convolve, fftconvolve
+from scipy.signal import cspline1d
+from scipy.signal import savgol_coeffs, savgol_filter
+from scipy.signal import lfilter, lfilter_zi
+
+
+
+
+
+
+
+
+class Smoother():
+
+    """Smooths gaze position channels, all of them at once, as columns of one 2-D array.
+
+    Every method has a zero-phase variant for whole recordings and a causal one for online use,
+    which is fed chunk by chunk with its state carried over, and gives the same result as for the whole data at once.
+    FIR kernels (Savitzky-Golay, moving average) are convolved directly when short and via FFT when long.
+    """
+
+    METHODS = ['savgol', 'spline', 'conv']
+    #parameters smoothing always used, window and order in samples, lamb is spline smoothing strength
+    DEFAULTS = {'savgol': {'window': 15, 'order': 2}, 'spline': {'lamb': 3}, 'conv': {'window': 6}}
+    #kernels this long and longer are convolved via FFT
+    FFT_MIN_TAPS = 64
+    #recursive filter response is considered decayed below this fraction
+    IIR_TOLERANCE = 1e-9
+    #spline poles (as cspline1d computes them) are complex and inside unit circle only above this smoothing strength
+    SPLINE_MIN_LAMBDA = 1 / 24
+
+
+    def __init__(self, method:str='spline', window:int=None, order:int=None, lamb:float=None):
+        """
+
+        :param method: one of METHODS, same as --smooth command line argument.
+        :param window: kernel length in samples, for savgol and conv.
+        :param order: polynomial order, for savgol.
+        :param lamb: smoothing strength, for spline.
+        """
+        if method not in self.METHODS:
+            raise ValueError('Invalid smoothing function specified: {0}.'.format(method))
+        defaults = self.DEFAULTS[method]
+        self.method = method
+        self.window = window if window is not None else defaults.get('window')
+        self.order = order if order is not None else defaults.get('order')
+        self.lamb = lamb if lamb is not None else defaults.get('lamb')
+
+        if method == 'savgol' and not (self.window % 2 and 0 <= self.order < self.window):
+            raise ValueError('Savitzky-Golay window must be odd and greater than polynomial order.')
+        if method == 'conv' and self.window < 1:
+            raise ValueError('Convolution window must be positive.')
+        if method == 'spline' and not self.lamb > self.SPLINE_MIN_LAMBDA:
+            raise ValueError('Spline smoothing strength must be greater than 1/24 (about 0.042), cubic smoothing spline is unstable below it.')
+
+
+    def printParams(self) -> str:
+        """Returns smoothing parameters as a readable str.
+
+        :return: str
+        """
+        if self.method == 'savgol':
+            return '{0}, window {1}, order {2}'.format(self.method, self.window, self.order)
+        elif self.method == 'spline':
+            return '{0}, lambda {1}'.format(self.method, self.lamb)
+        else:
+            return '{0}, window {1}'.format(self.method, self.window)
+
+
+    def getHalo(self) -> int:
+        """Number of neighbouring samples a smoothed value depends on, on each side, for zero-phase smoothing.
+
+        For spline it is the number of samples after which its recursive response decays below IIR_TOLERANCE.
+
+        :return: int
+        """
+        if self.method == 'spline':
+            rho, omega = self.getSplinePoles()
+            return int(math.ceil(math.log(self.IIR_TOLERANCE) / math.log(rho)))
+        else:
+            return self.window
+
+
+
+
+    #KERNEL methods
+    def getKernel(self) -> np.ndarray:
+        """FIR kernel of zero-phase smoothing, None for spline which is recursive.
+
+        :return: 1-D array.
+        """
+        if self.method == 'savgol':
+            return savgol_coeffs(self.window, self.order)
+        elif self.method == 'conv':
+            #equivalent to moving average
+            return np.ones(self.window) / self.window
+        else:
+            return None
+
+
+    def getCausalCoeffs(self) -> tuple:
+        """Transfer function coefficients of causal smoothing, each output sample depends on current and past ones only.
+
+        Savitzky-Golay polynomial is evaluated at the last sample of the window, moving average is trailing,
+        spline is reduced to its forward recursive section (normalized to unit gain).
+
+        :return: tuple of numerator and denominator arrays, as for scipy.signal.lfilter.
+        """
+        if self.method == 'savgol':
+            return (savgol_coeffs(self.window, self.order, pos=self.window - 1), np.ones(1))
+        elif self.method == 'conv':
+            return (np.ones(self.window) / self.window, np.ones(1))
+        else:
+            rho, omega = self.getSplinePoles()
+            a = np.array([1, -2 * rho * math.cos(omega), rho ** 2])
+            return (np.array([a.sum()]), a)
+
+
+    def getSplinePoles(self) -> tuple:
+        """Pole radius and angle of cubic smoothing spline, same as scipy.signal.cspline1d uses.
+
+        :return: tuple of rho and omega.
+        """
+        lamb = self.lamb
+        xi = 1 - 96 * lamb + 24 * lamb * math.sqrt(3 + 144 * lamb)
+        omega = math.atan2(math.sqrt(144 * lamb - 1), math.sqrt(xi))
+        rho = (24 * lamb - 1 - math.sqrt(xi)) / (24 * lamb)
+        rho = rho * math.sqrt((48 * lamb + 24 * lamb * math.sqrt(3 + 144 * lamb)) / xi)
+        return (rho, omega)
+
+
+    def convolve(self, data:np.ndarray, kernel:np.ndarray, mode:str='same') -> np.ndarray:
+        """Convolves every column of data with kernel, directly or via FFT depending on kernel length.
+
+        :param data: 2-D array, samples in rows, channels in columns.
+        :param kernel: 1-D array.
+        :param mode: 'same' or 'valid', as for scipy.signal.convolve.
+        :return: 2-D array.
+        """
+        if len(kernel) >= self.FFT_MIN_TAPS:
+            return fftconvolve(data, kernel[:, np.newaxis], mode=mode, axes=0)
+        else:
+            return convolve(data, kernel[:, np.newaxis], mode=mode, method='direct')
+
+
+
+
+    #SMOOTHING methods
+    def smooth(self, data:np.ndarray) -> np.ndarray:
+        """Zero-phase smoothing of every column of data.
+
+        :param data: 2-D array, samples in rows, channels in columns.
+        :return: array of same shape.
+        """
+        if self.method == 'savgol':
+            if len(data) < self.window:
+                #too short for polynomial fit of edges, e.g. a short run between blinks
+                return savgol_filter(data, self.window, self.order, axis=0, mode='nearest')
+            if self.window < self.FFT_MIN_TAPS:
+                return savgol_filter(data, self.window, self.order, axis=0)
+            #edges are fitted by polynomial over first and last windows, as savgol_filter does in 'interp' mode
+            smoothed = self.convolve(data, self.getKernel())
+            half = self.window // 2
+            smoothed[:half] = savgol_filter(data[:self.window], self.window, self.order, axis=0)[:half]
+            smoothed[-half:] = savgol_filter(data[-self.window:], self.window, self.order, axis=0)[-half:]
+            return smoothed
+        elif self.method == 'spline':
+            #mirror-symmetric boundaries need 3 samples at least
+            if len(data) < 3:
+                return data.astype(float)
+            #recursive filter with mirror-symmetric boundaries, scipy provides it for 1-D signals only
+            return np.column_stack([cspline1d(data[:, index], lamb=self.lamb) for index in range(data.shape[1])])
+        else:
+            return self.convolve(data, np.ones(self.window)) / self.window
+
+
+    def smoothCausal(self, data:np.ndarray, state:object=None) -> tuple:
+        """Causal smoothing of every column of data, resumable chunk by chunk.
+
+        Filter starts in steady state at first sample, as if data had been constant before it.
+
+        :param data: 2-D array, samples in rows, channels in columns.
+        :param state: state returned by previous call for preceding chunk, None at the beginning of data.
+        :return: tuple of smoothed array of same shape and state to pass along with the next chunk.
+        """
+        b, a = self.getCausalCoeffs()
+        if len(a) > 1:
+            if state is None:
+                state = lfilter_zi(b, a)[:, np.newaxis] * data[:1]
+            return lfilter(b, a, data, axis=0, zi=state)
+
+        #FIR state is the tail of input, so that long kernels can be convolved via FFT as well
+        if state is None:
+            state = np.repeat(data[:1], len(b) - 1, axis=0)
+        extended = np.vstack((state, data))
+        return (self.convolve(extended, b, mode='valid'), extended[len(extended) - (len(b) - 1):])
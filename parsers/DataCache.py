@@ -0,0 +1,178 @@
+import os, json, shutil
+
+
+import pandas as pd
+
+
+
+
+
+
+
+
+class DataCache():
+
+    """Persistent on-disk cache of parsed recordings.
+
+    Every entry is a directory named by md5 checksum of the source file (as computed by SettingsReader),
+    containing one Feather (columnar binary) file per data node and an entry.json with metadata.
+    Entries are evicted least recently used first when total cache size exceeds the cap.
+    """
+
+    #bump when parsed data layout changes, so that stale entries are not reused
+    VERSION = 3
+    ENTRY_FILE = 'entry.json'
+
+
+    def __init__(self, main):
+        self.main = main
+        self.enabled = True
+        self.cacheDir = None
+        self.maxSizeMb = 2048
+
+
+
+    def configure(self, cacheDir:str=None, maxSizeMb:float=2048, enabled:bool=True) -> None:
+        """Sets cache location and size cap.
+
+        :param cacheDir: directory to keep cache entries in, defaults to '.cache' inside settings data dir.
+        :param maxSizeMb: total cache size cap, in megabytes.
+        :param enabled: whether to use cache at all.
+        :return: None
+        """
+        self.cacheDir = cacheDir
+        self.maxSizeMb = maxSizeMb
+        self.enabled = enabled
+
+
+    def getSettings(self) -> dict:
+        """Returns cache settings with directory resolved, suitable for configure() of cache in another process.
+
+        :return: configure keyword arguments dict.
+        """
+        return {'cacheDir': self.getDir(), 'maxSizeMb': self.maxSizeMb, 'enabled': self.enabled}
+
+
+    def getDir(self) -> str:
+        """Returns cache directory, resolving default one from settings data dir.
+
+        :return: dir path str.
+        """
+        if self.cacheDir:
+            return self.cacheDir
+        else:
+            return '{0}/.cache'.format(self.main.settingsReader.getDir())
+
+
+    def getEntryDir(self, md5:str) -> str:
+        """Returns directory of cache entry.
+
+        :param md5: source file checksum.
+        :return: dir path str.
+        """
+        return '{0}/{1}'.format(self.getDir(), md5)
+
+
+
+
+    #IO methods
+    def load(self, md5:str) -> dict:
+        """Reads cache entry back, if present and valid.
+
+        :param md5: source file checksum.
+        :return: dict with 'nodes' (channel name to DataFrame) and 'meta' (whatever was stored) keys, None on cache miss.
+        """
+        if not self.enabled or not md5:
+            return None
+        entryDir = self.getEntryDir(md5)
+        entryFile = '{0}/{1}'.format(entryDir, self.ENTRY_FILE)
+        if not os.path.exists(entryFile):
+            return None
+
+        try:
+            with open(entryFile, encoding='UTF-8') as f:
+                entry = json.load(f)
+            if entry.get('version') != self.VERSION:
+                return None
+
+            nodes = {}
+            for channel in entry['nodes']:
+                data = pd.read_feather('{0}/{1}.feather'.format(entryDir, channel))
+                nodes[channel] = data.set_index('index').rename_axis(None)
+        except:
+            self.main.printError()
+            self.main.printToOut('WARNING: Cache entry {0} unreadable, ignoring it.'.format(md5))
+            return None
+
+        #access time is the LRU key
+        os.utime(entryFile)
+        self.main.printToOut('Parsed data loaded from cache.')
+        return {'nodes': nodes, 'meta': entry['meta']}
+
+
+    def store(self, md5:str, nodes:dict, meta:dict) -> None:
+        """Writes parsed data nodes to cache, then evicts old entries if cache is over its size cap.
+
+        :param md5: source file checksum.
+        :param nodes: dict of channel name to DataFrame.
+        :param meta: JSON-serializable dict to keep alongside (metadata, column lists, etc.).
+        :return: None
+        """
+        if not self.enabled or not md5:
+            return None
+        entryDir = self.getEntryDir(md5)
+        tmpDir = '{0}.tmp{1}'.format(entryDir, os.getpid())
+
+        try:
+            os.makedirs(tmpDir, exist_ok=True)
+            for channel, data in nodes.items():
+                data.reset_index().to_feather('{0}/{1}.feather'.format(tmpDir, channel))
+            with open('{0}/{1}'.format(tmpDir, self.ENTRY_FILE), 'w', encoding='UTF-8') as f:
+                json.dump({'version': self.VERSION, 'nodes': list(nodes.keys()), 'meta': meta}, f)
+
+            shutil.rmtree(entryDir, ignore_errors=True)
+            os.replace(tmpDir, entryDir)
+        except:
+            shutil.rmtree(tmpDir, ignore_errors=True)
+            self.main.printError()
+            self.main.printToOut('WARNING: Failed writing parsed data to cache.')
+            return None
+
+        self.evict()
+
+
+
+
+    #HOUSEKEEPING methods
+    def evict(self) -> None:
+        """Removes least recently used entries until total size fits the cap.
+
+        :return: None
+        """
+        cacheDir = self.getDir()
+        entries = []
+        total = 0
+        for name in os.listdir(cacheDir):
+            entryFile = '{0}/{1}/{2}'.format(cacheDir, name, self.ENTRY_FILE)
+            if not os.path.exists(entryFile):
+                continue
+            size = self.getSize('{0}/{1}'.format(cacheDir, name))
+            entries.append((os.path.getmtime(entryFile), size, name))
+            total = total + size
+
+        maxSize = self.maxSizeMb * 1024 * 1024
+        for accessed, size, name in sorted(entries):
+            if total <= maxSize:
+                break
+            shutil.rmtree('{0}/{1}'.format(cacheDir, name), ignore_errors=True)
+            total = total - size
+            self.main.printToOut('Cache entry {0} evicted.'.format(name))
+
+
+    def getSize(self, entryDir:str) -> int:
+        """Returns total size of files in cache entry.
+
+        :param entryDir: entry dir path.
+        :return: size in bytes.
+        """
+        return sum(os.path.getsize('{0}/{1}'.format(entryDir, f)) for f in os.listdir(entryDir))
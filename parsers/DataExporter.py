@@ -8,6 +8,7 @@ from pandas import DataFrame
 
 
 from utils.SettingsReader import SettingsReader
+from utils import Utils
 
 
 
@@ -21,6 +22,10 @@ class DataExporter():
         self.settingsReader = main.settingsReader
         self.saveDir=''
         self.colsUnperceptable=['Timedelta','Record tag','Id']
+        #whether to export only derived samples columns computed for detectors, instead of the full derived set
+        self.derivedOnlyNeeded = False
+        #whether to write message and trial intervals of records into saved settings
+        self.intervalsToSettings = False
 
 
 
@@ -35,7 +40,7 @@ class DataExporter():
             now = datetime.now().strftime('%Y-%m-%d %H_%M_%S')
             dateTag = ET.Element('date')
             dateTag.text = now
-            self.settingsReader.settings.append(dateTag)
+            self.settingsReader.append(dateTag)
 
             self.saveDir = '{0}/{1}_{2}'.format(self.settingsReader.dataDir, str(prefix), now)
 
@@ -80,13 +85,38 @@ class DataExporter():
                 for (channel, id) in multiData.genChannelIds(channel=type):
                     #TODO switch to tagging mode if more than 1 id in settings
                     #data = multiData.getChannelAndTag(channel, id,   block='interval', format='dataframe',   ignoreEmpty=False)
+                    if channel == 'samples' and id in multiData.derived:
+                        multiData.materializeDerived(id, all=not self.derivedOnlyNeeded)
                     data = multiData.getChannelById(channel, id,   format='dataframe')
                     stacked = stacked.append(data, sort=False)
 
+                #compact mode timestamps are written in seconds anyway
+                for column in multiData.TIME_COLUMNS + ['TimestampZeroBased']:
+                    if column in stacked.columns:
+                        stacked[column] = Utils.timeToSeconds(stacked[column])
+
                 if format == "csv" and len(stacked):
                     stacked.to_csv(file, sep='\t', header=True, index=False, mode='w')
 
 
             #----
             self.main.printToOut('Done. Data blocks tagged.', status='ok')
-            self.copyMeta()
\ No newline at end of file
+            if self.intervalsToSettings:
+                self.writeIntervals(multiData)
+            self.copyMeta()
+
+
+    def writeIntervals(self, multiData:object) -> None:
+        """Appends message and trial intervals of all records to settings tree, as message and trial elements.
+
+        :param multiData:
+        :return: None
+        """
+        for (block, id), table in multiData.intervalTables.items():
+            for intervalId, text, duration in zip(table['Id'], table['Text'], table['Duration']):
+                intervalTag = ET.Element(block)
+                intervalTag.set('id', intervalId)
+                intervalTag.set('text', text)
+                intervalTag.set('duration', str(duration))
+                self.settingsReader.append(intervalTag)
+        self.main.printToOut('Message and trial intervals written to settings.')
\ No newline at end of file
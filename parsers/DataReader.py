@@ -1,11 +1,15 @@
-import os, re, math
-import xml.etree.ElementTree as ET
+import os, io, re, sys, math, json, itertools
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 
 
+import numpy as np
 import pandas as pd
 
 
 from utils import Utils
+from parsers.DataCache import DataCache
+from parsers.TranscodingReader import TranscodingReader
 
 
 
@@ -18,8 +22,26 @@ class DataReader():
 
     """Helper class that reads and parses eyetracking data (currently SMI only)."""
 
-    def __init__(self, main):
+    #Tobii Glasses 2 livedata field to stream name and Tobii Pro Lab column names, {0} is eye side
+    TOBII_JSON_FIELDS = {'gp': ('gp', ['Gaze point X', 'Gaze point Y']),
+                         'gp3': ('gp3', ['Gaze point 3D X', 'Gaze point 3D Y', 'Gaze point 3D Z']),
+                         'gd': ('gd{0}', ['Gaze direction {0} X', 'Gaze direction {0} Y', 'Gaze direction {0} Z']),
+                         'pd': ('pd{0}', ['Pupil diameter {0}']),
+                         'gy': ('gy', ['Gyro X', 'Gyro Y', 'Gyro Z']),
+                         'ac': ('ac', ['Accelerometer X', 'Accelerometer Y', 'Accelerometer Z'])}
+    #livedata gaze point is normalized to scene camera frame
+    TOBII_SCENE_RESOLUTION = (1920, 1080)
+
+    #SMI columns always parsed, needed to split and tag samples
+    SMI_KEY_COLUMNS = ['Time', 'Type', 'Trial']
+
+    def __init__(self, main, workers:int=None, columns:list=None):
         self.main = main
+        #pool size cap, None for CPU count; pool is never larger than the number of data files
+        self.workers = workers
+        #samples columns projection, None to parse all available columns
+        self.columns = columns
+        self.jobs = {}
 
 
 
@@ -28,6 +50,8 @@ class DataReader():
         """Actual data parsing code.
         
         Depends on pandas module.
+        All data files are hashed and parsed concurrently in a process pool,
+        then merged into multiData in settings order.
 
         :param settingsReader: SettingsReader object to get xml settings tree from.
         :param multiData: MultiData object to write into.
@@ -40,7 +64,12 @@ class DataReader():
             return
 
         multiData.reset()
+        files = self.getFiles(settingsReader)
+        workers = min(self.workers or os.cpu_count(), len(files))
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
         try:
+            if pool:
+                self.submitJobs(pool, files)
             self.readSMISamples(settingsReader, multiData)
             self.readTobiiGaze(settingsReader, multiData)
             if settingsReader.check(full=True) and multiData.check():
@@ -48,6 +77,12 @@ class DataReader():
         except:
             self.main.printError()
             raise
+        finally:
+            for future in self.jobs.values():
+                future.cancel()
+            self.jobs = {}
+            if pool:
+                pool.shutdown(wait=True)
 
 
 
@@ -60,106 +95,19 @@ class DataReader():
         :param multiData: the main data structure to be populated with Pandas dataframes, one for each id/type combination.
         :return: None
         """
-        for fileElem in settingsReader.genTypeFile('samples'):
+        for fileElem in settingsReader.genTypeFile('samples', checksum=False):
             filePath = settingsReader.getPathAttrById('samples', fileElem.get('id'), absolute=True)
-            fileExt = os.path.splitext(filePath)[1]
             self.main.printToOut('Reading samples ({0})...'.format(os.path.basename(filePath)))
-            if fileExt.lower() == '.txt':
-                self.main.printToOut('Parsing {0} file.'.format(fileExt))
-
-                skiprows = self.determineSkiprows(filePath, '##')
-                metablock = []
-                with open(filePath, encoding='UTF-8') as f:
-                    for n in range(skiprows+1):
-                        headers = f.readline()
-                        metablock.append(headers)
-                metablock = ''.join(metablock)
-
-
-
-                #tested on SMI RED-m-HP data only
-                availColumns = [i for i in headers.strip().split('\t') if re.match('Time|Type|Trial|L POR X \[px\]|L POR Y \[px\]|R POR X \[px\]|R POR Y \[px\]|Timing|Latency|L Validity|R Validity|Frame|Trigger|Aux1', i)]
-                multiData.setNode('availColumns', fileElem.get('id'), availColumns)
-
-                samplesData = pd.read_table(filePath,
-                                            decimal=".", sep='\t', skiprows=skiprows, header=0, usecols=availColumns, encoding='UTF-8',
-                                            dtype={'Time':float, 'Type':str, 'Trial':int, 'Frame':str})
-                samplesData['Time'] /= 1000000
-                #first line can be MSG type, but this is OK, we count from it anyway
-                zeroTime = samplesData.iloc[0]['Time']
-                maxTime = samplesData.iloc[-1]['Time']
-                samplesData['Time'] -= zeroTime
-                samplesData = samplesData.loc[samplesData['Type']=='SMP']
-
-
-
-
-                #MSG lines
-                messagesData = pd.read_table(filePath,
-                                             decimal=".", sep='\t', skiprows=skiprows, header=0, usecols=[0,1,2,3], encoding='UTF-8',
-                                             dtype={'Time': float, 'Type': str, 'Trial': int})
-                messagesData['Time'] /= 1000000
-                messagesData['Time'] -= zeroTime
-                messagesData = messagesData.loc[messagesData['Type'] == 'MSG']
-                messagesData.rename(columns={messagesData.columns[3]: "Text"}, inplace=True)
-                messagesData['Text'] = messagesData['Text'].apply(lambda x: re.sub('# Message: (.*)', '\\1', str(x)))
-
-
-
-
-                #MESSAGES block
-                #messages are (conventionally) assumed to have duration
-                #last message duration is assumed to be up to the end of the record
-                #zeroTime special interval added even if it itself equals 0
-                msgNum = 0
-                zeroTimeAdded  = False
-                for index, row in messagesData.iterrows():
-                    if not zeroTimeAdded:
-                        messageTag = ET.Element('message')
-                        messageTag.set('id', '_zeroTime')
-                        messageTag.set('text', '')
-                        duration = messagesData.iloc[0]['Time']
-                        messageTag.set('duration', str(duration))
-                        settingsReader.settings.append(messageTag)
-                        zeroTimeAdded = True
-                    msgNum = msgNum + 1
-                    messageTag = ET.Element('message')
-                    messageTag.set('id', str(msgNum))
-                    #messageTag.set('trial', row['Trial'])
-                    messageTag.set('text', row['Text'])
-                    if index < len(messagesData):
-                        duration = messagesData.iloc[index+1]['Time'] - row['Time']
-                    else:
-                        duration = maxTime - row['Time']
-                    messageTag.set('duration', str(duration))
-                    settingsReader.settings.append(messageTag)
-
-
-
-                #TRIALS block
-                #trials are assumed to have no gaps between them
-                trialNum = 0
-                zeroTimeAdded2 = False
-                trialData = pd.DataFrame([messagesData.loc[index] for index,row in messagesData.iterrows() if 'FixPoint' in row['Text']])
-                for index, row in trialData.iterrows():
-                    if not zeroTimeAdded2:
-                        trialTag = ET.Element('trial')
-                        trialTag.set('id', '_zeroTime')
-                        trialTag.set('text', '')
-                        duration = messagesData.iloc[0]['Time']
-                        trialTag.set('duration', str(duration))
-                        settingsReader.settings.append(trialTag)
-                        zeroTimeAdded2 = True
-                    trialNum = trialNum + 1
-                    trialTag = ET.Element('trial')
-                    trialTag.set('id', str(trialNum))
-                    trialTag.set('text', row['Text'])
-                    if index < len(trialTag):
-                        duration = trialTag.iloc[index + 1]['Time'] - row['Time']
-                    else:
-                        duration = maxTime - row['Time']
-                    trialTag.set('duration', str(duration))
-                    settingsReader.settings.append(trialTag)
+            loaded = self.getJobResult('samples', fileElem, filePath)
+            if loaded is None:
+                continue
+            nodes, meta = loaded['nodes'], loaded['meta']
+            if 'availColumns' in meta:
+                multiData.setNode('availColumns', fileElem.get('id'), meta['availColumns'])
+
+            if 'messages' in nodes:
+                #MESSAGES and TRIALS blocks, kept as tables, written to settings only on export
+                multiData.setIntervalTables(fileElem.get('id'), nodes['messages'], meta['maxTime'])
 
                 #TRIGGERS block (applicable for SMI HiSpeed)
                 #TODO not implemented
@@ -167,39 +115,14 @@ class DataReader():
 
 
 
-                #get metadata
-                #values assumed to be integers
-                sampleRate = int(re.search('Sample Rate:\t(\d+)', metablock).groups()[0])
-                screenSizePx = re.search('Calibration Area:\t(\d+)\t(\d+)', metablock).groups()
-                screenWidthPx, screenHeightPx = int(screenSizePx[0]), int(screenSizePx[1])
-                screenSizeMm = re.search('Stimulus Dimension \[mm\]:\t(\d+)\t(\d+)', metablock).groups()
-                screenWidthMm, screenHeightMm = int(screenSizeMm[0]), int(screenSizeMm[1])
-                headDistanceMm = int(re.search('Head Distance \[mm\]:\t(\d+)', metablock).groups()[0])
-
-                #degrees, assuming the eyesight axis is centered around the screen (spherical eye model)
-                screenWidthDeg = Utils.getSeparation(-screenWidthMm/2,0, screenWidthMm/2,0,  z=headDistanceMm,  mode='fromCartesian')
-                screenHeightDeg = Utils.getSeparation(-screenHeightMm / 2, 0, screenHeightMm / 2, 0, z=headDistanceMm, mode='fromCartesian')
-                screenHResMm, screenVResMm = screenWidthMm / screenWidthPx, screenHeightMm / screenHeightPx
-                metadata = {'sampleRate': sampleRate,
-                            'screenWidthPx': screenWidthPx, 'screenHeightPx': screenHeightPx,
-                            'screenWidthMm': screenWidthMm, 'screenHeightMm': screenHeightMm,
-                            'screenWidthDeg': screenWidthDeg, 'screenHeightDeg': screenHeightDeg,
-                            'screenHResMm': screenHResMm, 'screenVResMm': screenVResMm,
-                            'headDistanceMm': headDistanceMm}
-                #experiment (record) metadata is in special property, not a separate data channel
-                samplesData.metadata = metadata
+            #experiment (record) metadata is in special property, not a separate data channel
+            if 'metadata' in meta:
+                nodes['samples'].metadata = meta['metadata']
 
-            elif fileExt.lower() == '.idf':
-                self.main.printToOut('ERROR: Cannot parse .idf files. Convert them to .txt first.')
-                raise NotImplementedError
-            elif fileExt.lower() == '.csv':
-                self.main.printToOut('Parsing {0} file.'.format(fileExt))
-                samplesData = pd.read_csv(filePath, sep='\t')
-            else:
-                self.main.printToOut('Unknown file format.')
-
-            multiData.setNode('samples', fileElem.get('id'), samplesData)
-            multiData.setNode('messages', fileElem.get('id'), messagesData)
+            for channel, data in nodes.items():
+                if multiData.compact:
+                    data = multiData.compactDtypes(data)
+                multiData.setNode(channel, fileElem.get('id'), data)
 
 
 
@@ -210,71 +133,463 @@ class DataReader():
     #TODO need determine if file format is truly Tobii .tsv, otherwise type should be 'tobii-gaze'
     #TODO Tobii API-sync package / Sync-port signal package is unknown to current implementation
     def readTobiiGaze(self, settingsReader:object, multiData:object) -> None:
-        """Reads Tobii Glasses 2 gaze data from .tsv file.
+        """Reads Tobii Glasses 2 gaze data from .tsv file (Tobii Pro Lab export) or .json file (livedata from SD card).
         
         :param settingsReader: same as everywhere
         :param multiData: same
         :return:
         """
-        for fileElem in settingsReader.genTypeFile('gaze'):
+        for fileElem in settingsReader.genTypeFile('gaze', checksum=False):
             filePath = settingsReader.getPathAttrById('gaze', fileElem.get('id'), absolute=True)
-            fileExt = os.path.splitext(filePath)[1]
             self.main.printToOut('Reading gaze data ({0})...'.format(os.path.basename(filePath)))
-            if fileExt.lower()=='.tsv':
-                self.main.printToOut('Parsing {0} file.'.format(fileExt))
-                # узнаем какие столбцы присутствуют
-                headers = pd.read_table(filePath, nrows=1, encoding='UTF-16')
-                availColumns = [i for i in list(headers.columns) if re.match('Recording timestamp|Gaze point|Gaze 3D position|Gaze direction|Pupil diameter|Eye movement type|Gaze event duration|Fixation point|Gyro|Accelerometer',i)]
-                multiData.setNode('availColumns', fileElem.get('id'), availColumns)
-
-                gazeData = pd.read_table(filePath, decimal=",", encoding='UTF-16', usecols=availColumns)
-                # переводим в секунды
-                gazeData['Recording timestamp'] /= 1000
-                #gazeData['Gaze event duration'] /= 1000
-
-                if multiData.hasAllColumns(['Gyro X','Gyro Y','Gyro Z','Accelerometer X','Accelerometer Y','Accelerometer Z'],fileElem.get('id')):
-                    gazeData.drop(['Gyro X', 'Gyro Y', 'Gyro Z', 'Accelerometer X', 'Accelerometer Y', 'Accelerometer Z'], axis=1, inplace=True)
-
-                # убираем пустые строки, которые могли образоваться после удаления строк гироскопа
-                gazeData = gazeData[(gazeData['Gaze point X'].notnull()) & (gazeData['Gaze point Y'].notnull()) | \
-                                    (gazeData['Eye movement type'] == 'EyesNotFound')]
-
-                if multiData.hasColumn('Eye movement type', fileElem.get('id')):
-                    gazeData.drop(['Eye movement type', 'Gaze event duration', 'Eye movement type index',
-                                   'Fixation point X', 'Fixation point Y'],
-                                   axis=1, inplace=True)
-
-                #TODO translation to degrees, velocity profile
-
-            elif fileExt.lower() == '.json':
-                self.main.printToOut('ERROR: parsing .json files not implemented.')
-                raise NotImplementedError
-            elif fileExt.lower()=='.csv':
-                self.main.printToOut('Parsing {0} file.'.format(fileExt))
-                gazeData = pd.read_csv(filePath, sep='\t')
+            loaded = self.getJobResult('gaze', fileElem, filePath)
+            if loaded is None:
+                continue
+            if 'availColumns' in loaded['meta']:
+                multiData.setNode('availColumns', fileElem.get('id'), loaded['meta']['availColumns'])
+
+            #TODO translation to degrees, velocity profile
+
+            for channel, data in loaded['nodes'].items():
+                if multiData.compact:
+                    data = multiData.compactDtypes(data)
+                multiData.setNode(channel, fileElem.get('id'), data)
+
+
+
+
+
+
+    #JOB methods
+    def getFiles(self, settingsReader:object) -> list:
+        """Lists data files from settings present on disk, with paths resolved the same way readers resolve them.
+
+        :param settingsReader: same as everywhere
+        :return: list of (type, file XML element, absolute path) tuples.
+        """
+        return [(type, fileElem, settingsReader.getPathAttrById(type, fileElem.get('id'), absolute=True))
+                for type in ['samples', 'gaze'] for fileElem in settingsReader.genTypeFile(type, checksum=False, quiet=True)]
+
+
+    def submitJobs(self, pool:object, files:list) -> None:
+        """Submits hashing and parsing of data files to the process pool.
+
+        :param pool: concurrent.futures executor.
+        :param files: list of tuples, as getFiles returns.
+        :return: None
+        """
+        self.jobs = {}
+        for type, fileElem, filePath in files:
+            md5 = self.main.fingerprintStore.lookup(filePath)
+            self.jobs[(type, fileElem.get('id'))] = pool.submit(loadFileJob, type, filePath, self.main.dataCache.getSettings(), md5, self.columns)
+
+
+    def getJobResult(self, type:str, fileElem:object, filePath:str) -> dict:
+        """Waits for the file job submitted before (or runs it right here), replays its console output and sets file checksum.
+
+        :param type: type string from settings.
+        :param fileElem: file XML element from settings.
+        :param filePath: absolute path to data file.
+        :return: dict with 'nodes' and 'meta' keys, None if file format is unknown.
+        """
+        future = self.jobs.pop((type, fileElem.get('id')), None)
+        if future:
+            md5, log, loaded = future.result()
+        else:
+            md5, log, loaded = loadFileJob(type, filePath, self.main.dataCache.getSettings(), self.main.fingerprintStore.lookup(filePath), self.columns)
+
+        #добавляем контрольную сумму в настройки
+        fileElem.set('md5', md5)
+        self.main.fingerprintStore.update(filePath, md5)
+        for text, status in log:
+            self.main.printToOut(text, status=status)
+        if isinstance(loaded, BaseException):
+            raise loaded
+        return loaded
+
+
+    def loadFile(self, type:str, filePath:str, md5:str) -> dict:
+        """Parses data file of given type, or loads it from cache.
+
+        :param type: type string from settings, 'samples' or 'gaze'.
+        :param filePath: absolute path to data file.
+        :param md5: file checksum, the cache key.
+        :return: dict with 'nodes' (channel name to DataFrame) and 'meta' keys, None if file format is unknown.
+        """
+        fileExt = os.path.splitext(filePath)[1].lower()
+        if fileExt == '.csv':
+            self.main.printToOut('Parsing {0} file.'.format(fileExt))
+            return {'nodes': {type: pd.read_csv(filePath, sep='\t')}, 'meta': {}}
+        elif type == 'samples' and fileExt == '.idf':
+            self.main.printToOut('ERROR: Cannot parse .idf files. Convert them to .txt first.')
+            raise NotImplementedError
+        elif not (type == 'samples' and fileExt == '.txt') and not (type == 'gaze' and fileExt in ['.tsv', '.json']):
+            self.main.printToOut('Unknown file format.')
+            return None
+
+        cached = self.main.dataCache.load(md5)
+        if cached and self.projectCached(cached):
+            return cached
+
+        self.main.printToOut('Parsing {0} file.'.format(fileExt))
+        if fileExt == '.txt':
+            metablock, availColumns, samplesData, messagesData, maxTime = self.parseSMISamples(filePath)
+            loaded = {'nodes': {'samples': samplesData, 'messages': messagesData},
+                      'meta': {'availColumns': availColumns, 'maxTime': maxTime, 'metadata': self.parseSMIMetadata(metablock), 'columns': self.columns}}
+        else:
+            if fileExt == '.tsv':
+                availColumns, gazeData, imuData = self.parseTobiiTSV(filePath)
             else:
-                self.main.printToOut('Unknown file format.')
+                availColumns, gazeData, imuData = self.parseTobiiJSON(filePath)
+            loaded = {'nodes': {'gaze': gazeData, 'imu': imuData}, 'meta': {'availColumns': availColumns}}
+
+        self.main.dataCache.store(md5, loaded['nodes'], loaded['meta'])
+        return loaded
 
 
-            multiData.setNode('gaze', fileElem.get('id'), gazeData)
+    def projectCached(self, cached:dict) -> bool:
+        """Drops samples columns not in projection from cached data, in place.
+
+        :param cached: DataCache.load result.
+        :return: False if cached samples were parsed with narrower projection, and the file has to be parsed again.
+        """
+        if 'samples' not in cached['nodes']:
+            return True
+
+        cachedColumns = cached['meta'].get('columns')
+        if cachedColumns is not None and (self.columns is None or not set(self.columns) <= set(cachedColumns)):
+            self.main.printToOut('Cached data lacks columns needed, parsing again.')
+            return False
+
+        availColumns = self.projectColumns(cached['meta']['availColumns'])
+        cached['nodes']['samples'] = cached['nodes']['samples'][availColumns]
+        cached['meta']['availColumns'] = availColumns
+        return True
 
 
 
 
 
 
-    #UTILS methods
-    def determineSkiprows(self, file:str, commentStr:str) -> int:
+    #PARSING methods
+    def parseSMISamples(self, filePath:str) -> tuple:
+        """Parses SMI .txt export in a single pass over the file.
+
+        Metablock, SMP samples and MSG messages are all collected from one read,
+        the table itself is parsed by one read_table call and then split by Type column.
+
+        :param filePath: absolute path to SMI samples .txt file.
+        :return: tuple of metablock str, available columns list, samples dataframe, messages dataframe and max timestamp (s, from record start).
         """
+        with open(filePath, encoding='UTF-8') as f:
+            metablock, availColumns, messageColumns = self.parseSMIHeader(f)
+            rawData = pd.read_table(f,
+                                    decimal=".", sep='\t', header=0, usecols=self.getSMIUsecols(availColumns, messageColumns),
+                                    dtype=self.getSMIDtypes(messageColumns))
 
-        :param file:
-        :param commentStr:
-        :return:
+        rawData['Time'] /= 1000000
+        #first line can be MSG type, but this is OK, we count from it anyway
+        zeroTime = rawData.iloc[0]['Time']
+        rawData['Time'] -= zeroTime
+        maxTime = rawData.iloc[-1]['Time']
+
+        samplesData, messagesData = self.splitSMIRows(rawData, availColumns, messageColumns)
+        return (metablock, availColumns, samplesData, messagesData, maxTime)
+
+
+
+    def genSMIChunks(self, filePath:str, chunkSize:int) -> tuple:
+        """Generator of SMI samples and messages, parsed in chunks of fixed number of lines.
+
+        Memory footprint is bounded by chunk size, not by file size.
+        Every samples chunk carries the same metadata dict in its metadata property.
+
+        :param filePath: absolute path to SMI samples .txt file.
+        :param chunkSize: number of lines (SMP and MSG together) to parse at once.
+        :return: tuple of available columns list, samples chunk dataframe and messages chunk dataframe.
+        """
+        with open(filePath, encoding='UTF-8') as f:
+            metablock, availColumns, messageColumns = self.parseSMIHeader(f)
+            metadata = self.parseSMIMetadata(metablock)
+            reader = pd.read_table(f,
+                                   decimal=".", sep='\t', header=0, usecols=self.getSMIUsecols(availColumns, messageColumns),
+                                   dtype=self.getSMIDtypes(messageColumns), chunksize=chunkSize)
+            zeroTime = None
+            for rawData in reader:
+                rawData['Time'] /= 1000000
+                if zeroTime is None:
+                    zeroTime = rawData.iloc[0]['Time']
+                rawData['Time'] -= zeroTime
+
+                samplesData, messagesData = self.splitSMIRows(rawData, availColumns, messageColumns)
+                samplesData.metadata = metadata
+                yield (availColumns, samplesData, messagesData)
+
+
+
+    def parseSMIHeader(self, f:object) -> tuple:
+        """Reads '##' metablock from open SMI samples file and determines columns to parse.
+
+        File position is left at the table header line, for the parser to read.
+
+        :param f: file object opened in text mode.
+        :return: tuple of metablock str, available columns list and message columns list.
         """
-        with open(file, encoding='UTF-8') as f:
-            lineNum = 0
-            line = f.readline()
-            while line.startswith(commentStr):
-                lineNum = lineNum + 1
-                line = f.readline()
-            return lineNum
+        metablock = []
+        while True:
+            pos = f.tell()
+            headers = f.readline()
+            metablock.append(headers)
+            if not headers.startswith('##'):
+                break
+        f.seek(pos)
+        metablock = ''.join(metablock)
+
+        #tested on SMI RED-m-HP data only
+        headersList = headers.strip().split('\t')
+        availColumns = [i for i in headersList if re.match('Time|Type|Trial|L POR X \[px\]|L POR Y \[px\]|R POR X \[px\]|R POR Y \[px\]|Timing|Latency|L Validity|R Validity|Frame|Trigger|Aux1', i)]
+        availColumns = self.projectColumns(availColumns)
+        #MSG lines have their text in column 3, whatever its header is
+        messageColumns = headersList[:4]
+        return (metablock, availColumns, messageColumns)
+
+    def projectColumns(self, availColumns:list) -> list:
+        """Leaves only samples columns in projection (and key ones), keeping file order.
+
+        :param availColumns: samples columns.
+        :return: list of column names.
+        """
+        if self.columns is None:
+            return availColumns
+        return [i for i in availColumns if i in self.columns or i in self.SMI_KEY_COLUMNS]
+
+    def getSMIUsecols(self, availColumns:list, messageColumns:list) -> list:
+        """Columns to parse for both SMP and MSG lines, in file order.
+
+        :param availColumns: samples columns.
+        :param messageColumns: messages columns.
+        :return: list of column names.
+        """
+        return availColumns + [i for i in messageColumns if i not in availColumns]
+
+    def getSMIDtypes(self, messageColumns:list) -> dict:
+        """Column types for SMI samples parser.
+
+        :param messageColumns: messages columns, the last one holds message text.
+        :return: dtype dict for read_table.
+        """
+        return {'Time':float, 'Type':str, 'Trial':int, 'Frame':str, messageColumns[3]:str}
+
+    def splitSMIRows(self, rawData:object, availColumns:list, messageColumns:list) -> tuple:
+        """Splits parsed SMI table into SMP samples and MSG messages.
+
+        :param rawData: dataframe parsed with both line types.
+        :param availColumns: samples columns.
+        :param messageColumns: messages columns, the last one holds message text.
+        :return: tuple of samples dataframe and messages dataframe.
+        """
+        textColumn = messageColumns[3]
+        samplesData = rawData.loc[rawData['Type']=='SMP', availColumns]
+        if textColumn in availColumns:
+            samplesData[textColumn] = pd.to_numeric(samplesData[textColumn])
+
+        #MSG lines
+        messagesData = rawData.loc[rawData['Type']=='MSG', messageColumns]
+        messagesData.rename(columns={textColumn: "Text"}, inplace=True)
+        messagesData['Text'] = messagesData['Text'].astype(str).str.replace('# Message: (.*)', '\\1', regex=True)
+        return (samplesData, messagesData)
+
+
+
+    def parseTobiiTSV(self, filePath:str, blockSize:int=1<<22) -> tuple:
+        """Parses Tobii Pro Lab .tsv export (UTF-16) in a single pass over the file.
+
+        The file is read once, decoded in large blocks and handed to pandas C parser as UTF-8,
+        instead of going line by line through a Python-level UTF-16 text stream.
+        Gyroscope and accelerometer rows are split off in the same pass, each row copied only once, into its own table.
+
+        :param filePath: absolute path to Tobii .tsv file.
+        :param blockSize: number of file bytes to decode at once.
+        :return: tuple of available columns list, gaze dataframe and IMU dataframe.
+        """
+        with open(filePath, 'rb') as f:
+            reader = TranscodingReader(f, 'UTF-16', blockSize)
+            # узнаем какие столбцы присутствуют
+            headersList = reader.peekLine().strip().split('\t')
+            availColumns = [i for i in headersList if re.match('Recording timestamp|Gaze point|Gaze 3D position|Gaze direction|Pupil diameter|Eye movement type|Gaze event duration|Fixation point|Gyro|Accelerometer',i)]
+            imuColumns = [i for i in availColumns if re.match('Gyro|Accelerometer', i)]
+            #Tobii own event classification is dropped, only EyesNotFound status is needed to keep empty gaze rows
+            eventColumns = [i for i in availColumns if re.match('Eye movement type|Gaze event duration|Fixation point', i)]
+            usecols = [i for i in availColumns if i not in eventColumns]
+            if 'Eye movement type' in availColumns:
+                usecols.append('Eye movement type')
+
+            data = pd.read_table(io.BufferedReader(reader), decimal=",", sep='\t', header=0, usecols=usecols, encoding='UTF-8')
+
+        # переводим в секунды
+        data['Recording timestamp'] /= 1000
+        #data['Gaze event duration'] /= 1000
+
+        # строки гироскопа отдельно, пустые строки (без взгляда) убираем
+        gazeRows = data['Gaze point X'].notnull().values & data['Gaze point Y'].notnull().values
+        if 'Eye movement type' in data.columns:
+            gazeRows = gazeRows | (data['Eye movement type'] == 'EyesNotFound').values
+        if len(imuColumns):
+            imuRows = data[imuColumns].notnull().values.any(axis=1)
+        else:
+            imuRows = np.zeros(len(data), dtype=bool)
+
+        gazeColumns = [i for i in data.columns if (i not in imuColumns) and (i not in eventColumns)]
+        gazeData = data.iloc[np.flatnonzero(gazeRows), [data.columns.get_loc(i) for i in gazeColumns]]
+        imuData = data.iloc[np.flatnonzero(imuRows), [data.columns.get_loc(i) for i in ['Recording timestamp'] + imuColumns]]
+        return (availColumns, gazeData, imuData)
+
+
+
+    def parseTobiiJSON(self, filePath:str, batchSize:int=10000) -> tuple:
+        """Parses Tobii Glasses 2 livedata .json file, one JSON object per line.
+
+        Lines are decoded in batches, and every record is unpacked straight into typed arrays of its data stream,
+        so the decoded objects of only one batch are held in memory at a time.
+        Output columns are named the same as in Tobii Pro Lab .tsv export.
+
+        :param filePath: absolute path to livedata .json file.
+        :param batchSize: number of lines to decode at once.
+        :return: tuple of available columns list, gaze dataframe and IMU dataframe.
+        """
+        streams = {}
+        def getStream(name:str, columns:list) -> dict:
+            if name not in streams:
+                streams[name] = {'ts': array('q'), 'key': array('q'), 'columns': columns,
+                                 'values': [array('d') for i in columns]}
+            return streams[name]
+
+        firstTs = None
+        with open(filePath, encoding='UTF-8') as f:
+            for lines in iter(lambda: [l for l in itertools.islice(f, batchSize) if l.strip()], []):
+                for rec in json.loads('[{0}]'.format(','.join(lines))):
+                    if 'ts' not in rec:
+                        continue
+                    if firstTs is None:
+                        firstTs = rec['ts']
+                    for field, (name, columns) in self.TOBII_JSON_FIELDS.items():
+                        if field not in rec:
+                            continue
+                        eye = rec.get('eye', '')
+                        stream = getStream(name.format(eye), [c.format(eye) for c in columns])
+                        stream['ts'].append(rec['ts'])
+                        #gaze index binds together all the streams of one gaze sample, IMU streams have no index
+                        stream['key'].append(rec.get('gidx', rec['ts']))
+                        value = rec[field] if rec.get('s', 0) == 0 else [math.nan] * len(columns)
+                        if not isinstance(value, list):
+                            value = [value]
+                        for arr, v in zip(stream['values'], value):
+                            arr.append(v)
+                        break
+
+        frames = {}
+        for name, stream in streams.items():
+            data = pd.DataFrame({c: np.frombuffer(arr, dtype=float) for c, arr in zip(stream['columns'], stream['values'])})
+            # переводим в секунды
+            data.insert(0, 'Recording timestamp', (np.frombuffer(stream['ts'], dtype=np.int64) - firstTs) / 1000000)
+            data.index = np.frombuffer(stream['key'], dtype=np.int64)
+            frames[name] = data
+        if 'gp' in frames:
+            frames['gp']['Gaze point X'] *= self.TOBII_SCENE_RESOLUTION[0]
+            frames['gp']['Gaze point Y'] *= self.TOBII_SCENE_RESOLUTION[1]
+
+        #one row per gaze sample, all eye streams joined to 2D gaze point by gaze index
+        gazeData = frames.pop('gp', pd.DataFrame(columns=['Recording timestamp', 'Gaze point X', 'Gaze point Y']))
+        gazeData = gazeData[~gazeData.index.duplicated(keep='last')]
+        imuData = [frames.pop(name) for name in ['gy', 'ac'] if name in frames]
+        for name, data in frames.items():
+            data = data.drop(columns='Recording timestamp')
+            gazeData = gazeData.join(data[~data.index.duplicated(keep='last')], how='left')
+        gazeData.reset_index(drop=True, inplace=True)
+
+        #gyroscope and accelerometer come in separate rows, same as in .tsv
+        if len(imuData):
+            imuData = pd.concat(imuData, sort=False).sort_values(by='Recording timestamp', kind='mergesort').reset_index(drop=True)
+        else:
+            imuData = pd.DataFrame(columns=['Recording timestamp'])
+
+        availColumns = list(gazeData.columns) + [i for i in imuData.columns if i != 'Recording timestamp']
+        return (availColumns, gazeData, imuData)
+
+
+
+    def parseSMIMetadata(self, metablock:str) -> dict:
+        """Parses experiment (record) metadata from SMI metablock.
+
+        Values assumed to be integers.
+
+        :param metablock: '##' comment lines from the head of SMI samples file.
+        :return: metadata dict.
+        """
+        sampleRate = int(re.search('Sample Rate:\t(\d+)', metablock).groups()[0])
+        screenSizePx = re.search('Calibration Area:\t(\d+)\t(\d+)', metablock).groups()
+        screenWidthPx, screenHeightPx = int(screenSizePx[0]), int(screenSizePx[1])
+        screenSizeMm = re.search('Stimulus Dimension \[mm\]:\t(\d+)\t(\d+)', metablock).groups()
+        screenWidthMm, screenHeightMm = int(screenSizeMm[0]), int(screenSizeMm[1])
+        headDistanceMm = int(re.search('Head Distance \[mm\]:\t(\d+)', metablock).groups()[0])
+
+        #degrees, assuming the eyesight axis is centered around the screen (spherical eye model)
+        screenWidthDeg = Utils.getSeparation(-screenWidthMm/2,0, screenWidthMm/2,0,  z=headDistanceMm,  mode='fromCartesian')
+        screenHeightDeg = Utils.getSeparation(-screenHeightMm / 2, 0, screenHeightMm / 2, 0, z=headDistanceMm, mode='fromCartesian')
+        screenHResMm, screenVResMm = screenWidthMm / screenWidthPx, screenHeightMm / screenHeightPx
+        return {'sampleRate': sampleRate,
+                'screenWidthPx': screenWidthPx, 'screenHeightPx': screenHeightPx,
+                'screenWidthMm': screenWidthMm, 'screenHeightMm': screenHeightMm,
+                'screenWidthDeg': screenWidthDeg, 'screenHeightDeg': screenHeightDeg,
+                'screenHResMm': screenHResMm, 'screenVResMm': screenVResMm,
+                'headDistanceMm': headDistanceMm}
+
+
+
+
+
+
+
+
+class JobLog():
+
+    """Stand-in for the main object inside pool worker processes.
+
+    Collects console output, which is then replayed by the parent process in settings order.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.dataCache = DataCache(self)
+
+
+    def printToOut(self, text:str, status:str = '') -> None:
+        self.lines.append((text, status))
+
+    def printError(self) -> None:
+        eInfo = sys.exc_info()
+        self.lines.append(('{0}: {1}.'.format(eInfo[0].__name__, eInfo[1]), 'error'))
+
+
+
+def loadFileJob(type:str, filePath:str, cacheSettings:dict, md5:str=None, columns:list=None) -> tuple:
+    """Hashes and loads one data file, runs in pool worker process.
+
+    Exceptions are returned, not raised, so that console output collected before them is not lost.
+
+    :param type: type string from settings.
+    :param filePath: absolute path to data file.
+    :param cacheSettings: DataCache.configure keyword arguments.
+    :param md5: file checksum, if already known from fingerprints, computed here otherwise.
+    :param columns: samples columns projection, see DataReader.columns.
+    :return: tuple of md5 checksum, console lines list and DataReader.loadFile result (or exception).
+    """
+    log = JobLog()
+    log.dataCache.configure(**cacheSettings)
+    if md5 is None:
+        md5 = Utils.md5(filePath)
+    try:
+        loaded = DataReader(log, workers=1, columns=columns).loadFile(type, filePath, md5)
+    except Exception as e:
+        loaded = e
+    return (md5, log.lines, loaded)
@@ -0,0 +1,261 @@
+import re
+
+
+import numpy as np
+from pandas import DataFrame
+
+
+from utils import Utils
+
+
+
+
+
+
+
+
+class DerivedColumns():
+
+    """Signals derived from raw eye positions of one samples dataframe, computed lazily on first access and memoized.
+
+    Column names are the same getVelocity always produced: {side}POR{dim}PxSmoothed, {side}POR{dim}Mm, {side}POR{dim}Deg,
+    {side}POR{dim}MmSmoothed, {side}POR{dim}DegSmoothed, {side}Velocity and {side}VelocitySmoothed.
+    Values depending on smoothing are dropped from memo when smoothing method changes.
+    When multiData segments samples, positions outside valid runs are NaN, and every run is smoothed on its own,
+    so velocity is neither computed across blinks and tracking loss nor smeared by them.
+    """
+
+    PATTERN = re.compile('^([LR])(?:POR([XY])(PxSmoothed|Mm|Deg|MmSmoothed|DegSmoothed)|(Velocity|VelocitySmoothed))$')
+    POSITION_SIGNALS = ['PxSmoothed', 'Mm', 'Deg', 'MmSmoothed', 'DegSmoothed']
+    VELOCITY_SIGNALS = ['Velocity', 'VelocitySmoothed']
+
+
+    def __init__(self, multiData:object, samplesData:DataFrame, smooth:str):
+        """
+
+        :param multiData: MultiData object, provides smoothing and velocity helpers.
+        :param samplesData: dataframe with raw position columns and metadata property.
+        :param smooth: smoothing algo name.
+        """
+        self.multiData = multiData
+        self.samplesData = samplesData
+        self.metadata = samplesData.metadata
+        self.smooth = smooth
+        self.memo = {}
+        #valid runs of each side, by side
+        self.runs = {}
+
+
+
+    def setSmooth(self, smooth:str) -> None:
+        """Changes smoothing method, invalidating every memoized value that depends on it.
+
+        :param smooth: smoothing algo name.
+        :return: None
+        """
+        if smooth != self.smooth:
+            self.smooth = smooth
+            self.dropSmoothed()
+
+
+    def dropSmoothed(self) -> None:
+        """Drops every memoized value that depends on smoothing, e.g. when its parameters change.
+
+        :return: None
+        """
+        self.memo = {key: value for key, value in self.memo.items() if 'Smoothed' not in key}
+
+
+    def getSides(self) -> list:
+        """Returns eye sides derived columns are computed for, right one only if left is absent or the same.
+
+        :return: list of 'L' and/or 'R'.
+        """
+        if self.metadata.get('equivalent') or 'L POR X [px]' not in self.samplesData.columns:
+            return ['R']
+        else:
+            return ['L', 'R']
+
+
+    def getNames(self) -> list:
+        """Returns names of all derived columns, in the order getVelocity adds them.
+
+        :return: list of column names.
+        """
+        names = []
+        for side in self.getSides():
+            for dim in ['X', 'Y']:
+                names.extend(['{0}POR{1}{2}'.format(side, dim, signal) for signal in self.POSITION_SIGNALS])
+            names.extend(['{0}{1}'.format(side, signal) for signal in self.VELOCITY_SIGNALS])
+        return names
+
+
+
+
+    #CALCULATING methods
+    def get(self, column:str) -> np.ndarray:
+        """Returns derived column values, computing them (and whatever they depend on) if not memoized yet.
+
+        :param column: derived column name.
+        :return: float array, one value per sample.
+        """
+        if column not in self.memo:
+            self.memo[column] = self.compute(column)
+        return self.memo[column]
+
+
+    def compute(self, column:str) -> np.ndarray:
+        """Computes one derived column from raw positions or other derived columns.
+
+        :param column: derived column name.
+        :return: float array.
+        """
+        match = self.PATTERN.match(column)
+        if not match:
+            raise KeyError('Unknown derived column: {0}.'.format(column))
+        side, dim, positionSignal, velocitySignal = match.groups()
+        metadata = self.metadata
+
+        if velocitySignal:
+            suffix = 'DegSmoothed' if velocitySignal == 'VelocitySmoothed' else 'Deg'
+            deg = np.column_stack((self.get('{0}PORX{1}'.format(side, suffix)), self.get('{0}PORY{1}'.format(side, suffix))))
+            velocity = self.multiData.getSeparationVelocity(deg, self.getTimelag(), metadata['headDistanceMm'])[:, 0]
+            runs = self.getRuns(side)
+            if runs is not None:
+                #first sample of a run has no valid predecessor
+                velocity[runs[0]] = np.nan
+            return velocity
+
+        if positionSignal == 'PxSmoothed':
+            #all position channels are smoothed together, as one 2-D array
+            sides = self.getSides() if side in self.getSides() else [side]
+            self.setSmoothed(self.smoothPositions(sides), sides)
+            return self.memo[column]
+        elif positionSignal in ['Mm', 'MmSmoothed']:
+            px = self.getPx(side, dim) if positionSignal == 'Mm' else self.get('{0}POR{1}PxSmoothed'.format(side, dim))
+            if dim == 'X':
+                return (px - metadata['screenWidthPx'] / 2) * metadata['screenHResMm']
+            else:
+                return -1 * (px - metadata['screenHeightPx'] / 2) * metadata['screenVResMm']
+        else:
+            coordsMm = self.get('{0}POR{1}{2}'.format(side, dim, positionSignal.replace('Deg', 'Mm')))
+            return np.sign(coordsMm) * Utils.getSeparationV(coordsMm,0, 0,0,  z=metadata['headDistanceMm'],  mode='fromCartesian')
+
+
+    def getPx(self, side:str, dim:str) -> np.ndarray:
+        """Raw position column as float array.
+
+        :param side: 'L' or 'R'.
+        :param dim: 'X' or 'Y'.
+        :return: float array.
+        """
+        px = self.samplesData['{0} POR {1} [px]'.format(side, dim)].values.astype(float)
+        px[~self.getValid(side)] = np.nan
+        return px
+
+
+    def getRuns(self, side:str) -> tuple:
+        """Valid runs of one eye, memoized.
+
+        :param side: 'L' or 'R'.
+        :return: tuple of run starts and ends as in MultiData.getValidRuns, None if samples are not segmented.
+        """
+        if not self.multiData.segment:
+            return None
+        if side not in self.runs:
+            self.runs[side] = self.multiData.getValidRuns(self.samplesData, side)
+        return self.runs[side]
+
+
+    def getPositions(self, sides:list=None) -> np.ndarray:
+        """Raw position columns as one float array, X and Y of every side.
+
+        :param sides: eye sides, None for getSides().
+        :return: float array of shape (n, 2 * len(sides)).
+        """
+        if sides is None:
+            sides = self.getSides()
+        return np.column_stack([self.getPx(side, dim) for side in sides for dim in ['X', 'Y']])
+
+
+    def getValid(self, side:str) -> np.ndarray:
+        """Marks samples inside valid runs of one eye, all of them if samples are not segmented.
+
+        :param side: 'L' or 'R'.
+        :return: bool array.
+        """
+        runs = self.getRuns(side)
+        if runs is None:
+            return np.ones(len(self.samplesData), dtype=bool)
+        return self.multiData.getRunMask(runs, len(self.samplesData))
+
+
+    def smoothPositions(self, sides:list) -> np.ndarray:
+        """Smooths raw positions of given sides, run by run if samples are segmented.
+
+        Sides sharing the same runs (as eyes usually do) are smoothed together.
+
+        :param sides: eye sides.
+        :return: float array, same layout as getPositions() returns, NaN outside runs.
+        """
+        positions = self.getPositions(sides)
+        if not self.multiData.segment:
+            return self.multiData.smoothPositions(positions, self.smooth)
+
+        smoother = self.multiData.getSmoother(self.smooth)
+        smoothed = np.full(positions.shape, np.nan)
+        groups = {}
+        for index, side in enumerate(sides):
+            starts, ends = self.getRuns(side)
+            groups.setdefault((starts.tobytes(), ends.tobytes()), ((starts, ends), []))[1].extend([2*index, 2*index + 1])
+        for (starts, ends), columns in groups.values():
+            for start, end in zip(starts, ends):
+                smoothed[start:end, columns] = smoother.smooth(positions[start:end, columns])
+        return smoothed
+
+
+    def setSmoothed(self, smoothed:np.ndarray, sides:list=None) -> None:
+        """Memoizes smoothed positions computed elsewhere, e.g. by causal smoothing in streaming mode.
+
+        :param smoothed: float array, same layout as getPositions() returns.
+        :param sides: eye sides, None for getSides().
+        :return: None
+        """
+        if sides is None:
+            sides = self.getSides()
+        index = 0
+        for side in sides:
+            for dim in ['X', 'Y']:
+                self.memo['{0}POR{1}PxSmoothed'.format(side, dim)] = smoothed[:, index]
+                index = index + 1
+
+
+    def getTimelag(self) -> np.ndarray:
+        """Time differences between samples in seconds, as a column; first sample has no predecessor and gets 1.
+
+        :return: float array of shape (n, 1).
+        """
+        if 'timelag' not in self.memo:
+            self.memo['timelag'] = np.hstack(( 1, np.diff(Utils.timeToSeconds(self.samplesData['Time'])) ))[:, np.newaxis]
+        return self.memo['timelag']
+
+
+
+
+    def materialize(self, columns:list=None) -> DataFrame:
+        """Writes derived columns into samples dataframe, in canonical order.
+
+        Derived columns keep precision of source coordinates (float32 in compact mode).
+
+        :param columns: columns to compute and write, None to write only those already computed.
+        :return: samples dataframe with columns added.
+        """
+        if columns is not None:
+            for column in columns:
+                self.get(column)
+
+        dtype = self.samplesData['R POR X [px]'].dtype
+        for column in self.getNames():
+            if column in self.memo:
+                self.samplesData[column] = self.memo[column].astype(dtype)
+        return self.samplesData
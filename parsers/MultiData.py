@@ -3,14 +3,15 @@ from datetime import timedelta
 
 
 import numpy as np
-from scipy.signal import convolve
-from scipy.signal import cspline1d
-from scipy.signal import savgol_filter
-from pandas import DataFrame
+import pandas as pd
+from pandas import DataFrame, concat
+from pandas.api.types import is_float_dtype, is_object_dtype, is_string_dtype, CategoricalDtype
 
 
 from utils.SettingsReader import SettingsReader
 from utils import Utils
+from parsers.DerivedColumns import DerivedColumns
+from algo.Smoother import Smoother
 
 
 
@@ -21,9 +22,24 @@ class MultiData():
     Includes some helper methods to select different data channels and filter by timestamp.
     """
 
-    def __init__(self, main):
+    #timestamp columns, kept as integer microseconds in compact mode
+    TIME_COLUMNS = ['Time', 'Recording timestamp']
+    #time between samples this many times longer than the typical one breaks a valid run, unless maxGap is set
+    GAP_FACTOR = 2.5
+
+    def __init__(self, main, compact:bool=False, smooth:str='spline', smoothOptions:dict=None, segment:bool=True, maxGap:float=None):
         self.main = main
         self.settingsReader = main.settingsReader
+        self.compact = compact
+        self.smooth = smooth
+        #window, order and lamb of Smoother, None for defaults
+        self.smoothOptions = smoothOptions or {}
+        #whether to smooth, differentiate and classify contiguous valid runs of samples only
+        self.segment = segment
+        #time gap (s) breaking a valid run, None to derive from sampling interval
+        self.maxGap = maxGap
+        #lazy derived columns of samples nodes, by id
+        self.derived = {}
         self.multiData = {}
         self.multiData['availColumns'] = {}
         self.multiData['samples'] = {}
@@ -32,8 +48,13 @@ class MultiData():
         self.multiData['fixation'] = {}
         self.multiData['saccade'] = {}
         self.multiData['pursuit'] = {}
+        #event stats per parameter set, in sweep mode
+        self.multiData['sweep'] = {}
         #----
         self.multiData['gaze'] = {}
+        self.multiData['imu'] = {}
+        #message and trial intervals of each record, by (block, id)
+        self.intervalTables = {}
         self.empty = True
 
 
@@ -62,7 +83,7 @@ class MultiData():
         
         :return: None.
         """
-        self.__init__(self.main)
+        self.__init__(self.main, compact=self.compact, smooth=self.smooth, smoothOptions=self.smoothOptions, segment=self.segment, maxGap=self.maxGap)
 
 
     def setNode(self, channel: str, id: str, data: object) -> None:
@@ -81,6 +102,85 @@ class MultiData():
 
 
 
+    def setIntervalTables(self, id:str, messagesData:DataFrame, endTime:float) -> None:
+        """Builds message and trial interval tables of a record from its messages.
+
+        Messages are (conventionally) assumed to have duration, up to the next message,
+        last one lasts up to the end of the record. Trials are messages with FixPoint text, assumed to have no gaps between them.
+        Special _zeroTime interval goes first, even if it itself equals 0.
+
+        :param id: string of channel id from settings.
+        :param messagesData: messages dataframe with Time and Text columns.
+        :param endTime: end of the record, in seconds.
+        :return: None
+        """
+        isTrial = messagesData['Text'].astype(str).str.contains('FixPoint').values
+        for block, rows in [('message', messagesData), ('trial', messagesData.loc[isTrial])]:
+            if not len(rows):
+                continue
+            starts = np.hstack((0, Utils.timeToSeconds(rows['Time']).values.astype(float)))
+            self.intervalTables[(block, id)] = DataFrame({'Id': ['_zeroTime'] + [str(i) for i in range(1, len(rows) + 1)],
+                                                          'Text': [''] + list(rows['Text'].astype(str)),
+                                                          'Time': starts,
+                                                          'Duration': np.diff(np.hstack((starts, endTime)))})
+
+
+    def getIntervalIndex(self, block:str, id:str=None) -> dict:
+        """Returns interval schedule of the block, from record own intervals table if there is one, from settings otherwise.
+
+        :param block: which type of block.
+        :param id: string of channel id from settings.
+        :return: same dict as SettingsReader.getIntervalIndex.
+        """
+        table = self.intervalTables.get((block, id))
+        if table is None:
+            return self.settingsReader.getIntervalIndex(block)
+
+        #same conversion as for samples timestamps, so that borders match exactly
+        borders = pd.to_timedelta(np.hstack((table['Time'].values, table['Time'].values[-1] + table['Duration'].values[-1])), unit='s').values.astype(np.int64)
+        #record ends at its last sample, which belongs to the last interval too, while interval ends are exclusive
+        borders[-1] = borders[-1] + 1
+        return {'ids': list(table['Id']),
+                'durations': list(table['Duration']),
+                'starts': borders[:-1],
+                'ends': borders[1:]}
+
+
+
+
+    def compactDtypes(self, data:DataFrame) -> DataFrame:
+        """Converts data to compact representation, roughly halving its memory footprint.
+
+        Float columns are converted to float32, repetitive str columns to categorical,
+        timestamps (seconds) to integer microseconds. Integer timestamps are then treated as microseconds everywhere,
+        see Utils.timeToSeconds.
+
+        :param data: dataframe to convert.
+        :return: converted copy of data, with metadata inherited.
+        """
+        columns = []
+        for index in range(data.shape[1]):
+            column = data.iloc[:, index]
+            if column.name in self.TIME_COLUMNS and is_float_dtype(column):
+                column = (column * 1000000).round().astype(np.int64)
+            elif is_float_dtype(column):
+                column = column.astype(np.float32)
+            elif (is_object_dtype(column) or is_string_dtype(column)) and column.nunique() < len(column) / 2:
+                column = column.astype('category')
+            columns.append(column)
+
+        compacted = concat(columns, axis=1) if len(columns) else data.copy()
+        #inheriting metadata
+        try:
+            compacted.metadata = data.metadata
+        except AttributeError:
+            pass
+        return compacted
+
+
+
+
+
     #FILTERING methods
     def getChannelById(self, channel:str, id:str, format:str='as_is') -> object:
         """Returns what's inside multiData[channel][id] dict hierarchy, possibly converting to dataframe.
@@ -123,15 +223,11 @@ class MultiData():
         else:
             startFrom = 0
         pathAttr = self.settingsReader.getPathAttrById(type=channelZeroName, id=id)
-        if ('Record tag' not in chData.columns) and ('Id' not in chData.columns):
-            chData.insert(2, 'Record tag', pathAttr)
-            chData.insert(3, 'Id', id)
-        #FIXME hotfix
-        elif 'Id 2' not in chData.columns:
-            chData['Record tag'] = pathAttr
-            chData.insert(8, 'Id 2', id)
+        #stored data stays untouched, tags are added to the selection only
+        tags = {'Record tag': pathAttr, 'Id': id}
 
-        return self.tagIntervals(chData, startFrom, block=block, ignoreEmpty=ignoreEmpty)
+        #data is compacted once, when it is read, and tag columns are compact already
+        return self.tagIntervals(chData, startFrom, block=block, ignoreEmpty=ignoreEmpty, id=id, tags=tags)
 
 
 
@@ -140,7 +236,8 @@ class MultiData():
     def getDataBetween(self, data:object, timeStart:object, timeEnd:object) -> object:
         """Selects and returns those data where timestamp is in given interval range.
         
-        Assuming timestamp in column 0.
+        Assuming timestamp in column 0. Data sorted by time is sliced by a contiguous range of rows,
+        which is a view sharing memory with the source, not a copy.
         
         :param data: data to trim from, usually after getChannelById method.
         :param timeStart: timestamp to begin data with in 'M:S.f' str or timedelta format.
@@ -148,17 +245,32 @@ class MultiData():
         :return: Trimmed data.
         """
         #self.main.logger.debug('get data between')
-        parsedTime = Utils.parseTimeV(data.iloc[:,0])
-        try:
-            data.insert(1, 'Timedelta', parsedTime)
-        except ValueError:
-            pass
-
         if type(timeStart) is not timedelta:
             timeStart = Utils.parseTime(timeStart)
         if type(timeEnd) is not timedelta:
             timeEnd = Utils.parseTime(timeEnd)
-        return data.loc[(data['Timedelta'] >= timeStart) & (data['Timedelta'] < timeEnd)]
+        timeStart = pd.Timedelta(timeStart).value
+        timeEnd = pd.Timedelta(timeEnd).value
+
+        timedeltas = self.getTimedeltas(data)
+        if np.all(timedeltas[1:] >= timedeltas[:-1]):
+            return data.iloc[np.searchsorted(timedeltas, timeStart, side='left'):np.searchsorted(timedeltas, timeEnd, side='left')]
+        else:
+            return data.loc[(timedeltas >= timeStart) & (timedeltas < timeEnd)]
+
+    def getTimedeltas(self, data:DataFrame) -> np.ndarray:
+        """Returns timestamps of data as int64 nanoseconds, without adding any columns to it.
+
+        'Timedelta' column is reused if data has one already, otherwise timestamp column 0 is parsed.
+
+        :param data: dataframe with timestamp in column 0.
+        :return: int64 array, one value per row.
+        """
+        if 'Timedelta' in data.columns:
+            timedeltas = data['Timedelta']
+        else:
+            timedeltas = Utils.parseTimeV(data.iloc[:,0])
+        return np.asarray(timedeltas, dtype='timedelta64[ns]').view(np.int64)
 
     def getDataInterval(self, data:object, startFrom:object, interval:str, block:str) -> object:
         """Selects and returns data where timestamp is inside interval defined by its id name.
@@ -176,38 +288,85 @@ class MultiData():
         endTime = self.settingsReader.getEndTimeById(interval, block=block) + startFrom
         return self.getDataBetween(data, startTime, endTime)
 
-    def tagIntervals(self, chData:object, startFrom:object, block:str, ignoreEmpty:bool=True) -> DataFrame:
+    def genIntervals(self, data:DataFrame, block:str):
+        """Iterates over intervals of data tagged by tagIntervals, without copying.
+
+        Tagged samples of every interval are contiguous, so each interval is yielded as a view of data rows.
+
+        :param data: dataframe after tagIntervals or getChannelAndTag.
+        :param block: which type of block data was tagged by.
+        :return: generator of (interval id, data view) tuples.
+        """
+        if not len(data):
+            return
+        codes = np.asarray(data[block].cat.codes) if isinstance(data[block].dtype, CategoricalDtype) else pd.factorize(data[block])[0]
+        bounds = np.hstack((0, np.flatnonzero(np.diff(codes)) + 1, len(data)))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield (data[block].iloc[start], data.iloc[start:end])
+
+    def tagIntervals(self, chData:object, startFrom:object, block:str, ignoreEmpty:bool=True, id:str=None, tags:dict=None) -> DataFrame:
         """Tags given data by intervals, then returns a single dataframe.
+
+        Every sample is assigned to its interval by one searchsorted over interval schedule from settings,
+        samples outside of intervals (or in empty ones, if ignored) are dropped.
+        Source data is not modified: result is a view of its rows when they are contiguous, tag columns are categorical,
+        so tagging the same channel again costs no more than the first time.
         
         :param chData: data to stack intervals from, usually after getChannelById method.
         :param startFrom: zeroTime to start from.
         :param block: which type of block to tag by.
         :param ignoreEmpty: Whether to cut off the empty and utility intervals.
+        :param id: string of channel id from settings, to use its own message and trial intervals.
+        :param tags: dict of constant column name to value, e.g. record tag and id, added unless data has them already.
         :return: DataFrame object ready to group by intervals.
         """
-        data = []
-        ints = self.settingsReader.getIntervals(block=block, ignoreEmpty=ignoreEmpty)
-        for interval in ints:
-            intData = self.getDataInterval(chData, startFrom, interval.get('id'), block=block)
-            intData.insert(4, block, interval.get('id'))
-            intData.insert(5, '{0} duration'.format(block), interval.get('duration'))
-            data.append(intData)
-
-        #case when there is no interval block in settings at all - nothing to tag
-        if len(ints)==0:
-            return chData
-        if len(ints)==1:
-            data = data[0]
+        if tags is None:
+            tags = {}
+        index = self.getIntervalIndex(block, id)
+        if ignoreEmpty:
+            selected = np.array([bool(intervalId) for intervalId in index['ids']], dtype=bool)
         else:
-            data = data[0].append(data[1:])
+            selected = np.ones(len(index['ids']), dtype=bool)
 
+        #case when there is no interval block in settings at all - nothing to tag
+        if not selected.any():
+            data = chData.copy(deep=False)
+            self.insertTags(data, tags, 2)
+            return data
 
-        zeroBased=[]
-        zeroTime = data.iloc[0, 0]
-        for timestamp in data.iloc[:, 0]:
-            zeroBased.append(timestamp - zeroTime)
-        #FIXME should be no duplicates
-        data.insert(1, 'TimestampZeroBased', zeroBased, allow_duplicates=True)
+        if type(startFrom) is not timedelta:
+            startFrom = Utils.parseTime(startFrom)
+        offset = pd.Timedelta(startFrom).value
+        timedeltas = self.getTimedeltas(chData)
+
+        #intervals follow each other, so the one sample falls into is the last started before it
+        position = np.searchsorted(index['starts'] + offset, timedeltas, side='right') - 1
+        inside = (position >= 0) & (timedeltas < (index['ends'] + offset)[position.clip(0)])
+        inside[inside] = selected[position[inside]]
+        rows = np.flatnonzero(inside)
+        rows = rows[np.argsort(position[rows], kind='stable')]
+        position = position[rows]
+
+        #retagging already tagged data replaces its tags
+        data = chData.drop(columns=[column for column in ['TimestampZeroBased', block, '{0} duration'.format(block)] if column in chData.columns])
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            data = data.iloc[rows[0]:rows[-1] + 1].copy(deep=False)
+        else:
+            data = data.iloc[rows]
+        if 'Timedelta' not in data.columns:
+            data.insert(1, 'Timedelta', pd.to_timedelta(timedeltas[rows]))
+        self.insertTags(data, tags, 3)
+
+        ids, idCodes = self.factorizeTags(index['ids'])
+        durations, durationCodes = self.factorizeTags(index['durations'])
+        data.insert(4, block, pd.Categorical.from_codes(idCodes[position], categories=ids))
+        data.insert(5, '{0} duration'.format(block), pd.Categorical.from_codes(durationCodes[position], categories=durations))
+
+        if len(data):
+            zeroBased = data.iloc[:, 0] - data.iloc[0, 0]
+        else:
+            zeroBased = []
+        data.insert(1, 'TimestampZeroBased', zeroBased)
 
         #inheriting metadata
         try:
@@ -218,100 +377,354 @@ class MultiData():
 
         return data
 
+    def insertTags(self, data:DataFrame, tags:dict, loc:int) -> None:
+        """Inserts constant tag columns as categoricals, one category each, skipping those data has already.
+
+        :param data: dataframe to insert into, in place.
+        :param tags: dict of column name to value.
+        :param loc: position of the first tag column.
+        :return: None
+        """
+        for name, value in tags.items():
+            if name not in data.columns:
+                #categories cannot be null, missing value is coded as -1 instead
+                if value is None:
+                    tag = pd.Categorical.from_codes(np.full(len(data), -1, dtype=np.int8), categories=[])
+                else:
+                    tag = pd.Categorical.from_codes(np.zeros(len(data), dtype=np.int8), categories=[value])
+                data.insert(loc, name, tag)
+                loc = loc + 1
+
+    def factorizeTags(self, values:list) -> tuple:
+        """Encodes per-interval values as codes into unique categories.
+
+        :param values: list of values, one per interval.
+        :return: tuple of unique values Index and codes array, one code per interval.
+        """
+        codes, uniques = pd.factorize(np.array(values, dtype=object))
+        return (uniques, codes)
+
+
+
+
+    #SEGMENTATION methods
+    def getValidMask(self, samplesData:DataFrame, side:str='R') -> np.ndarray:
+        """Marks samples with valid gaze position of one eye.
+
+        Sample is valid if its validity flag is 0 (when such column is present) and its coordinates are neither missing nor both zero,
+        which is how SMI records blinks and tracking loss.
+
+        :param samplesData: dataframe with raw position columns.
+        :param side: 'L' or 'R'.
+        :return: bool array, one value per sample.
+        """
+        x = samplesData['{0} POR X [px]'.format(side)].values.astype(float)
+        y = samplesData['{0} POR Y [px]'.format(side)].values.astype(float)
+        valid = ~(np.isnan(x) | np.isnan(y) | ((x == 0) & (y == 0)))
+        validity = '{0} Validity'.format(side)
+        if validity in samplesData.columns:
+            valid = valid & (samplesData[validity].values == 0)
+        return valid
+
+
+    def getValidRuns(self, samplesData:DataFrame, side:str='R', minLength:int=2) -> tuple:
+        """Splits samples into contiguous runs of valid ones, a run also breaks where time between samples exceeds maxGap.
+
+        :param samplesData: dataframe with time and raw position columns.
+        :param side: 'L' or 'R'.
+        :param minLength: shorter runs are dropped, 2 samples are needed for velocity at least.
+        :return: tuple of run starts and ends (exclusive) row positions, as int arrays.
+        """
+        valid = self.getValidMask(samplesData, side)
+        timelag = np.diff(np.asarray(Utils.timeToSeconds(samplesData['Time']), dtype=float))
+        gap = timelag > self.getMaxGap(samplesData)
+
+        starts = np.flatnonzero(valid & np.hstack((True, ~valid[:-1] | gap)))
+        ends = np.flatnonzero(valid & np.hstack((~valid[1:] | gap, True))) + 1
+        long = (ends - starts) >= minLength
+        return (starts[long], ends[long])
+
+
+    def getMaxGap(self, samplesData:DataFrame) -> float:
+        """Time between samples breaking a valid run, the same for a whole record, however its samples are split into chunks.
+
+        Unless maxGap is set, it is GAP_FACTOR sampling intervals of the record, taken from sample rate in its metadata.
+        Samples without sample rate metadata fall back to median time between them.
+
+        :param samplesData: dataframe with time column, and metadata property if any.
+        :return: time in seconds.
+        """
+        if self.maxGap is not None:
+            return self.maxGap
+        sampleRate = getattr(samplesData, 'metadata', {}).get('sampleRate')
+        if sampleRate:
+            return self.GAP_FACTOR / sampleRate
+        timelag = np.diff(np.asarray(Utils.timeToSeconds(samplesData['Time']), dtype=float))
+        return self.GAP_FACTOR * np.median(timelag) if len(timelag) else np.inf
+
+
+    def getRunMask(self, runs:tuple, length:int) -> np.ndarray:
+        """Marks samples inside runs.
+
+        :param runs: tuple of run starts and ends, as returned by getValidRuns.
+        :param length: number of samples.
+        :return: bool array.
+        """
+        marks = np.zeros(length + 1, dtype=np.int64)
+        np.add.at(marks, runs[0], 1)
+        np.add.at(marks, runs[1], -1)
+        return np.cumsum(marks[:-1]) > 0
+
+
 
 
 
     #EYE MOVEMENT methods
-    def getVelocity(self, samplesData:DataFrame, smooth:str, convertToDeg:bool) -> DataFrame:
+    def getVelocity(self, samplesData:DataFrame, smooth:str, convertToDeg:bool, quiet:bool=False, columns:list=None) -> DataFrame:
         """Method for calculating eye velocity, normally pixels converted to degrees first.
 
+        Derived columns are computed by DerivedColumns, whole columns at a time.
+
         :param samplesData: dataframe to operate on, containing appropriate eyetracker columns (Time, X, Y, etc.).
         :param smooth: algo to use, normally passed by command line argument.
         :param convertToDeg: whether data is passed in raw pixel values or visual angle degrees.
+        :param quiet: do not print progress messages, useful when called once per data chunk.
+        :param columns: derived columns to add (and whatever they depend on), None for all of them.
         :return: data with added *Velocity columns (and smoothed position columns).
         """
         #TODO data column names hard-coded, need refactor to global name dictionary mapper (SMI, Tobii variants)
         #  mapping goes to multiData metadata property
         #TODO B side (binocular) variant not implemented (applicable for SMI ETG)
-        if all(samplesData['L POR X [px]'] == samplesData['R POR X [px]']) and all(samplesData['L POR Y [px]'] == samplesData['R POR Y [px]']):
-            self.main.printToOut('Left and right channels detected equivalent. Working with one channel only.')
+        self.checkEquivalent(samplesData, quiet=quiet)
+        if not quiet:
+            self.main.printToOut('WARNING: Dimensions metadata from samples file is considered correct and precise, and used in pixel-to-degree conversions.')
+            self.main.printToOut('Now calculating velocity, be patient.')
+
+        if not convertToDeg:
+            self.main.printToOut('ERROR: Raw pixels in data are currently assumed, column names hard-coded.')
+            raise NotImplementedError
+
+        derived = DerivedColumns(self, samplesData, smooth)
+        samplesData = derived.materialize(derived.getNames() if columns is None else columns)
+
+        if not quiet:
+            self.main.printToOut('Done.', status='ok')
+        return samplesData
+
+
+    def checkEquivalent(self, samplesData:DataFrame, quiet:bool=False) -> None:
+        """Marks samples metadata as equivalent, if left and right eye channels are the same (or left one is absent).
+
+        :param samplesData: dataframe with raw position columns and metadata property.
+        :param quiet: do not print message.
+        :return: None
+        """
+        #left eye columns may be not parsed at all, see DataReader.columns
+        if 'L POR X [px]' not in samplesData.columns:
+            samplesData.metadata['equivalent'] = True
+        elif all(samplesData['L POR X [px]'] == samplesData['R POR X [px]']) and all(samplesData['L POR Y [px]'] == samplesData['R POR Y [px]']):
+            if not samplesData.metadata.get('equivalent') and not quiet:
+                self.main.printToOut('Left and right channels detected equivalent. Working with one channel only.')
             samplesData.metadata['equivalent'] = True
 
-        metadata = samplesData.metadata
-        self.main.printToOut('WARNING: Dimensions metadata from samples file is considered correct and precise, and used in pixel-to-degree conversions.')
-        self.main.printToOut('Now calculating velocity, be patient.')
 
-        if metadata['equivalent']:
-            #должен быть ведущий глаз
-            sides = ['R']
-        else:
-            sides = ['L', 'R']
-
-        #TODO skipping one channel if same
-        for side in sides:
-            for dim in ['X', 'Y']:
-                # smoothing
-                dataToSmooth = samplesData['{0} POR {1} [px]'.format(side, dim)]
-                if smooth == 'savgol':
-                    samplesData['{0}POR{1}PxSmoothed'.format(side, dim)] = savgol_filter(dataToSmooth, 15, 2)
-                elif smooth == 'spline':
-                    #scipy.interpolate.UnivariateSpline(x,y, k=1).get_coeffs()
-                    samplesData['{0}POR{1}PxSmoothed'.format(side, dim)] = cspline1d(np.array(dataToSmooth), lamb=3)
-                elif smooth == 'conv':
-                    #width and shape of convolution, equivalent to moving average if all 1
-                    win = np.array([1,1,1,1,1,1])
-                    samplesData['{0}POR{1}PxSmoothed'.format(side, dim)] = convolve(np.array(dataToSmooth), in2=win, mode='same') / win.sum()
-                else:
-                    self.main.printToOut('ERROR: Invalid smoothing function specified.')
+    def getDerived(self, id:str) -> DerivedColumns:
+        """Returns lazy derived columns of samples node, creating them on first access.
 
+        :param id: string of channel id from settings.
+        :return: DerivedColumns object, memoized values are kept until samples node is replaced.
+        """
+        samplesData = self.multiData['samples'][id]
+        derived = self.derived.get(id)
+        if derived is None or derived.samplesData is not samplesData:
+            self.checkEquivalent(samplesData)
+            derived = DerivedColumns(self, samplesData, self.smooth)
+            self.derived[id] = derived
+        return derived
+
+
+    def setSmooth(self, smooth:str, window:int=None, order:int=None, lamb:float=None) -> None:
+        """Sets smoothing method and its parameters for derived columns, invalidating those already computed with other ones.
+
+        :param smooth: algo name, normally passed by command line argument.
+        :param window: kernel length in samples, for savgol and conv, None for default.
+        :param order: polynomial order, for savgol, None for default.
+        :param lamb: smoothing strength, for spline, None for default.
+        :return: None
+        """
+        smoothOptions = {key: value for key, value in [('window', window), ('order', order), ('lamb', lamb)] if value is not None}
+        #fail early on invalid parameters
+        self.getSmoother(smooth, smoothOptions)
 
+        optionsChanged = smoothOptions != self.smoothOptions
+        self.smooth = smooth
+        self.smoothOptions = smoothOptions
+        for derived in self.derived.values():
+            derived.setSmooth(smooth)
+            if optionsChanged:
+                derived.dropSmoothed()
 
-                if dim == 'X':
-                    screenDim = metadata['screenWidthPx']
-                    screenRes = metadata['screenHResMm']
-                    multiplier = 1
-                elif dim == 'Y':
-                    screenDim = metadata['screenHeightPx']
-                    screenRes = metadata['screenVResMm']
-                    multiplier = -1
 
+    def getSmoother(self, smooth:str, smoothOptions:dict=None) -> Smoother:
+        """Returns smoother for given method, configured with current smoothing parameters.
 
-                if not convertToDeg:
-                    self.main.printToOut('ERROR: Raw pixels in data are currently assumed, column names hard-coded.')
-                    raise NotImplementedError
-                else:
-                    #converting to DEGREES
-                    samplesData['{0}POR{1}Mm'.format(side, dim)]  = multiplier * (samplesData['{0} POR {1} [px]'.format(side, dim)] - screenDim / 2) * screenRes
-                    coordsMm = samplesData['{0}POR{1}Mm'.format(side, dim)]
-                    samplesData['{0}POR{1}Deg'.format(side, dim)] = np.sign(coordsMm) * coordsMm.apply(lambda x: Utils.getSeparation(x,0, 0,0,  z=metadata['headDistanceMm'],  mode='fromCartesian'))
-                    #----
-                    samplesData['{0}POR{1}MmSmoothed'.format(side, dim)] = multiplier * (samplesData['{0}POR{1}PxSmoothed'.format(side, dim)] - screenDim / 2) * screenRes
-                    coordsMm = samplesData['{0}POR{1}MmSmoothed'.format(side, dim)]
-                    samplesData['{0}POR{1}DegSmoothed'.format(side, dim)] = np.sign(coordsMm) * coordsMm.apply(lambda x: Utils.getSeparation(x,0, 0,0,  z=metadata['headDistanceMm'],  mode='fromCartesian'))
-
-
-
-            #VELOCITY calculation
-            x = samplesData['{0}PORXDeg'.format(side)]
-            y = samplesData['{0}PORYDeg'.format(side)]
-            row = DataFrame({'x1':x[1:].reset_index(drop=True), 'y1':y[1:].reset_index(drop=True),  'x0':x[:(len(x) - 1)].reset_index(drop=True), 'y0':y[:(len(y) - 1)].reset_index(drop=True)})
-            seps = row.apply(lambda rowApply: Utils.getSeparation(x1=rowApply['x1'], y1=rowApply['y1'],  x2=rowApply['x0'], y2=rowApply['y0'],  z=metadata['headDistanceMm'],  mode='fromPolar'), axis=1)
-            separation = np.hstack((1, seps))
-            timelag = np.hstack((1, np.diff(samplesData['Time'])))
-            samplesData['{0}Velocity'.format(side)] = separation / timelag
-
-            #----
-            x = samplesData['{0}PORXDegSmoothed'.format(side)]
-            y = samplesData['{0}PORYDegSmoothed'.format(side)]
-            row = DataFrame({'x1': x[1:].reset_index(drop=True), 'y1': y[1:].reset_index(drop=True), 'x0': x[:(len(x) - 1)].reset_index(drop=True), 'y0': y[:(len(y) - 1)].reset_index(drop=True)})
-            seps = row.apply(lambda rowApply: Utils.getSeparation(x1=rowApply['x1'], y1=rowApply['y1'], x2=rowApply['x0'], y2=rowApply['y0'], z=metadata['headDistanceMm'], mode='fromPolar'), axis=1)
-            separation = np.hstack((1, seps))
-            timelag = np.hstack(( 1, np.diff(samplesData['Time']) ))
-            samplesData['{0}VelocitySmoothed'.format(side)] = separation / timelag
-
-
-        self.main.printToOut('Done.', status='ok')
-        return samplesData
+        :param smooth: algo name, normally passed by command line argument.
+        :param smoothOptions: parameters to use instead of current ones.
+        :return: Smoother object.
+        """
+        if smoothOptions is None:
+            smoothOptions = self.smoothOptions
+        try:
+            return Smoother(smooth, **smoothOptions)
+        except ValueError:
+            self.main.printError()
+            self.main.printToOut('ERROR: Invalid smoothing function or parameters specified.')
+            raise
+
+
+    def materializeDerived(self, id:str, all:bool=False) -> DataFrame:
+        """Writes derived columns into samples node, e.g. before export.
+
+        :param id: string of channel id from settings.
+        :param all: compute and write every derived column, not only those already used by detectors.
+        :return: samples dataframe.
+        """
+        derived = self.getDerived(id)
+        return derived.materialize(derived.getNames() if all else None)
+
+
+    def smoothPositions(self, px:np.ndarray, smooth:str) -> np.ndarray:
+        """Smooths all columns of position array at once.
+
+        :param px: 2-D array, samples in rows, coordinates in columns.
+        :param smooth: algo to use, normally passed by command line argument.
+        :return: array of same shape.
+        """
+        return self.getSmoother(smooth).smooth(px)
+
+
+    def getSeparationVelocity(self, deg:np.ndarray, timelag:np.ndarray, z:float) -> np.ndarray:
+        """Angular velocity between consecutive samples, for every eye at once.
+
+        :param deg: 2-D array of positions in degrees, X and Y columns of each eye side by side.
+        :param timelag: column of time differences between samples, in seconds.
+        :param z: head distance, in mm.
+        :return: 2-D array with one velocity column per eye.
+        """
+        x = deg[:, 0::2]
+        y = deg[:, 1::2]
+        seps = Utils.getSeparationV(x1=x[1:], y1=y[1:],  x2=x[:-1], y2=y[:-1],  z=z,  mode='fromPolar')
+        separation = np.vstack((np.ones((1, x.shape[1])), seps))
+        return separation / timelag
+
+
+
+    def genVelocityChunks(self, chunks:object, smooth:str, convertToDeg:bool, halo:int=64, columns:list=None) -> DataFrame:
+        """Generator of velocity data calculated chunk by chunk, for streaming mode.
+
+        Overlap-save scheme: every chunk is processed together with the tail of the previous one,
+        and the last halo samples are held back until the next chunk arrives,
+        so smoothing windows and inter-sample velocity do not break on chunk borders.
+
+        :param chunks: iterable of samples dataframes, each with metadata property.
+        :param smooth: algo to use, normally passed by command line argument.
+        :param convertToDeg: whether data is passed in raw pixel values or visual angle degrees.
+        :param halo: number of samples of context on each side of chunk, raised to what smoothing needs if lower.
+        :param columns: derived columns to add, same as in getVelocity.
+        :return: velocity dataframes, each sample emitted exactly once, in order.
+        """
+        halo = max(halo, self.getSmoother(smooth).getHalo())
+        tail = None
+        tailEmitted = 0
+        for chunk in chunks:
+            if not len(chunk):
+                continue
+            metadata = chunk.metadata
+            if tail is None:
+                buffer = chunk
+            else:
+                buffer = concat((tail, chunk))
+                buffer.metadata = metadata
+            velocityData = self.getVelocity(samplesData=buffer, smooth=smooth, convertToDeg=convertToDeg, quiet=True, columns=columns)
+            end = max(len(buffer) - halo, tailEmitted)
+            yield velocityData.iloc[tailEmitted:end]
+
+            tail = buffer[chunk.columns].iloc[-2*halo:]
+            tail.metadata = metadata
+            tailEmitted = len(tail) - (len(buffer) - end)
+
+        if tail is not None and tailEmitted < len(tail):
+            velocityData = self.getVelocity(samplesData=tail, smooth=smooth, convertToDeg=convertToDeg, quiet=True, columns=columns)
+            yield velocityData.iloc[tailEmitted:]
+
+
+
+
+
+    def genCausalVelocityChunks(self, chunks:object, smooth:str, convertToDeg:bool, columns:list=None) -> DataFrame:
+        """Generator of velocity data calculated chunk by chunk with causal smoothing, for online use.
+
+        Smoothing state is carried over between chunks, so nothing is held back and every chunk is emitted as soon as it arrives.
+        Last sample of the previous chunk is kept as a context for inter-sample velocity.
+
+        :param chunks: iterable of samples dataframes, each with metadata property.
+        :param smooth: algo to use, normally passed by command line argument.
+        :param convertToDeg: whether data is passed in raw pixel values or visual angle degrees.
+        :param columns: derived columns to add, same as in getVelocity.
+        :return: velocity dataframes, one per chunk.
+        """
+        if not convertToDeg:
+            self.main.printToOut('ERROR: Raw pixels in data are currently assumed, column names hard-coded.')
+            raise NotImplementedError
+
+        smoother = self.getSmoother(smooth)
+        states = None
+        context = None
+        for chunk in chunks:
+            if not len(chunk):
+                continue
+            metadata = chunk.metadata
+            if context is None:
+                buffer = chunk
+            else:
+                buffer = concat((context, chunk))
+                buffer.metadata = metadata
+            #channels smoothed are fixed by the first chunk, so that smoothing state fits all the following ones
+            if states is None:
+                self.checkEquivalent(buffer, quiet=True)
+                equivalent = metadata.get('equivalent', False)
+                states = {}
+            else:
+                metadata['equivalent'] = equivalent
+
+            derived = DerivedColumns(self, buffer, smooth)
+            offset = len(buffer) - len(chunk)
+            positions = derived.getPositions()
+            smoothed = np.full(positions.shape, np.nan)
+            for index, side in enumerate(derived.getSides()):
+                channels = [2*index, 2*index + 1]
+                runs = derived.getRuns(side)
+                if runs is None:
+                    runs = ([0], [len(buffer)])
+                carried = states.get(side)
+                states[side] = None
+                for start, end in zip(*runs):
+                    if end <= offset:
+                        continue
+                    #smoothing resumes only for the run continuing from previous chunk, i.e. including the context sample
+                    state = carried if start < offset else None
+                    start = max(start, offset)
+                    smoothed[start:end, channels], state = smoother.smoothCausal(positions[start:end, channels], state)
+                    if end == len(buffer):
+                        states[side] = state
+            if context is not None:
+                smoothed[:offset] = contextSmoothed
+            derived.setSmoothed(smoothed)
+            velocityData = derived.materialize(derived.getNames() if columns is None else columns)
+            yield velocityData.iloc[len(buffer) - len(chunk):]
+
+            context = buffer[chunk.columns].iloc[-1:]
+            contextSmoothed = smoothed[-1:]
 
 
 
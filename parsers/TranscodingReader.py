@@ -0,0 +1,65 @@
+import io, codecs
+
+
+
+
+
+
+
+
+class TranscodingReader(io.RawIOBase):
+
+    """Binary file-like object serving a text file re-encoded to UTF-8.
+
+    The source file is read and decoded in large blocks, so that pandas C parser can consume encodings
+    (e.g. UTF-16) it otherwise reads only through a Python-level text stream.
+    Only one decoded block is held in memory at a time.
+    """
+
+    def __init__(self, file:object, encoding:str, blockSize:int=1<<22):
+        """
+        :param file: source file opened in binary mode.
+        :param encoding: source file encoding.
+        :param blockSize: number of source bytes to decode at once.
+        """
+        self.file = file
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.blockSize = blockSize
+        self.buffer = b''
+        self.offset = 0
+        self.eof = False
+
+
+    def readable(self) -> bool:
+        return True
+
+
+    def fill(self) -> None:
+        """Decodes next block of source file, appending it to the unread part of the buffer.
+
+        :return: None
+        """
+        block = self.file.read(self.blockSize)
+        self.eof = not block
+        self.buffer = self.buffer[self.offset:] + self.decoder.decode(block, final=self.eof).encode('UTF-8')
+        self.offset = 0
+
+
+    def peekLine(self) -> str:
+        """Returns next line without consuming it, e.g. a header to choose columns by.
+
+        :return: line str, without line break.
+        """
+        while self.buffer.find(b'\n', self.offset) < 0 and not self.eof:
+            self.fill()
+        end = self.buffer.find(b'\n', self.offset)
+        return self.buffer[self.offset:end if end >= 0 else len(self.buffer)].decode('UTF-8').rstrip('\r')
+
+
+    def readinto(self, b:object) -> int:
+        while self.offset >= len(self.buffer) and not self.eof:
+            self.fill()
+        size = min(len(b), len(self.buffer) - self.offset)
+        b[:size] = memoryview(self.buffer)[self.offset:self.offset + size]
+        self.offset = self.offset + size
+        return size
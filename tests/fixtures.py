@@ -0,0 +1,210 @@
+import math, cmath, warnings
+
+import numpy as np
+from pandas import DataFrame
+
+from parsers.DataReader import DataReader
+
+
+
+
+#sampling rate of synthetic recordings, Hz
+RATE = 500
+
+
+def getGazeTrace(seed:int, length:int=5000, lost:float=0.1) -> DataFrame:
+    """Synthetic gaze of one eye: fixations with jitter, saccades, smooth pursuits and tracking loss, in degrees.
+
+    :param seed: random generator seed.
+    :param length: number of samples.
+    :param lost: share of tracking loss stretches among all stretches.
+    :return: DataFrame with Time (s), X and Y (deg) and Velocity (deg/s) columns, NaN where gaze is lost.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = np.zeros(length), np.zeros(length)
+    kinds = ['fixation', 'saccade', 'pursuit', 'lost']
+    weights = np.array([0.45, 0.3, 0.15, 0]) * (1 - lost) / 0.9 + np.array([0, 0, 0, lost])
+    missing = np.zeros(length, dtype=bool)
+    index = 0
+    position = np.zeros(2)
+    while index < length:
+        kind = rng.choice(kinds, p=weights)
+        if kind == 'fixation':
+            size = rng.integers(50, 200)
+            path = position + rng.normal(0, 0.004, (size, 2))
+        elif kind == 'saccade':
+            size = rng.integers(5, 20)
+            target = position + rng.uniform(-10, 10, 2)
+            path = position + np.linspace(0, 1, size + 1)[1:, np.newaxis] * (target - position)
+        elif kind == 'pursuit':
+            size = rng.integers(100, 300)
+            angle = rng.uniform(0, 2*np.pi)
+            speed = rng.uniform(5, 25) / RATE * np.array([np.cos(angle), np.sin(angle)])
+            path = position + np.arange(1, size + 1)[:, np.newaxis] * speed + rng.normal(0, 0.002, (size, 2))
+        else:
+            size = rng.integers(10, 50)
+            path = np.repeat(position[np.newaxis], size, axis=0)
+            missing[index:index + size] = True
+        x[index:index + size], y[index:index + size] = path[:length - index, 0], path[:length - index, 1]
+        position = path[-1]
+        index = index + size
+
+    time = np.arange(length) / RATE
+    x[missing], y[missing] = np.nan, np.nan
+    velocity = np.hstack((np.nan, np.hypot(np.diff(x), np.diff(y)) * RATE))
+    return DataFrame({'Time': time, 'X': x, 'Y': y, 'Velocity': velocity})
+
+
+
+def getSMISamples(seed:int, length:int=5000, gap:tuple=(2000, 2100)) -> DataFrame:
+    """Synthetic SMI samples of both eyes, as DataReader parses them: blinks are zero coordinates with nonzero validity.
+
+    Positions follow getGazeTrace, left eye is right one with noise added. Samples in gap are dropped, leaving a hole in time.
+
+    :param seed: random generator seed.
+    :param length: number of samples before gap is dropped.
+    :param gap: start and end (exclusive) positions of samples to drop.
+    :return: DataFrame with metadata property, as parseSMIMetadata returns it.
+    """
+    trace = getGazeTrace(seed, length)
+    rng = np.random.default_rng(seed)
+    lost = np.isnan(trace['X'].values)
+    samplesData = DataFrame({'Time': trace['Time'].values, 'Type': 'SMP', 'Trial': 1})
+    for side, noise in [('L', 0.5), ('R', 0)]:
+        samplesData['{0} POR X [px]'.format(side)] = np.where(lost, 0, 840 + 35 * trace['X'].values + rng.normal(0, noise, length))
+        samplesData['{0} POR Y [px]'.format(side)] = np.where(lost, 0, 525 - 35 * trace['Y'].values + rng.normal(0, noise, length))
+    for side in ['L', 'R']:
+        samplesData['{0} Validity'.format(side)] = np.where(lost, 4, 0)
+    samplesData = samplesData.drop(index=range(*gap)).reset_index(drop=True)
+    samplesData.metadata = DataReader(None).parseSMIMetadata('## Sample Rate:\t{0}\n## Calibration Area:\t1680\t1050\n'
+                                                             '## Stimulus Dimension [mm]:\t474\t297\n## Head Distance [mm]:\t700\n'.format(RATE))
+    return samplesData
+
+
+def getChunks(samplesData:DataFrame, size:int) -> list:
+    """Splits samples into chunks as streaming reader gives them, every one carrying the same metadata dict.
+
+    :return: list of DataFrames.
+    """
+    chunks = []
+    for start in range(0, len(samplesData), size):
+        chunk = samplesData.iloc[start:start + size].copy()
+        chunk.metadata = samplesData.metadata
+        chunks.append(chunk)
+    return chunks
+
+
+def writeSMIFile(filePath:str, seed:int, length:int=2000, messages:tuple=(0, 500, 1200)) -> None:
+    """Writes SMI samples .txt export, as IDF Converter does, of getSMISamples data with FixPoint and trial messages.
+
+    :param filePath: file to write.
+    :param seed: random generator seed.
+    :param length: number of samples.
+    :param messages: sample positions to put a message before.
+    :return: None
+    """
+    samplesData = getSMISamples(seed, length, gap=(0, 0))
+    columns = ['Time', 'Type', 'Trial', 'L POR X [px]', 'L POR Y [px]', 'R POR X [px]', 'R POR Y [px]', 'Latency', 'L Validity', 'R Validity', 'Aux1']
+    with open(filePath, 'w', encoding='UTF-8') as f:
+        f.write('## [iView]\n## Converted from:\tX.idf\n## Sample Rate:\t{0}\n## Calibration Area:\t1680\t1050\n'
+                '## Stimulus Dimension [mm]:\t474\t297\n## Head Distance [mm]:\t700\n##\n'.format(RATE))
+        f.write('\t'.join(columns) + '\n')
+        for index, row in enumerate(samplesData.itertuples(index=False)):
+            time = 1000000000 + index * 1000000 // RATE
+            if index in messages:
+                text = 'FixPoint_{0}.avi'.format(index) if messages.index(index) % 2 == 0 else 'trial{0}.avi'.format(index)
+                f.write('{0}\tMSG\t1\t# Message: {1}\n'.format(time, text))
+            f.write('{0}\tSMP\t1\t{1:.2f}\t{2:.2f}\t{3:.2f}\t{4:.2f}\t12.3\t{5}\t{6}\t0\n'.format(time, row[3], row[4], row[5], row[6], row[7], row[8]))
+
+
+def writeSettings(filePath:str, elements:list) -> None:
+    """Writes settings .xml file with given elements, e.g. file and interval tags.
+
+    :param filePath: file to write.
+    :param elements: list of element str.
+    :return: None
+    """
+    with open(filePath, 'w', encoding='UTF-8') as f:
+        f.write('<?xml version="1.0"?>\n<settings>\n{0}\n</settings>\n'.format('\n'.join(elements)))
+
+
+def referenceEvents(time:np.ndarray, states:np.ndarray, values:np.ndarray, state:int, noiseLevel:float=None, minMotion:float=0) -> DataFrame:
+    """Event table of one state built run by run, as EventFilter.getResultFiltered gives it.
+
+    Saccade borders are extended sample by sample to the nearest values at noise level, if noiseLevel is given.
+
+    :return: DataFrame indexed by ordinal, with count, min, max, mean and dur columns.
+    """
+    rows, ordinals = [], []
+    start = 0
+    for index in range(1, len(states) + 1):
+        if index < len(states) and states[index] == states[start]:
+            continue
+        if states[start] == state:
+            first, last = start, index - 1
+            if noiseLevel is not None:
+                first = next((i for i in range(first - 1, -1, -1) if values[i] <= noiseLevel), 0)
+                last = next((i for i in range(last, len(values)) if values[i] <= noiseLevel), len(values) - 1)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                mean = np.nanmean(values[start:index])
+            rows.append((index - start, time[first], time[last], mean, time[last] - time[first]))
+            ordinals.append(len(ordinals) + 1)
+        start = index
+    events = DataFrame(rows, index=ordinals, columns=['count', 'min', 'max', 'mean', 'dur'])
+    return events[events['dur'] >= minMotion]
+
+
+def referenceFixations(time:np.ndarray, x:np.ndarray, y:np.ndarray, valid:np.ndarray, maxDispersion:float, minDuration:float) -> np.ndarray:
+    """Naive I-DT, dispersion of every window rescanned: windows covering min_duration within max_dispersion are grown and marked fixation.
+
+    :return: bool array of fixation samples.
+    """
+    length = len(time)
+    #end of valid segment every sample belongs to
+    segmentEnd = np.zeros(length, dtype=int)
+    end = length
+    for index in range(length - 1, -1, -1):
+        if not valid[index]:
+            end = index
+        segmentEnd[index] = end
+
+    dispersion = lambda i, j: np.ptp(x[i:j]) + np.ptp(y[i:j])
+    fixation = np.zeros(length, dtype=bool)
+    i = 0
+    while i < length:
+        if not valid[i]:
+            i = i + 1
+            continue
+        end = segmentEnd[i]
+        j = i + 1
+        while j < end and time[j-1] - time[i] < minDuration:
+            j = j + 1
+        if time[j-1] - time[i] < minDuration:
+            i = end
+            continue
+        if dispersion(i, j) > maxDispersion:
+            i = i + 1
+            continue
+        while j < end and dispersion(i, j + 1) <= maxDispersion:
+            j = j + 1
+        fixation[i:j] = True
+        i = j
+    return fixation
+
+
+def referenceSeparation(x1:float,y1:float, x2:float,y2:float,  z:float,  mode:str) -> float:
+    """Scalar separation the way getSeparation originally computed it, through cmath.polar and angles.sep, in plain math."""
+    if mode=='fromCartesian':
+        lon1 = cmath.polar(complex(x1, z))[1]-math.pi/2
+        lat1 = cmath.polar(complex(y1, z))[1]-math.pi/2
+        lon2 = cmath.polar(complex(x2, z))[1]-math.pi/2
+        lat2 = cmath.polar(complex(y2, z))[1]-math.pi/2
+    else:
+        lon1, lat1, lon2, lat2 = math.radians(x1), math.radians(y1), math.radians(x2), math.radians(y2)
+
+    v1 = (math.cos(lat1)*math.cos(lon1), math.cos(lat1)*math.sin(lon1), math.sin(lat1))
+    v2 = (math.cos(lat2)*math.cos(lon2), math.cos(lat2)*math.sin(lon2), math.sin(lat2))
+    dot = sum(a*b for a, b in zip(v1, v2))
+    cross = math.sqrt((v1[1]*v2[2] - v1[2]*v2[1])**2 + (v1[2]*v2[0] - v1[0]*v2[2])**2 + (v1[0]*v2[1] - v1[1]*v2[0])**2)
+    return math.degrees(math.atan2(cross, dot))
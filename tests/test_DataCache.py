@@ -0,0 +1,115 @@
+import unittest
+from unittest import mock
+import os, sys, time, shutil, tempfile
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from parsers.DataCache import DataCache
+from parsers.DataReader import DataReader
+from utils import Utils
+from fixtures import writeSMIFile
+
+
+
+
+class Main():
+    """Bare main object, collecting console output."""
+    def __init__(self):
+        self.lines = []
+        self.dataCache = DataCache(self)
+
+    def printToOut(self, text:str, status:str = '') -> None:
+        self.lines.append(text)
+
+    def printError(self) -> None:
+        self.lines.append('{0}: {1}.'.format(sys.exc_info()[0].__name__, sys.exc_info()[1]))
+
+
+
+
+class test_DataCache(unittest.TestCase):
+    def setUp(self):
+        self.dataDir = tempfile.mkdtemp()
+        self.main = Main()
+        self.cache = self.main.dataCache
+        self.cache.configure(cacheDir='{0}/.cache'.format(self.dataDir))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dataDir, ignore_errors=True)
+
+
+    def getNodes(self, seed:int, length:int=1000) -> dict:
+        rng = np.random.default_rng(seed)
+        samples = DataFrame({'Time': np.arange(length) / 500, 'Type': 'SMP', 'R POR X [px]': rng.normal(800, 50, length)},
+                            index=np.arange(length) * 2 + 1)
+        return {'samples': samples, 'messages': DataFrame({'Time': [0.0, 1.0], 'Text': ['# Message: FixPoint_1.avi', '# Message: trial.avi']})}
+
+
+    def test_roundTrip(self):
+        nodes = self.getNodes(2)
+        self.cache.store('abc', nodes, {'availColumns': ['Time', 'R POR X [px]'], 'maxTime': 1.998})
+        loaded = self.cache.load('abc')
+        self.assertEqual(loaded['meta'], {'availColumns': ['Time', 'R POR X [px]'], 'maxTime': 1.998})
+        for channel, data in nodes.items():
+            #index is kept as well
+            pd.testing.assert_frame_equal(loaded['nodes'][channel], data)
+        self.assertIsNone(self.cache.load('other'))
+
+
+    def test_staleVersionIsMiss(self):
+        self.cache.store('abc', self.getNodes(2), {})
+        with mock.patch.object(DataCache, 'VERSION', DataCache.VERSION + 1):
+            self.assertIsNone(self.cache.load('abc'))
+
+
+    def test_disabled(self):
+        self.cache.configure(cacheDir=self.cache.cacheDir, enabled=False)
+        self.cache.store('abc', self.getNodes(2), {})
+        self.assertFalse(os.path.exists(self.cache.getEntryDir('abc')))
+        self.assertIsNone(self.cache.load('abc'))
+
+
+    def test_evictsLeastRecentlyUsed(self):
+        self.cache.store('first', self.getNodes(1, 20000), {})
+        entrySize = self.cache.getSize(self.cache.getEntryDir('first'))
+        #room for two entries only
+        self.cache.configure(cacheDir=self.cache.cacheDir, maxSizeMb=2.5 * entrySize / 1024 / 1024)
+        past = time.time() - 100
+        os.utime('{0}/{1}'.format(self.cache.getEntryDir('first'), DataCache.ENTRY_FILE), (past, past))
+        self.cache.store('second', self.getNodes(2, 20000), {})
+        os.utime('{0}/{1}'.format(self.cache.getEntryDir('second'), DataCache.ENTRY_FILE), (past + 10, past + 10))
+        #loading makes first entry the most recently used one
+        self.assertIsNotNone(self.cache.load('first'))
+        self.cache.store('third', self.getNodes(3, 20000), {})
+
+        self.assertIsNotNone(self.cache.load('first'))
+        self.assertIsNone(self.cache.load('second'))
+        self.assertIsNotNone(self.cache.load('third'))
+        self.assertIn('Cache entry second evicted.', self.main.lines)
+
+
+    def test_missAfterSourceChanges(self):
+        filePath = '{0}/rec.txt'.format(self.dataDir)
+        writeSMIFile(filePath, seed=1)
+        reader = DataReader(self.main, workers=1)
+        parsed = reader.loadFile('samples', filePath, Utils.md5(filePath))
+        self.assertIn('Parsing .txt file.', self.main.lines)
+
+        self.main.lines = []
+        cached = reader.loadFile('samples', filePath, Utils.md5(filePath))
+        self.assertEqual(self.main.lines, ['Parsed data loaded from cache.'])
+        pd.testing.assert_frame_equal(cached['nodes']['samples'], parsed['nodes']['samples'])
+
+        writeSMIFile(filePath, seed=2)
+        self.main.lines = []
+        changed = reader.loadFile('samples', filePath, Utils.md5(filePath))
+        self.assertEqual(self.main.lines, ['Parsing .txt file.'])
+        self.assertFalse(changed['nodes']['samples']['R POR X [px]'].equals(parsed['nodes']['samples']['R POR X [px]']))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
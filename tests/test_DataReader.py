@@ -0,0 +1,160 @@
+import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+import os, re, sys, shutil, tempfile
+
+import numpy as np
+import pandas as pd
+
+from parsers.DataReader import DataReader
+from parsers.DataCache import DataCache
+from parsers.MultiData import MultiData
+from utils.SettingsReader import SettingsReader
+from utils.FingerprintStore import FingerprintStore
+from fixtures import writeSMIFile
+
+
+
+
+class Main():
+    """Bare main object, collecting console output."""
+    def __init__(self):
+        self.lines = []
+        self.SAMPLES_COMPONENTS_LIST = ['fixation', 'saccade', 'pursuit',    'messages', 'sweep']
+        self.GAZE_COMPONENTS_LIST = ['fixations','saccades',    'eyesNotFounds','unclassifieds',      "imu", "gyro","accel"]
+        self.settingsReader = SettingsReader(self)
+        self.dataCache = DataCache(self)
+        self.fingerprintStore = FingerprintStore(self)
+
+    def printToOut(self, text:str, status:str = '') -> None:
+        self.lines.append(text)
+
+    def printError(self) -> None:
+        self.lines.append('{0}: {1}.'.format(sys.exc_info()[0].__name__, sys.exc_info()[1]))
+
+
+
+
+def referenceTobiiTSV(filePath:str) -> tuple:
+    """Tobii .tsv gaze data the way readTobiiGaze originally read it: header read first, then whole file, then rows masked."""
+    headers = pd.read_table(filePath, nrows=1, encoding='UTF-16')
+    availColumns = [i for i in list(headers.columns) if re.match('Recording timestamp|Gaze point|Gaze 3D position|Gaze direction|Pupil diameter|Eye movement type|Gaze event duration|Fixation point|Gyro|Accelerometer',i)]
+
+    gazeData = pd.read_table(filePath, decimal=",", encoding='UTF-16', usecols=availColumns)
+    gazeData['Recording timestamp'] /= 1000
+    gazeData.drop(['Gyro X', 'Gyro Y', 'Gyro Z', 'Accelerometer X', 'Accelerometer Y', 'Accelerometer Z'], axis=1, inplace=True)
+    gazeData = gazeData[(gazeData['Gaze point X'].notnull()) & (gazeData['Gaze point Y'].notnull()) | \
+                        (gazeData['Eye movement type'] == 'EyesNotFound')]
+    gazeData.drop(['Eye movement type', 'Gaze event duration', 'Eye movement type index',
+                   'Fixation point X', 'Fixation point Y'],
+                   axis=1, inplace=True)
+    return (availColumns, gazeData)
+
+
+
+
+class test_DataReader(unittest.TestCase):
+    COLUMNS = ['Recording timestamp', 'Participant name', 'Sensor', 'Gaze point X', 'Gaze point Y', 'Gaze direction left X', 'Pupil diameter left',
+               'Eye movement type', 'Gaze event duration', 'Eye movement type index', 'Fixation point X', 'Fixation point Y',
+               'Gyro X', 'Gyro Y', 'Gyro Z', 'Accelerometer X', 'Accelerometer Y', 'Accelerometer Z']
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        lines = ['\t'.join(self.COLUMNS)]
+        for ts in range(0, 20000, 10):
+            kind = rng.random()
+            if kind < 0.3:
+                row = [str(ts), 'Иван', 'Gyroscope'] + [''] * 9 + ['{0:.3f}'.format(i).replace('.', ',') for i in rng.random(3)] + [''] * 3
+            elif kind < 0.45:
+                row = [str(ts), 'Иван', 'Accelerometer'] + [''] * 12 + ['{0:.3f}'.format(i).replace('.', ',') for i in rng.random(3)]
+            elif kind < 0.5:
+                row = [str(ts), 'Иван', 'Eye Tracker', '', '', '', '', 'EyesNotFound', '40', '3', '', ''] + [''] * 6
+            else:
+                row = [str(ts), 'Иван', 'Eye Tracker', str(rng.integers(0, 1920)), str(rng.integers(0, 1080)), '0,1', '3,2',
+                       'Fixation', '200', '1', '100', '200'] + [''] * 6
+            lines.append('\t'.join(row))
+        fd, self.filePath = tempfile.mkstemp(suffix='.tsv')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(('\r\n'.join(lines) + '\r\n').encode('UTF-16'))
+
+
+    def tearDown(self):
+        os.remove(self.filePath)
+
+
+    def test_tobiiTSVEqualsReference(self):
+        availColumns, gazeData = referenceTobiiTSV(self.filePath)
+        allData = pd.read_table(self.filePath, decimal=",", encoding='UTF-16')
+        imuColumns = ['Gyro X', 'Gyro Y', 'Gyro Z', 'Accelerometer X', 'Accelerometer Y', 'Accelerometer Z']
+        #odd block sizes split UTF-16 code units and lines across blocks
+        for blockSize in [7, 4096, 1<<22]:
+            parsed = DataReader(Main()).parseTobiiTSV(self.filePath, blockSize=blockSize)
+            self.assertEqual(parsed[0], availColumns)
+            pd.testing.assert_frame_equal(parsed[1], gazeData)
+            self.assertEqual(list(parsed[2].columns), ['Recording timestamp'] + imuColumns)
+            np.testing.assert_array_equal(parsed[2].index, np.flatnonzero(allData['Sensor'].isin(['Gyroscope', 'Accelerometer'])))
+
+
+
+
+
+class test_DataReaderJobs(unittest.TestCase):
+    def setUp(self):
+        self.dataDir = tempfile.mkdtemp()
+        files = ['<file id="0{0}" type="samples" path="rec{0}.txt"/>'.format(index) for index in range(1, 4)]
+        for index in range(1, 4):
+            writeSMIFile('{0}/rec{1}.txt'.format(self.dataDir, index), seed=index, length=1000 * index)
+        #missing file is reported in settings order too
+        files.insert(1, '<file id="09" type="samples" path="missing.txt"/>')
+        self.writeSettings('settings.xml', files)
+        self.writeSettings('single.xml', files[:1])
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dataDir, ignore_errors=True)
+
+
+    def writeSettings(self, name:str, files:list) -> None:
+        with open('{0}/{1}'.format(self.dataDir, name), 'w', encoding='UTF-8') as f:
+            f.write('<?xml version="1.0"?>\n<settings>\n{0}\n<interval id="" path="FixPoint_" duration="1.0"/>\n</settings>\n'.format('\n'.join(files)))
+
+
+    def read(self, workers:int, settings:str='settings.xml') -> tuple:
+        main = Main()
+        main.dataCache.configure(enabled=False)
+        main.settingsReader.select('{0}/{1}'.format(self.dataDir, settings))
+        multiData = MultiData(main)
+        DataReader(main, workers=workers).read(main.settingsReader, multiData)
+        return (main, multiData)
+
+
+    def test_messagesReplayedInSettingsOrder(self):
+        main1, multiData1 = self.read(workers=1)
+        main2, multiData2 = self.read(workers=2)
+        self.assertEqual(main2.lines, main1.lines)
+        reading = [line for line in main1.lines if line.startswith('Reading samples (')]
+        self.assertEqual(reading, ['Reading samples (rec{0}.txt)...'.format(index) for index in range(1, 4)])
+        self.assertEqual([line for line in main1.lines if 'missing.txt' in line], ['WARNING: File specified in settings (missing.txt) does not exist!'])
+
+        for id in ['01', '02', '03']:
+            pd.testing.assert_frame_equal(multiData2.multiData['samples'][id], multiData1.multiData['samples'][id])
+            self.assertEqual(main2.settingsReader.getTypeById('samples', id).get('md5'), main1.settingsReader.getTypeById('samples', id).get('md5'))
+
+
+    def test_poolSizedByFiles(self):
+        with mock.patch('parsers.DataReader.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            #single file is read right here, without a pool
+            main, multiData = self.read(workers=None, settings='single.xml')
+            pool.assert_not_called()
+            self.assertIn('01', multiData.multiData['samples'])
+        with mock.patch('parsers.DataReader.os.cpu_count', return_value=8), mock.patch('parsers.DataReader.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            self.read(workers=None)
+            pool.assert_called_once_with(max_workers=3)
+        with mock.patch('parsers.DataReader.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            self.read(workers=1)
+            pool.assert_not_called()
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+import numpy as np
+from pandas import DataFrame
+
+from algo.EventFilter import EventFilter
+from algo.IVTFilter import IVTFilter
+
+
+
+
+class test_EventFilter(unittest.TestCase):
+    def runFilter(self, velocity:list, min_static:float=0.010, min_motion:float=0) -> IVTFilter:
+        filter = IVTFilter()
+        filter.runJob(DataFrame({'Time': np.arange(len(velocity)) / 1000, 'Velocity': np.array(velocity, dtype=float)}), 150, 15, min_static, min_motion)
+        return filter
+
+
+    def test_traverseOffsets(self):
+        data = np.array([5, 20, 200, 20, 5, 200, 5, 20, 200, 200])
+        offsets = EventFilter().traverseOffsets(data, sindex=np.array([2, 5, 8]), eindex=np.array([2, 5, 9]), thres=15)
+        np.testing.assert_array_equal(offsets[0], [0, 4, 6])
+        #last event has no sample at noise level after it, extended to the end of data
+        np.testing.assert_array_equal(offsets[1], [4, 6, 9])
+
+
+    def test_traverseOffsetsWithoutNoiseLevel(self):
+        offsets = EventFilter().traverseOffsets(np.array([200, 300, 200]), sindex=np.array([1]), eindex=np.array([1]), thres=15)
+        np.testing.assert_array_equal(offsets[0], [0])
+        np.testing.assert_array_equal(offsets[1], [2])
+
+
+    def test_getFirstIndices(self):
+        time = np.array([0.0, 0.1, 0.3, 0.3, 0.3, 0.4])
+        np.testing.assert_array_equal(EventFilter().getFirstIndices(time, np.array([0.3, 0.0, 0.4])), [2, 0, 5])
+
+
+    def test_saccadeAtTheEnd(self):
+        saccades = self.runFilter([5] * 20 + [20, 200, 200]).getResultFiltered('saccade')
+        self.assertEqual(len(saccades), 1)
+        self.assertEqual(saccades['min'].iloc[0], 0.019)
+        self.assertEqual(saccades['max'].iloc[0], 0.022)
+
+
+    def test_backToBackSaccades(self):
+        velocity = [5] * 20 + [200] * 3 + [10] + [200] * 3 + [5] * 20
+        #single sample between saccades is a fixation too short to stand alone, saccades blend into one
+        saccades = self.runFilter(velocity).getResultFiltered('saccade')
+        self.assertEqual(len(saccades), 1)
+        self.assertEqual((saccades['min'].iloc[0], saccades['max'].iloc[0]), (0.019, 0.027))
+
+        #long enough to stand alone, both saccades are extended to the sample between them
+        saccades = self.runFilter(velocity, min_static=0).getResultFiltered('saccade')
+        self.assertEqual(len(saccades), 2)
+        np.testing.assert_array_equal(saccades['min'].values, [0.019, 0.023])
+        np.testing.assert_array_equal(saccades['max'].values, [0.023, 0.027])
+
+
+    def test_shortFixation(self):
+        velocity = [5] * 20 + [200] * 3 + [5] * 5 + [200] * 3 + [5] * 20
+        filter = self.runFilter(velocity)
+        fixations = filter.getResultFiltered('fixation')
+        saccades = filter.getResultFiltered('saccade')
+        #fixation shorter than min_static is blended into the saccades around it
+        self.assertEqual(len(fixations), 2)
+        self.assertEqual(len(saccades), 1)
+        self.assertEqual(saccades['count'].iloc[0], 11)
+        self.assertEqual((saccades['min'].iloc[0], saccades['max'].iloc[0]), (0.019, 0.031))
+
+        #events shorter than min_motion are omitted
+        filter = self.runFilter(velocity, min_static=0, min_motion=0.006)
+        self.assertEqual(len(filter.getResultFiltered('fixation')), 2)
+        self.assertEqual(len(filter.getResultFiltered('saccade')), 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+import os, sys, time, shutil, tempfile
+
+from parsers.DataCache import DataCache
+from utils.FingerprintStore import FingerprintStore
+from utils import Utils
+
+
+
+
+class Main():
+    """Bare main object, collecting console output."""
+    def __init__(self):
+        self.lines = []
+        self.dataCache = DataCache(self)
+
+    def printToOut(self, text:str, status:str = '') -> None:
+        self.lines.append(text)
+
+    def printError(self) -> None:
+        self.lines.append('{0}: {1}.'.format(sys.exc_info()[0].__name__, sys.exc_info()[1]))
+
+
+
+
+class test_FingerprintStore(unittest.TestCase):
+    def setUp(self):
+        self.dataDir = tempfile.mkdtemp()
+        self.main = Main()
+        self.main.dataCache.configure(cacheDir='{0}/.cache'.format(self.dataDir))
+        self.filePath = '{0}/rec.txt'.format(self.dataDir)
+        self.write('first content')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dataDir, ignore_errors=True)
+
+
+    def write(self, text:str, age:float=None) -> None:
+        """Writes the data file, setting its mtime age seconds back if given."""
+        with open(self.filePath, 'w') as f:
+            f.write(text)
+        if age is not None:
+            past = time.time() - age
+            os.utime(self.filePath, (past, past))
+
+
+    def md5(self, store:FingerprintStore) -> tuple:
+        """Returns checksum given by store and whether it was computed."""
+        with mock.patch('utils.FingerprintStore.Utils.md5', wraps=Utils.md5) as md5:
+            value = store.md5(self.filePath)
+            return (value, md5.called)
+
+
+    def test_racyEntryIsRehashed(self):
+        #just written file may change again within same mtime tick
+        store = FingerprintStore(self.main)
+        self.assertEqual(self.md5(store), (Utils.md5(self.filePath), True))
+        self.assertEqual(store.entries, {})
+        self.assertEqual(self.md5(store), (Utils.md5(self.filePath), True))
+
+        #same size and mtime, yet other content
+        stat = os.stat(self.filePath)
+        self.write('other content')
+        os.utime(self.filePath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.md5(store), (Utils.md5(self.filePath), True))
+
+
+    def test_oldEntryIsReused(self):
+        self.write('first content', age=60)
+        store = FingerprintStore(self.main)
+        self.assertEqual(self.md5(store), (Utils.md5(self.filePath), True))
+        self.assertEqual(self.md5(store), (Utils.md5(self.filePath), False))
+        #remembered across runs
+        self.assertEqual(self.md5(FingerprintStore(self.main)), (Utils.md5(self.filePath), False))
+
+
+    def test_changedFileIsRehashed(self):
+        self.write('first content', age=60)
+        store = FingerprintStore(self.main)
+        first = self.md5(store)[0]
+        #size changes
+        self.write('first content, longer', age=60)
+        self.assertEqual(self.md5(store), (Utils.md5(self.filePath), True))
+        self.assertNotEqual(Utils.md5(self.filePath), first)
+        #mtime changes only
+        self.write('first content, longer', age=30)
+        self.assertEqual(self.md5(store), (Utils.md5(self.filePath), True))
+        self.assertEqual(self.md5(store), (Utils.md5(self.filePath), False))
+
+
+    def test_disabledCacheKeepsMemoryOnly(self):
+        self.main.dataCache.configure(cacheDir=self.main.dataCache.cacheDir, enabled=False)
+        self.write('first content', age=60)
+        store = FingerprintStore(self.main)
+        self.md5(store)
+        self.assertEqual(self.md5(store)[1], False)
+        self.assertFalse(os.path.exists('{0}/{1}'.format(self.main.dataCache.cacheDir, FingerprintStore.STORE_FILE)))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+from unittest import mock
+from collections import deque
+
+import numpy as np
+from pandas import DataFrame
+
+import algo.IBDT
+from algo.IBDT import IBDT, CLASSIFICATION
+from algo.GazeData import MOVEMENT
+
+
+
+
+class StubEM():
+    """Deterministic stand-in for cv2.ml.EM, with fixed clusters: saccades first, so that cluster order gets swapped."""
+    MEANS = np.array([[150.0], [10.0]])
+
+    def setClustersNumber(self, number:int) -> None:
+        pass
+
+    def setCovarianceMatrixType(self, type:int) -> None:
+        pass
+
+    def setTermCriteria(self, criteria:tuple) -> None:
+        pass
+
+    def trainEM(self, samples:np.ndarray) -> None:
+        self.samples = samples
+
+    def getMeans(self) -> np.ndarray:
+        return self.MEANS
+
+    def predict(self, samples:np.ndarray) -> tuple:
+        v = np.asarray(samples, dtype=float).reshape(-1)
+        saccade = 1 / (1 + np.exp(-(v - 80) / 15))
+        return (0.0, np.column_stack((saccade, 1 - saccade)))
+
+
+
+
+def referenceClassify(ts, confidence, x, y, model, maxSaccadeDurationMs, minSampleConfidence):
+    """Sample by sample classification, with a window deque, as IBDT.addPoint originally did; returns posteriors and classes."""
+    fMean, sMean = model.MEANS[1], model.MEANS[0]
+    fIdx, sIdx = 1, 0
+    length = len(ts)
+    v = np.full(length, np.nan)
+    pursuitLikelihood = np.zeros(length)
+    posteriors = np.zeros((length, 3))
+    classification = np.full(length, MOVEMENT['UNDEF'])
+
+    window = deque()
+    prev = None
+    for i in range(length):
+        if confidence[i] < minSampleConfidence:
+            continue
+        window.append(i)
+        while ts[i] - ts[window[0]] > 2*maxSaccadeDurationMs:
+            window.popleft()
+        px, py, pts = (x[prev], y[prev], ts[prev]) if prev is not None else (0.0, 0.0, 0.0)
+        prev = i
+        v[i] = np.sqrt((x[i] - px) ** 2 + (y[i] - py) ** 2) / (ts[i] - pts)
+
+        with np.errstate(invalid='ignore'):
+            pursuitPrior = np.mean([pursuitLikelihood[j] for j in list(window)[:-1]]) if len(window) > 1 else np.nan
+        if len(window) > 1:
+            pursuitLikelihood[i] = sum(1 for j in list(window)[1:] if fMean < v[j] < sMean) / (len(window) - 1)
+
+        if v[i] < fMean:
+            fixation, saccade = 1, 0
+        elif v[i] > sMean:
+            fixation, saccade = 0, 1
+        else:
+            likelihoods = model.predict(np.array(v[i]))[1][0]
+            fixation, saccade = likelihoods[fIdx], likelihoods[sIdx]
+
+        posteriors[i, MOVEMENT['PURSUIT']] = pursuitPrior * pursuitLikelihood[i]
+        posteriors[i, MOVEMENT['FIXATION']] = (1 - pursuitPrior) * fixation
+        posteriors[i, MOVEMENT['SACCADE']] = (1 - pursuitPrior) * saccade
+
+        classification[i] = MOVEMENT['FIXATION']
+        maxPosterior = posteriors[i, MOVEMENT['FIXATION']]
+        if posteriors[i, MOVEMENT['SACCADE']] > maxPosterior:
+            classification[i] = MOVEMENT['SACCADE']
+            maxPosterior = posteriors[i, MOVEMENT['SACCADE']]
+        if posteriors[i, MOVEMENT['PURSUIT']] > maxPosterior:
+            classification[i] = MOVEMENT['PURSUIT']
+        if v[i] > sMean:
+            classification[i] = MOVEMENT['SACCADE']
+
+    return (posteriors, classification)
+
+
+
+
+class test_IBDT(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(25)
+        length = 4000
+        #fixations with jitter, pursuits at about 40 px/ms and jumps, 2 ms apart
+        step = np.where(rng.random(length) < 0.02, rng.uniform(400, 800, length) * rng.choice([-1, 1], length), rng.normal(0, 1, length))
+        drift = np.repeat(rng.choice([0, 80], length // 100), 100)
+        self.data = DataFrame({'Time': 1000 + np.arange(length) * 2.0,
+                               'confidence': np.where(rng.random(length) < 0.03, 0.0, 1.0),
+                               'x': 500 + np.cumsum(step + drift),
+                               'y': 400 + np.cumsum(rng.normal(0, 0.02, length))})
+        self.patcher = mock.patch.object(algo.IBDT.cv2, 'ml', mock.Mock(EM_create=StubEM, EM_COV_MAT_GENERIC=1), create=True)
+        self.patcher.start()
+
+
+    def tearDown(self):
+        self.patcher.stop()
+
+
+    def test_ternaryEqualsReference(self):
+        samples = IBDT().runJob(self.data, 80, 0.5, CLASSIFICATION['TERNARY'])
+        posteriors, classification = referenceClassify(*[self.data[column].values for column in self.data.columns], StubEM(), 80, 0.5)
+
+        np.testing.assert_array_equal(samples.classification, classification)
+        np.testing.assert_allclose(samples.posteriors, posteriors, rtol=1e-9, atol=1e-12)
+        self.assertGreater(np.count_nonzero(classification == MOVEMENT['PURSUIT']), 0)
+        self.assertGreater(np.count_nonzero(classification == MOVEMENT['SACCADE']), 0)
+
+        #views read the same arrays
+        self.assertEqual(samples[10].base.classification, classification[10])
+        self.assertEqual(samples[10].pursuit.posterior, samples.posteriors[10, MOVEMENT['PURSUIT']])
+
+
+    def test_binaryClassification(self):
+        filter = IBDT()
+        samples = filter.runJob(self.data, 80, 0.5, CLASSIFICATION['BINARY'])
+        confident = self.data['confidence'].values >= 0.5
+        likelihoods = samples.likelihoods[confident]
+
+        np.testing.assert_array_equal(samples.classification[~confident], MOVEMENT['UNDEF'])
+        np.testing.assert_array_equal(samples.classification[confident],
+                                      np.where(likelihoods[:, MOVEMENT['FIXATION']] > likelihoods[:, MOVEMENT['SACCADE']], MOVEMENT['FIXATION'], MOVEMENT['SACCADE']))
+        fixations, saccades, pursuits = filter.getResultFiltered()
+        self.assertGreater(len(fixations), 0)
+        self.assertGreater(len(saccades), 0)
+        self.assertEqual(len(pursuits), 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
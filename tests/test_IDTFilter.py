@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+from pandas import DataFrame
+
+from algo.IDTFilter import IDTFilter
+from fixtures import getGazeTrace, referenceEvents, referenceFixations
+
+
+
+
+class test_IDTFilter(unittest.TestCase):
+    PARAMS = (1.0, 0.100, 0)
+
+    def getReferenceStates(self, data:DataFrame, maxDispersion:float, minDuration:float) -> np.ndarray:
+        x, y = data['X'].values, data['Y'].values
+        valid = ~(np.isnan(x) | np.isnan(y))
+        states = np.where(valid, IDTFilter.SACCADE, IDTFilter.NOT_FOUND)
+        states[referenceFixations(data['Time'].values, x, y, valid, maxDispersion, minDuration)] = IDTFilter.FIXATION
+        return states
+
+
+    def test_statesEqualNaiveWindows(self):
+        for seed in range(5):
+            data = getGazeTrace(seed)
+            for maxDispersion, minDuration in [(1.0, 0.100), (0.5, 0.050), (3.0, 0.200)]:
+                filter = IDTFilter()
+                filter.runJob(data, maxDispersion, minDuration, 0)
+                states = self.getReferenceStates(data, maxDispersion, minDuration)
+                np.testing.assert_array_equal(filter.getResultFrame()['State'].values, states)
+                self.assertGreater(np.count_nonzero(states == IDTFilter.FIXATION), 0)
+
+
+    def test_eventsEqualReference(self):
+        data = getGazeTrace(7)
+        filter = IDTFilter()
+        filter.runJob(data, 1.0, 0.100, 0.020)
+        states = self.getReferenceStates(data, 1.0, 0.100)
+        for name, state in IDTFilter.STATES.items():
+            expected = referenceEvents(data['Time'].values, states, data['Velocity'].values, state, minMotion=0.020)
+            events = filter.getResultFiltered(name)
+            if not len(expected):
+                self.assertEqual(len(events), 0)
+                continue
+            self.assertEqual(list(events.index), list(expected.index))
+            np.testing.assert_allclose(events[expected.columns].values, expected.values, rtol=1e-9)
+
+
+    def test_windowDoesNotSpanLostGaze(self):
+        time = np.arange(100) / 500
+        x = np.zeros(100)
+        x[40:45] = np.nan
+        filter = IDTFilter()
+        filter.runJob(DataFrame({'Time': time, 'X': x, 'Y': np.zeros(100)}), 1.0, 0.100, 0)
+        #first stretch is too short for a fixation of its own
+        np.testing.assert_array_equal(filter.getResultFrame()['State'].values, [1] * 40 + [3] * 5 + [0] * 55)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from algo.IVDTFilter import IVDTFilter
+from algo.IVTFilter import IVTFilter
+from fixtures import getGazeTrace, referenceEvents, referenceFixations
+
+
+
+
+class test_IVDTFilter(unittest.TestCase):
+    PARAMS = {'min_velocity': 100, 'max_dispersion': 1.0, 'min_duration': 0.100, 'noise_level': 20, 'min_motion': 0}
+
+    def test_statesEqualReference(self):
+        for seed in range(3):
+            data = getGazeTrace(seed)
+            filter = IVDTFilter()
+            filter.runJob(data, **self.PARAMS)
+
+            time, x, y, velocity = [data[column].values for column in ['Time', 'X', 'Y', 'Velocity']]
+            valid = ~(np.isnan(x) | np.isnan(y) | np.isnan(velocity))
+            saccade = valid & (velocity >= 100)
+            states = np.where(valid, IVDTFilter.SMOOTH_PURSUIT, IVDTFilter.NOT_FOUND)
+            states[saccade] = IVDTFilter.SACCADE
+            states[referenceFixations(time, x, y, valid & ~saccade, 1.0, 0.100)] = IVDTFilter.FIXATION
+            np.testing.assert_array_equal(filter.getResultFrame()['State'].values, states)
+
+            for name, state in IVDTFilter.STATES.items():
+                noiseLevel = 20 if state == IVDTFilter.SACCADE else None
+                expected = referenceEvents(time, states, velocity, state, noiseLevel=noiseLevel)
+                events = filter.getResultFiltered(name)
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(list(events.index), list(expected.index))
+                np.testing.assert_allclose(events[expected.columns].values, expected.values, rtol=1e-9)
+
+
+    def test_saccadesEqualIVT(self):
+        for seed in range(3):
+            data = getGazeTrace(seed)
+            filter = IVDTFilter()
+            filter.runJob(data, **self.PARAMS)
+            #without min_static, I-VT does not blend saccades, its saccades are samples above velocity threshold as well
+            ivt = IVTFilter()
+            ivt.runJob(data[['Time', 'Velocity']], 100, 20, 0, 0)
+
+            saccades = filter.getResultFrame()['State'].values == IVDTFilter.SACCADE
+            np.testing.assert_array_equal(saccades, ivt.getResultFrame()['State'].values == IVTFilter.SACCADE)
+
+
+    def test_saccadeEventsEqualIVT(self):
+        #I-VT numbers saccades after preceding fixation, so saccades on both sides of lost gaze are one event there
+        for seed in range(3):
+            data = getGazeTrace(seed, lost=0)
+            filter = IVDTFilter()
+            filter.runJob(data, **self.PARAMS)
+            ivt = IVTFilter()
+            ivt.runJob(data[['Time', 'Velocity']], 100, 20, 0, 0)
+
+            columns = ['count', 'min', 'max', 'mean', 'dur']
+            self.assertGreater(len(ivt.getResultFiltered('saccade')), 0)
+            np.testing.assert_allclose(filter.getResultFiltered('saccade')[columns].values, ivt.getResultFiltered('saccade')[columns].values, rtol=1e-9)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+
+import numpy as np
+from pandas import DataFrame
+
+from algo.IVTFilter import IVTFilter
+
+
+
+
+def referenceProcess(time:np.ndarray, theta:np.ndarray, thresh:float, minTime:float) -> list:
+    """Per-sample loop I-VT process was originally written as, one (time, state, value, ordinal) tuple per sample."""
+    result = [None] * len(time)
+    lastState = None
+    fixationStart = 0
+    ordinal = 0
+    for index in range(len(time)):
+        value = abs(theta[index])
+        if value < thresh:
+            state = IVTFilter.FIXATION
+            if lastState != state:
+                ordinal = ordinal + 1
+                fixationStart = index
+        else:
+            if lastState == IVTFilter.FIXATION and time[index] - time[fixationStart] < minTime:
+                ordinal = ordinal - 1
+                for i in range(fixationStart, index):
+                    result[i] = (time[index], IVTFilter.SACCADE, value, ordinal)
+            state = IVTFilter.SACCADE
+        lastState = state
+        result[index] = (time[index], state, value, ordinal)
+    return result
+
+
+def referenceOffsets(result:list, thres:float) -> dict:
+    """Saccade borders extended step by step to the nearest samples at noise level, by ordinal."""
+    times = [row[0] for row in result]
+    values = [row[2] for row in result]
+    borders = {}
+    for ordinal in sorted(set(row[3] for row in result if row[1] == IVTFilter.SACCADE)):
+        saccade = [row[0] for row in result if row[1] == IVTFilter.SACCADE and row[3] == ordinal]
+        sindex = times.index(min(saccade))
+        eindex = times.index(max(saccade))
+        start = next((i for i in range(sindex - 1, -1, -1) if values[i] <= thres), 0)
+        end = next((i for i in range(eindex, len(values)) if values[i] <= thres), len(values) - 1)
+        borders[ordinal] = (times[start], times[end])
+    return borders
+
+
+
+
+class test_IVTFilter(unittest.TestCase):
+    def getVelocity(self, rng:object, length:int) -> np.ndarray:
+        velocity = rng.normal(10, 8, length)
+        index = 0
+        while index < length:
+            index = index + rng.integers(5, 200)
+            burst = rng.integers(1, 20)
+            velocity[index:index + burst] = rng.uniform(150, 400, len(velocity[index:index + burst])) * rng.choice([-1, 1])
+            index = index + burst
+        return velocity
+
+
+    def test_statesEqualReferenceLoop(self):
+        rng = np.random.default_rng(20)
+        for trial in range(30):
+            time = np.arange(3000) / 500
+            velocity = self.getVelocity(rng, len(time))
+            filter = IVTFilter()
+            filter.runJob(DataFrame({'Time': time, 'Velocity': velocity}), 150, 15, 0.100, 0)
+
+            reference = referenceProcess(time, velocity, 150, 0.100)
+            result = filter.getResultFrame()
+            np.testing.assert_array_equal(result['State'].values, [row[1] for row in reference])
+            np.testing.assert_array_equal(result['Ordinal'].values, [row[3] for row in reference])
+            np.testing.assert_array_equal(result['Time'].values, [row[0] for row in reference])
+            np.testing.assert_array_equal(result['Value'].values, [row[2] for row in reference])
+
+
+    def test_saccadeOffsetsEqualReferenceLoop(self):
+        rng = np.random.default_rng(21)
+        for trial in range(30):
+            time = np.arange(2000) / 500
+            velocity = self.getVelocity(rng, len(time))
+            filter = IVTFilter()
+            filter.runJob(DataFrame({'Time': time, 'Velocity': velocity}), 150, 15, 0.100, 0)
+
+            saccades = filter.getResultFiltered('saccade')
+            borders = referenceOffsets(referenceProcess(time, velocity, 150, 0.100), 15)
+            self.assertEqual(list(saccades.index), list(borders.keys()))
+            np.testing.assert_array_equal(saccades['min'].values, [border[0] for border in borders.values()])
+            np.testing.assert_array_equal(saccades['max'].values, [border[1] for border in borders.values()])
+
+
+    def test_missingVelocityIsNotFound(self):
+        time = np.arange(10) / 500
+        velocity = np.array([5, 5, np.nan, np.nan, 5, 200, 200, 5, 5, 5], dtype=float)
+        filter = IVTFilter()
+        filter.runJob(DataFrame({'Time': time, 'Velocity': velocity}), 150, 15, 0, 0)
+        np.testing.assert_array_equal(filter.getResultFrame()['State'].values, [0, 0, 3, 3, 0, 1, 1, 0, 0, 0])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
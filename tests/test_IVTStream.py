@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+from pandas import DataFrame, concat
+
+from algo.IVTFilter import IVTFilter
+from algo.IVTStream import IVTStream
+
+
+
+
+class test_IVTStream(unittest.TestCase):
+    PARAMS = (150, 15, 0.250, 0.035)
+    COLUMNS = ['count', 'min', 'max', 'mean', 'dur']
+
+    def getData(self) -> DataFrame:
+        rng = np.random.default_rng(0)
+        velocity = np.abs(rng.normal(8, 6, 60000))
+        index = 0
+        while index < len(velocity):
+            index = index + rng.integers(50, 400)
+            length = rng.integers(1, 30)
+            velocity[index:index + length] = rng.uniform(160, 400, len(velocity[index:index + length]))
+            index = index + length
+        #one fixation and one tracking loss, both spanning many chunks
+        velocity[10000:30000] = np.abs(rng.normal(8, 6, 20000))
+        velocity[30000:30020] = 300
+        velocity[30020:45000] = np.nan
+        return DataFrame({'Time': np.arange(len(velocity)) / 500, 'RVelocitySmoothed': velocity})
+
+
+    def test_streamEqualsBatchWithBoundedPending(self):
+        data = self.getData()
+        filter = IVTFilter()
+        filter.runJob(data, *self.PARAMS)
+
+        stream = IVTStream(*self.PARAMS, maxPending=3000)
+        fixations, saccades, pending = [], [], []
+        for start in range(0, len(data), 1000):
+            events = stream.feed(data.iloc[start:start + 1000])
+            fixations.append(events[0])
+            saccades.append(events[1])
+            pending.append(len(stream.pending))
+        events = stream.flush()
+        fixations.append(events[0])
+        saccades.append(events[1])
+
+        for expected, streamed in [(filter.getResultFiltered('fixation'), fixations), (filter.getResultFiltered('saccade'), saccades)]:
+            streamed = concat([events for events in streamed if len(events)])
+            self.assertEqual(len(expected), len(streamed))
+            np.testing.assert_allclose(streamed[self.COLUMNS].values, expected[self.COLUMNS].values, rtol=1e-9)
+        self.assertLessEqual(max(pending), 3000 + 1000)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
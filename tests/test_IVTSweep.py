@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+from pandas import DataFrame
+
+from algo.IVTFilter import IVTFilter
+from algo.IVTSweep import IVTSweep
+
+
+
+
+class Main():
+    """Bare main object, collecting console output."""
+    def __init__(self):
+        self.lines = []
+
+    def printToOut(self, text:str, status:str = '') -> None:
+        self.lines.append(text)
+
+
+
+
+class test_IVTSweep(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(24)
+        velocity = np.abs(np.convolve(rng.normal(0, 80, 20000), np.ones(5) / 5, 'same'))
+        velocity[rng.random(len(velocity)) < 0.002] = np.nan
+        self.data = DataFrame({'Time': np.arange(len(velocity)) / 500, 'Velocity': velocity})
+
+
+    def getExpected(self, params:tuple) -> list:
+        filter = IVTFilter()
+        filter.runJob(self.data, *params)
+        expected = []
+        for state in IVTSweep.STATES:
+            events = filter.getResultFiltered(state)
+            durations = events['dur'] if len(events) else np.zeros(0)
+            expected.extend([len(durations), np.mean(durations) if len(durations) else np.nan,
+                                             np.median(durations) if len(durations) else np.nan,
+                                             np.std(durations, ddof=1) if len(durations) > 1 else np.nan])
+        return expected
+
+
+    def test_rowsEqualSingleRuns(self):
+        sweep = IVTSweep(Main())
+        grid = sweep.getGrid([100, 150], [10, 15], [0.100, 0.250], [0, 0.035, 10])
+        for workers in [1, 3]:
+            sweep.workers = workers
+            table = sweep.run(self.data, grid)
+            self.assertEqual(list(table.columns), sweep.getColumns())
+            self.assertEqual(len(table), len(grid))
+            for row, params in zip(table.itertuples(index=False), grid):
+                self.assertEqual(tuple(row[:4]), params)
+                np.testing.assert_allclose(np.array(row[4:], dtype=float), self.getExpected(params), rtol=1e-9, atol=1e-12)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+from pandas import DataFrame
+
+from algo.IVVTFilter import IVVTFilter
+from fixtures import getGazeTrace, referenceEvents
+
+
+
+
+class test_IVVTFilter(unittest.TestCase):
+    def test_thresholdBands(self):
+        velocity = np.array([0, 9.99, 10, 50, 99.99, 100, 300, np.nan, -150, -20, -5])
+        filter = IVVTFilter()
+        filter.runJob(DataFrame({'Time': np.arange(len(velocity)) / 500, 'Velocity': velocity}), 100, 10, 20, 0)
+        #lower band borders are inclusive, sign of velocity component does not matter
+        np.testing.assert_array_equal(filter.getResultFrame()['State'].values, [0, 0, 2, 2, 2, 1, 1, 3, 1, 2, 0])
+
+
+    def test_eventsEqualReference(self):
+        for seed in range(3):
+            data = getGazeTrace(seed)[['Time', 'Velocity']]
+            filter = IVVTFilter()
+            filter.runJob(data, 100, 10, 20, 0.010)
+
+            time, velocity = data['Time'].values, data['Velocity'].values
+            states = np.full(len(time), IVVTFilter.FIXATION)
+            states[velocity >= 10] = IVVTFilter.SMOOTH_PURSUIT
+            states[velocity >= 100] = IVVTFilter.SACCADE
+            states[np.isnan(velocity)] = IVVTFilter.NOT_FOUND
+            np.testing.assert_array_equal(filter.getResultFrame()['State'].values, states)
+
+            for name, state in IVVTFilter.STATES.items():
+                noiseLevel = 20 if state == IVVTFilter.SACCADE else None
+                expected = referenceEvents(time, states, velocity, state, noiseLevel=noiseLevel, minMotion=0.010)
+                events = filter.getResultFiltered(name)
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(list(events.index), list(expected.index))
+                np.testing.assert_allclose(events[expected.columns].values, expected.values, rtol=1e-9)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
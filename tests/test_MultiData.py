@@ -0,0 +1,258 @@
+import unittest
+import shutil, tempfile
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, concat
+from scipy.signal import savgol_filter, cspline1d, convolve
+
+from parsers.MultiData import MultiData
+from utils.SettingsReader import SettingsReader
+from utils import Utils
+from fixtures import getSMISamples, getChunks, writeSettings, referenceSeparation
+
+
+
+
+class Main():
+    """Bare main object, without settings."""
+    def __init__(self):
+        self.SAMPLES_COMPONENTS_LIST = ['fixation', 'saccade', 'pursuit',    'messages', 'sweep']
+        self.GAZE_COMPONENTS_LIST = ['fixations','saccades',    'eyesNotFounds','unclassifieds',      "imu", "gyro","accel"]
+        self.settingsReader = None
+        self.lines = []
+
+    def printToOut(self, text:str, status:str = '') -> None:
+        self.lines.append(text)
+
+
+
+
+def referenceTagIntervals(settingsReader:SettingsReader, chData:DataFrame, startFrom:timedelta, block:str, ignoreEmpty:bool) -> DataFrame:
+    """Data tagged interval by interval, each selected by a mask over all samples, the way tagIntervals originally did it."""
+    data = []
+    chData = chData.copy()
+    chData.insert(1, 'Timedelta', pd.to_timedelta(chData['Time'].astype(float), unit='s'))
+    intervals = settingsReader.settings.findall(block)
+    for interval in intervals:
+        if ignoreEmpty and not interval.get('id'):
+            continue
+        #start is the sum of durations of all intervals before, up to the first one with this id
+        startTime = Utils.parseTime(0)
+        for previous in intervals:
+            if previous.get('id') == interval.get('id'):
+                break
+            startTime = startTime + Utils.parseTime(previous.get('duration'))
+        endTime = startTime + Utils.parseTime(interval.get('duration'))
+        intData = chData.loc[(chData['Timedelta'] >= startTime + startFrom) & (chData['Timedelta'] < endTime + startFrom)].copy()
+        intData.insert(4, block, interval.get('id'))
+        intData.insert(5, '{0} duration'.format(block), interval.get('duration'))
+        data.append(intData)
+
+    data = concat(data)
+    data.insert(1, 'TimestampZeroBased', [timestamp - data.iloc[0, 0] for timestamp in data.iloc[:, 0]])
+    return data
+
+
+def referenceVelocity(samplesData:DataFrame, smooth:str) -> DataFrame:
+    """Derived columns computed column by column and row by row, the way getVelocity originally did it."""
+    metadata = samplesData.metadata
+    samplesData = samplesData.copy()
+    for side in ['L', 'R']:
+        for dim in ['X', 'Y']:
+            dataToSmooth = samplesData['{0} POR {1} [px]'.format(side, dim)]
+            if smooth == 'savgol':
+                samplesData['{0}POR{1}PxSmoothed'.format(side, dim)] = savgol_filter(dataToSmooth, 15, 2)
+            elif smooth == 'spline':
+                samplesData['{0}POR{1}PxSmoothed'.format(side, dim)] = cspline1d(np.array(dataToSmooth), lamb=3)
+            else:
+                win = np.array([1,1,1,1,1,1])
+                samplesData['{0}POR{1}PxSmoothed'.format(side, dim)] = convolve(np.array(dataToSmooth), in2=win, mode='same') / win.sum()
+
+            if dim == 'X':
+                screenDim, screenRes, multiplier = metadata['screenWidthPx'], metadata['screenHResMm'], 1
+            else:
+                screenDim, screenRes, multiplier = metadata['screenHeightPx'], metadata['screenVResMm'], -1
+            for source, suffix in [('{0} POR {1} [px]', ''), ('{0}POR{1}PxSmoothed', 'Smoothed')]:
+                coordsMm = multiplier * (samplesData[source.format(side, dim)] - screenDim / 2) * screenRes
+                samplesData['{0}POR{1}Mm{2}'.format(side, dim, suffix)] = coordsMm
+                samplesData['{0}POR{1}Deg{2}'.format(side, dim, suffix)] = np.sign(coordsMm) * coordsMm.apply(lambda x: referenceSeparation(x,0, 0,0,  z=metadata['headDistanceMm'],  mode='fromCartesian'))
+
+        for suffix in ['', 'Smoothed']:
+            x = samplesData['{0}PORXDeg{1}'.format(side, suffix)].values
+            y = samplesData['{0}PORYDeg{1}'.format(side, suffix)].values
+            seps = [referenceSeparation(x[i], y[i], x[i-1], y[i-1],  z=metadata['headDistanceMm'],  mode='fromPolar') for i in range(1, len(x))]
+            samplesData['{0}Velocity{1}'.format(side, suffix)] = np.hstack((1, seps)) / np.hstack((1, np.diff(samplesData['Time'])))
+    return samplesData
+
+
+
+
+class test_MultiData(unittest.TestCase):
+    def setUp(self):
+        self.multiData = MultiData(Main())
+        time = np.round(np.arange(20000) * 0.002 + 0.5, 6)
+        self.samplesData = DataFrame({'Time': time, 'Type': 'SMP', 'Trial': 1, 'R POR X [px]': np.arange(20000.0), 'R POR Y [px]': np.arange(20000.0)})
+        messagesData = DataFrame({'Time': [0.5, 10.5, 11.0, 25.3], 'Text': ['# Message: FixPoint1', 'other', '# Message: FixPoint2', '# Message: FixPoint3']})
+        #record ends at its last sample, as DataReader passes it
+        self.multiData.setIntervalTables('01', messagesData, time[-1])
+
+
+    def test_tagByTrialKeepsEverySample(self):
+        for block in ['trial', 'message']:
+            data = self.multiData.tagIntervals(self.samplesData, 0, block=block, ignoreEmpty=False, id='01')
+            self.assertEqual(len(data), len(self.samplesData))
+            self.assertEqual(data['Time'].iloc[-1], self.samplesData['Time'].iloc[-1])
+
+
+    def test_lastSampleInLastTrial(self):
+        data = self.multiData.tagIntervals(self.samplesData, 0, block='trial', ignoreEmpty=True, id='01')
+        self.assertEqual(data['trial'].iloc[-1], '3')
+        self.assertEqual(list(data['trial'].unique()), ['1', '2', '3'])
+
+
+
+    def test_compactedOnceWhenStored(self):
+        self.multiData.compact = True
+        self.multiData.settingsReader = mock.Mock(**{'substVersatileChannels.return_value': 'samples', 'getPathAttrById.return_value': 'rec01'})
+        stored = self.multiData.compactDtypes(self.samplesData)
+        self.multiData.setNode('samples', '01', stored)
+        with mock.patch.object(MultiData, 'compactDtypes', wraps=self.multiData.compactDtypes) as compactDtypes:
+            data = self.multiData.getChannelAndTag('samples', '01', block='trial', ignoreEmpty=False)
+            compactDtypes.assert_not_called()
+
+        #same as compacting tagged data again
+        pd.testing.assert_frame_equal(data, self.multiData.compactDtypes(data))
+        self.assertEqual(data['R POR X [px]'].dtype, np.float32)
+        self.assertEqual(data['TimestampZeroBased'].dtype, np.int64)
+        for column in ['Record tag', 'Id', 'trial', 'trial duration']:
+            self.assertEqual(data[column].dtype, 'category')
+        #stored node is left as it is
+        self.assertIs(self.multiData.getChannelById('samples', '01'), stored)
+        self.assertNotIn('trial', stored.columns)
+
+
+
+    def setSettings(self, files:list=()) -> SettingsReader:
+        """Reads settings with given file elements and intervals of every time format, utility and empty ones in between.
+
+        Interval ids are unique, as original lookup by id needs.
+        """
+        dataDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dataDir, ignore_errors=True)
+        intervals = [('_zeroTime', '1.3'), ('a', '2.5'), ('', '0:01.5'), ('b', '00:00:03.250'), ('c', '0:04'), ('_pause', '1'), ('d', '12.125')]
+        writeSettings('{0}/settings.xml'.format(dataDir), list(files) + ['<interval id="{0}" duration="{1}"/>'.format(*i) for i in intervals])
+        settingsReader = SettingsReader(Main())
+        settingsReader.select('{0}/settings.xml'.format(dataDir))
+        settingsReader.read()
+        self.multiData.settingsReader = settingsReader
+        return settingsReader
+
+
+    def getBorderSamples(self) -> DataFrame:
+        """Samples starting before intervals and ending after them, irregularly spaced, many of them right on interval borders."""
+        rng = np.random.default_rng(13)
+        time = np.round(np.arange(60000) * 0.0005, 6)
+        time = time[rng.random(len(time)) < 0.7]
+        return DataFrame({'Time': time, 'Type': 'SMP', 'Trial': 1, 'R POR X [px]': rng.normal(800, 50, len(time)), 'R POR Y [px]': rng.normal(500, 50, len(time))})
+
+
+    def test_tagIntervalsEqualsReference(self):
+        settingsReader = self.setSettings()
+        samplesData = self.getBorderSamples()
+        for startFrom in ['0', '0:00.3', '0:02.0015']:
+            for ignoreEmpty in [True, False]:
+                expected = referenceTagIntervals(settingsReader, samplesData, Utils.parseTime(startFrom), 'interval', ignoreEmpty)
+                data = self.multiData.tagIntervals(samplesData, startFrom, block='interval', ignoreEmpty=ignoreEmpty)
+                self.assertGreater(len(data), 0)
+                #tags are categorical now, values are the same
+                for column in ['interval', 'interval duration']:
+                    data[column] = data[column].astype(expected[column].dtype)
+                pd.testing.assert_frame_equal(data, expected, obj='{0} {1}'.format(startFrom, ignoreEmpty))
+
+
+    def test_channelAndTagEqualsReference(self):
+        settingsReader = self.setSettings(['<file id="01" type="samples" path="rec01.txt" zeroTime="0:00.3"/>'])
+        samplesData = self.getBorderSamples()
+        self.multiData.setNode('samples', '01', samplesData)
+        columns = list(samplesData.columns)
+
+        #tags were inserted into the stored data as str columns before tagging
+        tagged = samplesData.copy()
+        tagged.insert(2, 'Record tag', 'rec01')
+        tagged.insert(3, 'Id', '01')
+        expected = referenceTagIntervals(settingsReader, tagged, Utils.parseTime('0:00.3'), 'interval', True)
+        #second fetch gave 'Id 2' column before, now it is the same as the first one
+        for attempt in range(2):
+            data = self.multiData.getChannelAndTag('samples', '01', block='interval')
+            for column in ['Record tag', 'Id', 'interval', 'interval duration']:
+                self.assertEqual(data[column].dtype, 'category')
+                data[column] = data[column].astype(expected[column].dtype)
+            pd.testing.assert_frame_equal(data, expected)
+            self.assertEqual(list(samplesData.columns), columns)
+
+        #intervals are yielded in the same order and with the same rows as grouping by str tags gives
+        data = self.multiData.getChannelAndTag('samples', '01', block='interval')
+        intervals = list(self.multiData.genIntervals(data, 'interval'))
+        self.assertEqual([interval for interval, rows in intervals], list(expected['interval'].unique()))
+        for interval, rows in intervals:
+            np.testing.assert_array_equal(rows.index, expected.index[expected['interval'] == interval])
+
+        #retagging tagged data by other schedule replaces tags instead of adding more
+        retagged = self.multiData.tagIntervals(data, '0', block='interval', ignoreEmpty=False, tags={'Record tag': 'rec01', 'Id': '01'})
+        self.assertEqual(list(retagged.columns), list(data.columns))
+        pd.testing.assert_frame_equal(retagged, self.multiData.tagIntervals(samplesData.loc[data.index], '0', block='interval', ignoreEmpty=False,
+                                                                            tags={'Record tag': 'rec01', 'Id': '01'}))
+
+
+    def test_velocityEqualsReference(self):
+        #whole columns, not valid runs, as velocity was originally computed
+        multiData = MultiData(Main(), segment=False)
+        samplesData = getSMISamples(11, length=2000, gap=(0, 0))
+        for smooth in ['spline', 'savgol', 'conv']:
+            expected = referenceVelocity(samplesData, smooth)
+            data = samplesData.copy()
+            data.metadata = dict(samplesData.metadata)
+            data = multiData.getVelocity(data, smooth, True, quiet=True)
+            self.assertEqual(list(data.columns), list(expected.columns))
+            pd.testing.assert_frame_equal(data, expected, check_exact=False, rtol=1e-9, atol=1e-9, obj=smooth)
+
+
+    def test_chunkedVelocityEqualsWhole(self):
+        columns = ['LVelocitySmoothed', 'RVelocitySmoothed']
+        for smooth in ['spline', 'savgol', 'conv']:
+            samplesData = getSMISamples(19)
+            whole = samplesData.copy()
+            whole.metadata = samplesData.metadata
+            whole = self.multiData.getVelocity(whole, smooth, True, quiet=True, columns=columns)
+            self.assertGreater(np.count_nonzero(np.isnan(whole['RVelocitySmoothed'])), 0)
+            for size in [300, 1000]:
+                #chunk borders fall inside valid runs, blinks and the time gap
+                chunks = self.multiData.genVelocityChunks(getChunks(samplesData, size), smooth, True, columns=columns)
+                chunked = concat(list(chunks))
+                np.testing.assert_array_equal(chunked['Time'].values, whole['Time'].values)
+                np.testing.assert_allclose(chunked[columns].values, whole[columns].values, rtol=1e-7, atol=1e-7, err_msg=smooth)
+
+
+    def test_causalChunkedVelocityEqualsWhole(self):
+        samplesData = getSMISamples(19)
+        whole = concat(list(self.multiData.genCausalVelocityChunks([samplesData], 'spline', True, columns=['RVelocitySmoothed'])))
+        chunked = concat(list(self.multiData.genCausalVelocityChunks(getChunks(samplesData, 300), 'spline', True, columns=['RVelocitySmoothed'])))
+        np.testing.assert_allclose(chunked['RVelocitySmoothed'].values, whole['RVelocitySmoothed'].values, rtol=1e-9, atol=1e-9)
+
+
+    def test_maxGapSameForEveryChunk(self):
+        samplesData = getSMISamples(19)
+        runs = self.multiData.getValidRuns(samplesData)
+        #a chunk with irregular sampling splits runs the same way whole record does
+        chunk = samplesData.iloc[1950:2150:3].copy()
+        chunk.metadata = samplesData.metadata
+        self.assertEqual(self.multiData.getMaxGap(chunk), self.multiData.getMaxGap(samplesData))
+        self.assertIn(2000, runs[0])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
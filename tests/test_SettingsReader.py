@@ -1,18 +1,93 @@
 import unittest
+import shutil, tempfile
+import xml.etree.ElementTree as ET
 
 from utils.SettingsReader import SettingsReader
+from utils import Utils
+from fixtures import writeSettings
+
+
+
+
+class Main():
+    """Bare main object, collecting console output."""
+    def __init__(self):
+        self.lines = []
+
+    def printToOut(self, text:str, status:str = '') -> None:
+        self.lines.append(text)
 
 
 
 
 class test_SettingsReader(unittest.TestCase):
-    def test_myTest(self):
-        #self.assertEqual(a, b)
-        #self.assertTrue(x)
-        #self.assertIsNone(x)
-		#self.assertRaises(TypeError)
+    def setUp(self):
+        self.dataDir = tempfile.mkdtemp()
+        #ids repeat across types, one type and id pair twice (first one wins), intervals with empty and utility ids
+        writeSettings('{0}/settings.xml'.format(self.dataDir),
+                      ['<file id="01" type="samples" path="a.txt"/>', '<file id="02" type="samples" path="b.txt"/>',
+                       '<file id="01" type="gaze" path="a.tsv" zeroTime="0:01.5"/>', '<file id="02" type="samples" path="c.txt"/>',
+                       '<interval id="_zeroTime" duration="1.3"/>', '<interval id="a" duration="2.5"/>', '<interval id="" duration="0:01.5"/>',
+                       '<interval id="b" duration="00:00:03.250"/>', '<date id="" value="2026-01-01"/>'])
+        self.settingsReader = SettingsReader(Main())
+        self.settingsReader.select('{0}/settings.xml'.format(self.dataDir))
+        self.settingsReader.read()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dataDir, ignore_errors=True)
+
+
+    def assertQueriesEqualReference(self) -> None:
+        """Compares every indexed lookup with the ElementTree query it replaced."""
+        settingsReader = self.settingsReader
+        settings = settingsReader.settings
+        for id in ['01', '02', '03', '', '_zeroTime', 'a', 'b', 'c', '1', '2']:
+            self.assertEqual(settingsReader.getIds(id), settings.findall("file[@id='"+id+"']"), id)
+            for type in ['samples', 'gaze', 'imu']:
+                self.assertIs(settingsReader.getTypeById(type, id), settings.find("file[@type='" + type + "'][@id='"+id+"']"), (type, id))
+            for block in ['interval', 'message', 'trial', 'date']:
+                self.assertIs(settingsReader.getIntervalById(id, block), settings.find("{0}[@id='{1}']".format(block, id)), (block, id))
+        for type in ['samples', 'gaze', 'imu']:
+            self.assertEqual(settingsReader.getTypes(type), settings.findall("file[@type='"+type+"']"), type)
+            self.assertEqual(settingsReader.hasType(type), len(settings.findall("file[@type='"+type+"']")) > 0, type)
+        for block in ['interval', 'message', 'trial', 'date']:
+            self.assertEqual(settingsReader.getIntervals(block, ignoreEmpty=False), settings.findall(block), block)
+            self.assertEqual(settingsReader.getIntervals(block, ignoreEmpty=True), [i for i in settings.findall(block) if i.get('id')], block)
+            self.assertEqual(list(settingsReader.unique(block, 'id')), sorted(set(i.get('id') for i in settings.findall(block))), block)
+
+            if block == 'date':
+                continue
+            #start of the first interval with an id is the sum of durations of all intervals before it
+            startTime = Utils.parseTime(0)
+            for interval in settings.findall(block):
+                if settings.find("{0}[@id='{1}']".format(block, interval.get('id'))) is interval:
+                    self.assertEqual(settingsReader.getStartTimeById(interval.get('id'), block), startTime, (block, interval.get('id')))
+                    self.assertEqual(settingsReader.getEndTimeById(interval.get('id'), block), startTime + Utils.parseTime(interval.get('duration')))
+                startTime = startTime + Utils.parseTime(interval.get('duration'))
+
+
+    def test_indexEqualsElementTree(self):
+        self.assertQueriesEqualReference()
+
+
+    def test_indexFollowsAppends(self):
+        self.assertQueriesEqualReference()
+        #messages and trials are appended after settings are read, as DataExporter.writeIntervals does
+        for block, id, duration in [('message', '_zeroTime', '0.5'), ('message', '1', '10'), ('trial', '1', '10.25'), ('message', '2', '4'),
+                                    ('interval', 'c', '0:02'), ('message', '1', '3')]:
+            self.settingsReader.append(ET.Element(block, {'id': id, 'text': '', 'duration': duration}))
+            self.assertQueriesEqualReference()
+        self.settingsReader.append(ET.Element('file', {'id': '03', 'type': 'gaze', 'path': 'd.tsv'}))
+        self.assertQueriesEqualReference()
+
+        #reading settings again drops appended elements
+        self.settingsReader.read()
+        self.assertEqual(self.settingsReader.getIntervals('message'), [])
+        self.assertIsNone(self.settingsReader.getTypeById('gaze', '03'))
+        self.assertQueriesEqualReference()
 
 
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+from scipy.signal import cspline1d, savgol_filter
+
+from algo.Smoother import Smoother
+
+
+
+
+class test_Smoother(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(18)
+        self.data = np.cumsum(rng.normal(0, 1, (3000, 4)), axis=0) + rng.normal(0, 5, (3000, 4))
+
+
+    def reference(self, method:str, window:int=None, order:int=None, lamb:float=None) -> np.ndarray:
+        """Channel by channel smoothing, the way getVelocity originally did it with fixed parameters."""
+        columns = []
+        for column in self.data.T:
+            if method == 'savgol':
+                columns.append(savgol_filter(column, window, order))
+            elif method == 'spline':
+                columns.append(cspline1d(column, lamb=lamb))
+            else:
+                win = np.ones(window)
+                columns.append(np.convolve(column, win, mode='same') / win.sum())
+        return np.column_stack(columns)
+
+
+    def test_directAndFFTEqualReference(self):
+        #short kernels are convolved directly, long ones via FFT
+        for window in [6, 5, Smoother.FFT_MIN_TAPS, 101]:
+            smoothed = Smoother('conv', window=window).smooth(self.data)
+            np.testing.assert_allclose(smoothed, self.reference('conv', window=window), rtol=1e-9, atol=1e-9)
+        for window, order in [(15, 2), (21, 3), (Smoother.FFT_MIN_TAPS + 1, 2), (101, 4)]:
+            smoothed = Smoother('savgol', window=window, order=order).smooth(self.data)
+            np.testing.assert_allclose(smoothed, self.reference('savgol', window=window, order=order), rtol=1e-9, atol=1e-9)
+        for lamb in [3, 0.5, 0.05]:
+            smoothed = Smoother('spline', lamb=lamb).smooth(self.data)
+            np.testing.assert_allclose(smoothed, self.reference('spline', lamb=lamb), rtol=1e-9, atol=1e-9)
+
+
+    def test_defaultsEqualFixedParameters(self):
+        np.testing.assert_allclose(Smoother('savgol').smooth(self.data), self.reference('savgol', window=15, order=2), rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(Smoother('spline').smooth(self.data), self.reference('spline', lamb=3), rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(Smoother('conv').smooth(self.data), self.reference('conv', window=6), rtol=1e-9, atol=1e-9)
+
+
+    def test_causalChunkedEqualsWhole(self):
+        for smoother in [Smoother('savgol'), Smoother('savgol', window=81, order=3), Smoother('spline'), Smoother('spline', lamb=0.05),
+                         Smoother('conv'), Smoother('conv', window=100)]:
+            whole, state = smoother.smoothCausal(self.data)
+            for size in [1, 7, 64, 1000]:
+                chunks = []
+                state = None
+                for start in range(0, len(self.data), size):
+                    smoothed, state = smoother.smoothCausal(self.data[start:start + size], state)
+                    chunks.append(smoothed)
+                np.testing.assert_allclose(np.vstack(chunks), whole, rtol=1e-9, atol=1e-9, err_msg=smoother.printParams())
+
+
+    def test_causalFIRIsTrailing(self):
+        #each output depends on current and past samples only
+        smoothed, state = Smoother('conv', window=6).smoothCausal(self.data)
+        np.testing.assert_allclose(smoothed[10], self.data[5:11].mean(axis=0), rtol=1e-12)
+
+
+    def test_splineHaloDecays(self):
+        for lamb in [3, 0.5, 0.05]:
+            smoother = Smoother('spline', lamb=lamb)
+            rho, omega = smoother.getSplinePoles()
+            self.assertTrue(0 < rho < 1)
+            self.assertLess(rho ** smoother.getHalo(), Smoother.IIR_TOLERANCE * 1.0001)
+
+
+    def test_invalidParameters(self):
+        #spline poles leave the unit circle below lambda 1/24, where cspline1d itself gives NaN
+        for lamb in [0.005, 1 / 144, 1 / 24, 0, -1]:
+            with self.assertRaises(ValueError):
+                Smoother('spline', lamb=lamb)
+        with self.assertRaises(ValueError):
+            Smoother('savgol', window=14)
+        with self.assertRaises(ValueError):
+            Smoother('conv', window=0)
+        with self.assertRaises(ValueError):
+            Smoother('median')
+
+
+
+if __name__ == '__main__':
+    unittest.main()
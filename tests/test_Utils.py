@@ -0,0 +1,126 @@
+import unittest
+from datetime import datetime, date, timedelta
+
+import numpy as np
+import pandas
+
+from utils import Utils
+from fixtures import referenceSeparation
+
+
+
+
+def referenceGuessTimeFormat(val:object) -> str:
+    """Time format guessed by trial parsing, the way guessTimeFormat originally did it.
+
+    to_datetime is given a float, as older pandas converted strings with unit (and rejected non-numeric ones) itself.
+    """
+    if type(val) is not str:
+        val=str(val)
+
+    formats = ['%H:%M:%S.%f', '%M:%S.%f', '%M:%S', '%S.%f', '%S']
+    for fmt in formats:
+        try:
+            datetime.strptime(val, fmt)
+        except ValueError:
+            try:
+                pandas.to_datetime(float(val), unit='s')
+            except ValueError:
+                continue
+            break
+        break
+    return fmt
+
+
+def referenceParseTime(val:object = 0) -> timedelta:
+    """Timedelta parsed without memoization, the way parseTime originally did it."""
+    val=str(val)
+    fmt=referenceGuessTimeFormat(val)
+    try:
+        parsed=datetime.strptime(val, fmt)
+    except ValueError:
+        parsed=pandas.to_datetime(float(val), unit='s')
+    return datetime.combine(date.min,parsed.time())-datetime.min
+
+
+
+
+class test_Utils(unittest.TestCase):
+    def assertSeparations(self, x1:np.ndarray,y1:np.ndarray, x2:np.ndarray,y2:np.ndarray,  z:float,  mode:str) -> np.ndarray:
+        vectorized = Utils.getSeparationV(x1,y1, x2,y2,  z=z,  mode=mode)
+        expected = [referenceSeparation(*args, z=z, mode=mode) for args in zip(x1, y1, x2, y2)]
+        scalar = [Utils.getSeparation(*args, z=z, mode=mode) for args in zip(x1, y1, x2, y2)]
+        np.testing.assert_allclose(vectorized, expected, rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(scalar, expected, rtol=1e-9, atol=1e-9)
+        return vectorized
+
+
+    def test_separationFromPolar(self):
+        rng = np.random.default_rng(10)
+        x1, x2 = rng.uniform(-180, 180, (2, 1000))
+        y1, y2 = rng.uniform(-90, 90, (2, 1000))
+        self.assertSeparations(x1,y1, x2,y2,  z=0,  mode='fromPolar')
+
+
+    def test_separationFromCartesian(self):
+        rng = np.random.default_rng(11)
+        x1, y1, x2, y2 = rng.uniform(-300, 300, (4, 1000))
+        self.assertSeparations(x1,y1, x2,y2,  z=600,  mode='fromCartesian')
+
+
+    def test_zeroSeparation(self):
+        x = np.array([0.0, 12.5, -170.0, 45.0])
+        y = np.array([0.0, -30.0, 89.0, 45.0])
+        separation = self.assertSeparations(x,y, x,y,  z=0,  mode='fromPolar')
+        np.testing.assert_array_equal(separation, 0)
+        separation = self.assertSeparations(x,y, x,y,  z=600,  mode='fromCartesian')
+        np.testing.assert_array_equal(separation, 0)
+
+        #tiny separations stay positive instead of rounding down to 0
+        separation = self.assertSeparations(np.zeros(3),np.zeros(3), np.array([1e-6, 1e-4, 1e-2]),np.zeros(3),  z=600,  mode='fromCartesian')
+        self.assertTrue(np.all(separation > 0))
+
+
+    def test_nearOppositeSeparation(self):
+        x2 = np.array([180.0, 179.999, 179.9999999, 0.0])
+        y2 = np.array([0.0, 0.0, 0.0, 89.999])
+        y1 = np.array([0.0, 0.0, 0.0, -90.0])
+        separation = self.assertSeparations(np.zeros(4),y1, x2,y2,  z=0,  mode='fromPolar')
+        np.testing.assert_allclose(separation, [180.0, 179.999, 179.9999999, 179.999], rtol=0, atol=1e-9)
+
+
+    def test_parseTimeEqualsReference(self):
+        rng = np.random.default_rng(14)
+        strings = ['0:01.5', '00:00:03.250', '0:04', '12:34', '7:5.25', '1:02:03.5', '01:02:03.000001']
+        strings = strings + ['{0}:{1:02d}.{2}'.format(rng.integers(0, 60), rng.integers(0, 60), rng.integers(0, 1000000)) for i in range(200)]
+        numbers = ['0', '12.5', '1.3', '59.999999', '3600.25', '90000', '-1', 0, 2.5, 12.125, 1e-6]
+        numbers = numbers + list(np.round(rng.uniform(0, 100000, 200), 6))
+        Utils.parseTimeStr.cache_clear()
+        #second pass is served from cache
+        for attempt in range(2):
+            for val in strings:
+                self.assertEqual(Utils.parseTime(val), referenceParseTime(val), val)
+                self.assertEqual(Utils.guessTimeFormat(val), referenceGuessTimeFormat(val), val)
+            for val in numbers:
+                #float seconds were truncated to microseconds, now they are rounded
+                self.assertLessEqual(abs(Utils.parseTime(val) - referenceParseTime(val)), timedelta(microseconds=1), val)
+                self.assertEqual(Utils.parseTime(val), timedelta(seconds=round(float(val) % 86400, 6)), val)
+        self.assertGreaterEqual(Utils.parseTimeStr.cache_info().hits, len(strings) + len(numbers))
+
+        #seconds above 61 failed with 'S.f' format before
+        self.assertEqual(Utils.parseTime('125.5'), timedelta(seconds=125.5))
+        for val in ['abc', '1:2:3', '']:
+            with self.assertRaises(ValueError):
+                Utils.parseTime(val)
+            with self.assertRaises(ValueError):
+                referenceParseTime(val)
+
+
+    def test_unknownMode(self):
+        with self.assertRaises(ValueError):
+            Utils.getSeparationV([0], [0], [1], [1], z=600, mode='fromSpherical')
+
+
+
+if __name__ == '__main__':
+    unittest.main()
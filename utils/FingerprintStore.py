@@ -0,0 +1,130 @@
+import os, json, time
+
+
+from utils import Utils
+
+
+
+
+
+
+
+
+class FingerprintStore():
+
+    """Remembers size, modification time and md5 checksum of every data file seen.
+
+    Checksum of a file is only recomputed when its size or mtime differ from the remembered ones,
+    so that unchanged recordings are not read through on every run.
+    Fingerprints are kept in a JSON file inside the cache directory, next to cached parsed data.
+    """
+
+    STORE_FILE = 'fingerprints.json'
+    #files modified this recently may yet change within same mtime tick, such are not remembered
+    RACY_SECONDS = 2
+
+
+    def __init__(self, main):
+        self.main = main
+        self.storeFile = None
+        self.entries = {}
+
+
+
+    def getFile(self) -> str:
+        """Returns path of the store file, None if cache is disabled (fingerprints are then kept in memory only).
+
+        :return: file path str.
+        """
+        if not self.main.dataCache.enabled:
+            return None
+        return '{0}/{1}'.format(self.main.dataCache.getDir(), self.STORE_FILE)
+
+
+    def load(self) -> None:
+        """Reads store file, if it is not read yet or location has changed.
+
+        :return: None
+        """
+        storeFile = self.getFile()
+        if storeFile == self.storeFile:
+            return None
+
+        self.storeFile = storeFile
+        self.entries = {}
+        if storeFile and os.path.exists(storeFile):
+            try:
+                with open(storeFile, encoding='UTF-8') as f:
+                    self.entries = json.load(f)
+            except:
+                self.main.printError()
+                self.main.printToOut('WARNING: Fingerprints file unreadable, checksums will be recomputed.')
+
+
+    def save(self) -> None:
+        """Writes store file atomically.
+
+        :return: None
+        """
+        if not self.storeFile:
+            return None
+        try:
+            os.makedirs(os.path.dirname(self.storeFile), exist_ok=True)
+            tmpFile = '{0}.tmp{1}'.format(self.storeFile, os.getpid())
+            with open(tmpFile, 'w', encoding='UTF-8') as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmpFile, self.storeFile)
+        except:
+            self.main.printError()
+            self.main.printToOut('WARNING: Failed writing fingerprints file.')
+
+
+
+
+    #QUERY methods
+    def lookup(self, fname:str) -> str:
+        """Returns remembered checksum of a file, if the file has not changed since.
+
+        :param fname: file path.
+        :return: md5 hex value, None if file is unknown or changed.
+        """
+        self.load()
+        entry = self.entries.get(os.path.abspath(fname))
+        if not entry:
+            return None
+        stat = os.stat(fname)
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry['md5']
+        else:
+            return None
+
+
+    def update(self, fname:str, md5:str) -> None:
+        """Remembers checksum of a file along with its current size and mtime.
+
+        :param fname: file path.
+        :param md5: md5 hex value computed for the file.
+        :return: None
+        """
+        self.load()
+        stat = os.stat(fname)
+        if time.time_ns() - stat.st_mtime_ns < self.RACY_SECONDS * 1000000000:
+            return None
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'md5': md5}
+        key = os.path.abspath(fname)
+        if self.entries.get(key) != entry:
+            self.entries[key] = entry
+            self.save()
+
+
+    def md5(self, fname:str) -> str:
+        """Returns md5 checksum of a file, computing it only if the file is unknown or changed.
+
+        :param fname: file path.
+        :return: md5 hex value.
+        """
+        md5 = self.lookup(fname)
+        if md5 is None:
+            md5 = Utils.md5(fname)
+            self.update(fname, md5)
+        return md5
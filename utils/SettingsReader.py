@@ -1,4 +1,4 @@
-import os, hashlib, xml
+import os, xml
 import xml.etree.ElementTree as ET
 from bs4 import BeautifulSoup
 
@@ -26,6 +26,9 @@ class SettingsReader:
         self.settingsFile = None
         self.settingsTree = None
         self.settings = None
+        #interval schedules by block, see getIntervalIndex
+        self.intervalIndex = {}
+        self.resetIndex()
 
 
     def getDir(self)->str:
@@ -67,6 +70,8 @@ class SettingsReader:
         try:
             self.settingsTree = ET.parse(self.settingsFile)
             self.settings = self.settingsTree.getroot()
+            self.intervalIndex = {}
+            self.resetIndex()
         except xml.etree.ElementTree.ParseError:
             self.main.printError()
             self.main.printToOut('ERROR: Bad settings file. Check your XML is valid.')
@@ -85,11 +90,64 @@ class SettingsReader:
 
 
 
+    #INDEX methods
+    def resetIndex(self) -> None:
+        """Drops lookup dicts over settings elements, they are rebuilt on next query.
+
+        :return: None
+        """
+        #file elements by type, by id and by both
+        self.filesByType = {}
+        self.filesById = {}
+        self.filesByTypeId = {}
+        #any elements by tag (block), and by tag and id
+        self.elementsByTag = {}
+        self.elementsByTagId = {}
+        self.indexedCount = 0
+
+
+    def updateIndex(self) -> None:
+        """Adds settings elements appended since last query to lookup dicts.
+
+        Elements are only ever appended to settings (messages, trials, date), so only the tail is indexed.
+        First element wins for lookups by id, same as ElementTree find.
+
+        :return: None
+        """
+        if self.settings is None or self.indexedCount == len(self.settings):
+            return None
+
+        for elem in self.settings[self.indexedCount:]:
+            id = elem.get('id')
+            self.elementsByTag.setdefault(elem.tag, []).append(elem)
+            self.elementsByTagId.setdefault((elem.tag, id), elem)
+            if elem.tag == 'file':
+                type = elem.get('type')
+                self.filesByType.setdefault(type, []).append(elem)
+                self.filesById.setdefault(id, []).append(elem)
+                self.filesByTypeId.setdefault((type, id), elem)
+        self.indexedCount = len(self.settings)
+
+
+    def append(self, elem:object) -> None:
+        """Appends element to settings tree.
+
+        :param elem: ElementTree.Element
+        :return: None
+        """
+        self.settings.append(elem)
+        self.updateIndex()
+
+
+
+
     #DATA FILTERING methods
-    def genTypeFile(self, type:str) -> object:
+    def genTypeFile(self, type:str, checksum:bool=True, quiet:bool=False) -> object:
         """Generator of ids of particular type present in settings.
 
         :param type:
+        :param checksum: whether to compute md5 of the file here, pass False if caller sets it by itself.
+        :param quiet: do not print messages, e.g. when files are only listed ahead of reading.
         :return: File XML element from settings, if such file exists on disk.
         """
         found=False
@@ -97,13 +155,14 @@ class SettingsReader:
             for elem in self.getTypes(type):
                 file= '{0}/{1}'.format(self.dataDir, elem.get('path'))
                 if os.path.exists(file):
-                    if not found:
+                    if not found and not quiet:
                         self.main.printToOut('Reading {0} data...'.format(type))
                         found=True
                     #добавляем контрольную сумму в настройки
-                    elem.set('md5', self.md5(file))
+                    if checksum:
+                        elem.set('md5', self.md5(file))
                     yield elem
-                else:
+                elif not quiet:
                     self.main.printToOut('WARNING: File specified in settings (' + os.path.basename(file) + ') does not exist!')
 
 
@@ -132,7 +191,8 @@ class SettingsReader:
         :param id: id string from settings.
         :return: A list of matches with this id.
         """
-        return self.settings.findall("file[@id='"+id+"']")
+        self.updateIndex()
+        return list(self.filesById.get(id, []))
 
     def getTypes(self, type:str) -> list:
         """Returns all nodes from settings with this type attribute.
@@ -140,7 +200,8 @@ class SettingsReader:
         :param type: type string from settings.
         :return: A list of file tags by type.
         """
-        return self.settings.findall("file[@type='"+type+"']")
+        self.updateIndex()
+        return list(self.filesByType.get(type, []))
 
 
     def unique(self, element:str='file', field:str='') -> list:
@@ -150,7 +211,8 @@ class SettingsReader:
         :param field: For what field to search for.
         :return: List of unique fields in these elements.
         """
-        elements = self.settings.findall(element)
+        self.updateIndex()
+        elements = self.elementsByTag.get(element, [])
         l=[]
         for el in elements:
             l.append(el.get(field))
@@ -188,7 +250,8 @@ class SettingsReader:
         :return: ElementTree.Element or list of them.
         """
         #self.main.logger.debug('get type by id')
-        return self.settings.find("file[@type='" + type + "'][@id='"+id+"']")
+        self.updateIndex()
+        return self.filesByTypeId.get((type, id))
 
     def getZeroTimeById(self, type:str, id:str, parse:bool = True) -> object:
         """Resolves and returns zeroTime attribute of a file tag.
@@ -228,7 +291,8 @@ class SettingsReader:
         :return: ElementTree.Element
         """
         #self.main.logger.debug('get interval by id')
-        return self.settings.find("{0}[@id='{1}']".format(block, id))
+        self.updateIndex()
+        return self.elementsByTagId.get((block, id))
 
     def getIntervals(self, block:str, ignoreEmpty:bool=True) -> list:
         """Returns all intervals.
@@ -238,16 +302,47 @@ class SettingsReader:
         :return: A list of interval nodes from settings.
         """
         #_ (underscore) intervals are considered special, but not empty!
+        self.updateIndex()
         if ignoreEmpty:
-            return [interval for interval in self.settings.findall(block) if interval.get('id')]
+            return [interval for interval in self.elementsByTag.get(block, []) if interval.get('id')]
         else:
-            return self.settings.findall(block)
+            return list(self.elementsByTag.get(block, []))
+
+
+    def getIntervalIndex(self, block:str) -> dict:
+        """Returns schedule of all intervals of the block, in settings order.
+
+        Built once, then extended when intervals are appended to the block.
+
+        :param block: block type (in settings).
+        :return: dict with 'ids' and 'durations' (str, as in settings) lists, 'starts' and 'ends' arrays of int nanoseconds,
+            'positions' dict of first position of each id.
+        """
+        ints = self.getIntervals(block=block, ignoreEmpty=False)
+        index = self.intervalIndex.get(block, {'ids': [], 'durations': [], 'starts': np.zeros(0, dtype=np.int64), 'ends': np.zeros(0, dtype=np.int64), 'positions': {}})
+        if len(index['ids']) == len(ints):
+            return index
+
+        #intervals are only appended, so schedule is extended with the new ones
+        new = ints[len(index['ids']):]
+        durations = np.array([pd.Timedelta(Utils.parseTime(i.get('duration'))).value for i in new], dtype=np.int64)
+        ends = np.cumsum(durations) + (index['ends'][-1] if len(index['ends']) else 0)
+        index = {'ids': index['ids'] + [i.get('id') for i in new],
+                 'durations': index['durations'] + [i.get('duration') for i in new],
+                 'starts': np.hstack((index['starts'], ends - durations)),
+                 'ends': np.hstack((index['ends'], ends))}
+        index['positions'] = {}
+        for position, id in enumerate(index['ids']):
+            index['positions'].setdefault(id, position)
+        self.intervalIndex[block] = index
+        return index
 
 
     def getStartTimeById(self, id:str, block:str, format:bool=False) -> object:
         """Computes and returns start time of interval specified by its id.
         
         Based on start time and durations of previous intervals.
+        If several intervals share the id, the first one is meant.
         
         :param id: id attribute of interval.
         :param block: block type (in settings).
@@ -255,15 +350,11 @@ class SettingsReader:
         :return: Start time of interval in timedelta object.
         """
         #self.main.logger.debug('get start time by id')
-        ints = self.getIntervals(block=block, ignoreEmpty=False)
-        startTime = Utils.parseTime(0)
-        thisId = None
-        for i in ints:
-            thisId = i.get('id')
-            if thisId == id:
-                break
-            duration = self.getDurationById(thisId, block=block)
-            startTime = startTime + duration
+        index = self.getIntervalIndex(block)
+        if id in index['positions']:
+            startTime = pd.Timedelta(index['starts'][index['positions'][id]]).to_pytimedelta()
+        else:
+            startTime = pd.Timedelta(index['ends'][-1] if len(index['ends']) else 0).to_pytimedelta()
 
         if format:
             return str(startTime)
@@ -334,7 +425,8 @@ class SettingsReader:
         :param type:
         :return:
         """
-        if type in self.unique(field='type'):
+        self.updateIndex()
+        if self.filesByType.get(type):
             return True
         else:
             return False
@@ -375,15 +467,9 @@ class SettingsReader:
         #print(bs.prettify())
 
     def md5(self, fname:str)->str:
-        """Calculates and returns MD5 hash checksum of a file.
-
-        From https://stackoverflow.com/a/3431838/2795533
+        """Returns MD5 hash checksum of a file, recalculated only if the file changed since last run.
 
         :param fname: file path.
         :return: md5 hex value.
         """
-        hash_md5 = hashlib.md5()
-        with open(fname, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
\ No newline at end of file
+        return self.main.fingerprintStore.md5(fname)
\ No newline at end of file
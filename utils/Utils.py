@@ -1,67 +1,111 @@
-import math, cmath
+import re, math, hashlib
 from datetime import datetime, date, timedelta
+from functools import lru_cache
 
-import angles
+import numpy as np
 
 import pandas
 from pandas import Series
+from pandas.api.types import is_integer_dtype
 
 
 
 
 #TIME formatting methods
+#strptime formats of time strings, each with a pattern recognizing it, so that no parsing attempt is made in vain
+#plain numbers (seconds) are recognized before these
+TIME_FORMATS = [('%H:%M:%S.%f', re.compile(r'^\d{1,2}:\d{1,2}:\d{1,2}\.\d{1,6}$')),
+                ('%M:%S.%f', re.compile(r'^\d{1,2}:\d{1,2}\.\d{1,6}$')),
+                ('%M:%S', re.compile(r'^\d{1,2}:\d{1,2}$'))]
+#number of distinct time strings to remember parsed
+TIME_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
 def guessTimeFormat(val:object) -> str:
     """Helper method to determine the time strf string.
+
+    Plain numbers are taken as seconds, whatever their magnitude.
+    Results are memoized per distinct string.
     
     :param val: Time string to try to parse.
-    :return: Format string.
+    :return: Format string, None for a plain number of seconds.
     """
     if type(val) is not str:
         val=str(val)
 
-    formats = ['%H:%M:%S.%f', '%M:%S.%f', '%M:%S', '%S.%f', '%S']
-    for fmt in formats:
-        try:
-            datetime.strptime(val, fmt)
-        except ValueError:
-            try:
-                pandas.to_datetime(val, unit='s')
-            except ValueError:
-                continue
-            break
-        break
-    #print('Time format of ' + val + ' string is guessed as ' + fmt + '.')
-    return fmt
-
-
-#FIXME valueerror if format =s.f and s>61
+    try:
+        float(val)
+        return None
+    except ValueError:
+        pass
+
+    for fmt, pattern in TIME_FORMATS:
+        if pattern.match(val):
+            return fmt
+    raise ValueError('Unknown time format: {0}.'.format(val))
+
+
 def parseTime(val:object = 0) -> timedelta:
     """Helper method to convert time strings to datetime objects.
 
     Agnostic of time string format.
+    Results are memoized per distinct string, see parseTimeStr.
 
     :param val: Time string or float.
     :return: timedelta object.
     """
-    val=str(val)
+    return parseTimeStr(str(val))
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def parseTimeStr(val:str) -> timedelta:
+    """Memoized body of parseTime method.
+
+    :param val: Time string.
+    :return: timedelta object, time of day part only (as if a clock reading).
+    """
     fmt=guessTimeFormat(val)
+    if fmt is None:
+        return timedelta(seconds=float(val) % 86400)
     try:
         parsed=datetime.strptime(val, fmt)
     except ValueError:
-        parsed=pandas.to_datetime(val, unit='s')
+        #e.g. seconds above 61 in '%S.%f' format
+        parsed=pandas.to_datetime(val)
     return datetime.combine(date.min,parsed.time())-datetime.min
 
 
 def parseTimeV(data:Series) -> Series:
     """Vectorized version of parseTime method.
 
+    Timestamp columns are converted arithmetically, other ones (duration strings) are parsed once per distinct value.
+
     :param data: pandas Series object.
     :return: Same object with values converted to timedelta.
     """
     if data.name=='Time' or data.name=='Recording timestamp':
-        return pandas.to_timedelta(data.astype(float), unit='s')
+        return pandas.to_timedelta(timeToSeconds(data).astype(float), unit='s')
+    else:
+        codes, uniques = pandas.factorize(data.astype(str))
+        parsed = pandas.to_timedelta([parseTime(val) for val in uniques])
+        return Series(parsed.take(codes), index=data.index, name=data.name)
+
+
+
+
+def timeToSeconds(data:Series) -> Series:
+    """Returns timestamps in seconds.
+
+    Float timestamps are seconds already, integer ones are microseconds (compact data mode).
+
+    :param data: pandas Series object with timestamps.
+    :return: Series of float seconds.
+    """
+    if is_integer_dtype(data):
+        return data / 1000000
     else:
-        return pandas.to_datetime(data.astype(str), infer_datetime_format=True) - date.today()
+        return data
 
 
 
@@ -70,6 +114,8 @@ def parseTimeV(data:Series) -> Series:
 def getSeparation(x1:float,y1:float, x2:float,y2:float,  z:float,  mode:str) -> float:
     """Returns angular separation between two angles on a unit sphere.
 
+    Scalar wrapper over getSeparationV.
+
     :param x1:
     :param y1:
     :param x2:
@@ -78,15 +124,59 @@ def getSeparation(x1:float,y1:float, x2:float,y2:float,  z:float,  mode:str) ->
     :param mode: whether coordinates are passed in mm or degrees
     :return: angle in degrees
     """
-    if mode=='fromCartesian':
-        lon1 = cmath.polar(complex(x1, z))[1]-math.pi/2
-        lat1 = cmath.polar(complex(y1, z))[1]-math.pi/2
-        lon2 = cmath.polar(complex(x2, z))[1]-math.pi/2
-        lat2 = cmath.polar(complex(y2, z))[1]-math.pi/2
+    return float(getSeparationV(x1,y1, x2,y2,  z=z,  mode=mode))
+
 
-        sep = angles.sep(lon1,lat1, lon2,lat2)
+def getSeparationV(x1:object,y1:object, x2:object,y2:object,  z:float,  mode:str) -> np.ndarray:
+    """Vectorized version of getSeparation method, takes whole arrays of coordinates.
+
+    Same great circle formula as angles.sep, numerically stable for small angles.
+
+    :param x1: array-like
+    :param y1: array-like
+    :param x2: array-like
+    :param y2: array-like
+    :param z: depth, in mm
+    :param mode: whether coordinates are passed in mm or degrees
+    :return: array of angles in degrees
+    """
+    x1, y1, x2, y2 = np.broadcast_arrays(*[np.asarray(i, dtype=float) for i in (x1, y1, x2, y2)])
+    if mode=='fromCartesian':
+        #same as cmath.polar(complex(x, z))[1]-math.pi/2
+        lon1 = np.arctan2(z, x1)-math.pi/2
+        lat1 = np.arctan2(z, y1)-math.pi/2
+        lon2 = np.arctan2(z, x2)-math.pi/2
+        lat2 = np.arctan2(z, y2)-math.pi/2
     elif mode=='fromPolar':
-        sep = angles.sep(math.radians(x1),math.radians(y1), math.radians(x2),math.radians(y2))
+        lon1, lat1, lon2, lat2 = np.radians(x1), np.radians(y1), np.radians(x2), np.radians(y2)
+    else:
+        raise ValueError('Unknown separation mode: {0}.'.format(mode))
+
+    #unit vectors, then angle between them as atan2(|v1 x v2|, v1 . v2)
+    cosLat1, cosLat2 = np.cos(lat1), np.cos(lat2)
+    a1, b1, c1 = cosLat1*np.cos(lon1), cosLat1*np.sin(lon1), np.sin(lat1)
+    a2, b2, c2 = cosLat2*np.cos(lon2), cosLat2*np.sin(lon2), np.sin(lat2)
+    dot = a1*a2 + b1*b2 + c1*c2
+    cross = np.sqrt((b1*c2 - c1*b2)**2 + (c1*a2 - a1*c2)**2 + (a1*b2 - b1*a2)**2)
+    sep = np.arctan2(cross, dot)
+    sep = np.where(np.abs(sep) < 1e-15, 0.0, sep)
+
+    return np.degrees(sep)
+
 
 
-    return math.degrees(sep)
+
+#FILE methods
+def md5(fname:str) -> str:
+    """Calculates and returns MD5 hash checksum of a file.
+
+    From https://stackoverflow.com/a/3431838/2795533
+
+    :param fname: file path.
+    :return: md5 hex value.
+    """
+    hash_md5 = hashlib.md5()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()